@@ -1,5 +1,7 @@
 from util import *
 from pulp import *
+from tracing import traced, networkArgs
+from memo import memoized
 
 
 ##
@@ -122,14 +124,19 @@ def setUp(STN, proportion=False, maxmin=False):
 # \fn originalLP(STN, naiveObj=False, debug=False):
 # \brief Runs the LP on the input STN
 #
-# @param STN            An input STNU
+# @param STN            An input STNU (not modified)
 # @param naiveObj       Flag indicating if we are using the naive objective
 #                       function
 # @param debug          Print optional status messages
 #
 # @return   LP status, A dictionary of the LP_variables for the bounds on
 #           timepoints and a dictionary of LP variables for epsilons
+@memoized('LP.originalLP')
+@traced(args=networkArgs)
 def originalLP(STN, naiveObj=False, debug=False):
+    # setUp bounds the events with setMakespan, so it works on a copy to
+    # leave the input alone whether or not the result comes from the memo
+    STN = STN.copy()
     bounds, epsilons, prob = setUp(STN)
 
     # Set up objective function for the LP
@@ -138,14 +138,20 @@ def getObjValue(xml_name, outfolder, username=None, \
 
 
 ##
-# \fn main()
+# \fn main(xml_folder=None, username=None, password=None, outfolder=None)
 # \brief I/O for submitting specific sequence of jobs.
-def main():
-    xml_folder = input("Please input directory for xml files:\n")
+#
+# \details Arguments left to None are asked for.
+def main(xml_folder=None, username=None, password=None, outfolder=None):
+    if xml_folder is None:
+        xml_folder = input("Please input directory for xml files:\n")
     xml_L = glob.glob(os.path.join(xml_folder, '*.xml'))
-    username = input("Please input Neos username:\n")
-    password = input("Please input Neos password:\n")
-    outfolder = input("Please enter output folder for job file:\n")
+    if username is None:
+        username = input("Please input Neos username:\n")
+    if password is None:
+        password = input("Please input Neos password:\n")
+    if outfolder is None:
+        outfolder = input("Please enter output folder for job file:\n")
 
     result = {}
     result['normal'] = {}
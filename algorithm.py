@@ -1,4 +1,7 @@
 from util import *
+import instrument
+from tracing import traced, networkArgs
+from memo import memoized
 
 ##
 # \file algorithm.py
@@ -185,7 +188,12 @@ def getFinalResult(conflicts, STN, D, report=True):
 #         labeled graph. Otherwise, return False, the edges along the
 #         negative cycle and the end node
 def DCDijkstra(G, start, preds, novel, callStack, negNodes):
-    Q = PriorityQueue()
+    stats = instrument.active()
+    if stats is not None:
+        stats.add('DCDijkstra.calls')
+        stats.max('DCDijkstra.depth', len(callStack))
+
+    Q = PriorityQueue(stats)
     labelDist = {}
     unlabelDist = {}
     labelDist[start] = (0, None)
@@ -211,6 +219,8 @@ def DCDijkstra(G, start, preds, novel, callStack, negNodes):
         if weight >= -epsilon:
             G.addEdge(v, start, weight)
             novel.append((v, start, weight))
+            if stats is not None:
+                stats.add('DCDijkstra.novelEdges')
             continue
 
         if v in negNodes:
@@ -251,19 +261,24 @@ def DCDijkstra(G, start, preds, novel, callStack, negNodes):
 # @return Return True if the input STNU is dynamically controllable. Otherwise,
 #         return False, conflicts (in labeled graph), conflicts in original STNU,
 #         and weights of the negative cycle (conflict).
+@memoized()
+@traced(args=networkArgs)
 def DC_Checker(STN, report=True):
-    G, D = normal(STN.copy())
+    with instrument.phase('DC_Checker.normal'):
+        G, D = normal(STN.copy())
     negNodes = G.getNegNodes()
     novel = []
     preds = {}
 
     for v in negNodes:
-        result, edges, end = DCDijkstra(G, v, preds, novel, \
+        with instrument.phase('DC_Checker.search'):
+            result, edges, end = DCDijkstra(G, v, preds, novel, \
                                                     [v], negNodes.copy())
 
         if not result:
-            conflicts = extractConflict(edges, novel, preds)
-            bounds = getFinalResult(conflicts, STN, D, report=report)
+            with instrument.phase('DC_Checker.conflict'):
+                conflicts = extractConflict(edges, novel, preds)
+                bounds = getFinalResult(conflicts, STN, D, report=report)
 
             weight = 0
             for e in edges:
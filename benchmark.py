@@ -0,0 +1,399 @@
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from stn import loadSTNfromJSONfile
+from algorithm import DC_Checker
+from util import STNtoDCSTN
+from relax import relaxSearch
+from dispatch import simulation
+from probability import prob_of_DC
+import LP
+import empirical
+import memo
+
+##
+# \file benchmark.py
+# \brief Time the hot paths of the project on the dataset and on generated
+#        networks of increasing size, and compare runs against a baseline
+#
+# \details Every case is run on three workloads:
+#          - 'dynamically_controllable' and 'uncontrollable': networks picked
+#            from the dataset folders, spread over the range of their sizes
+#          - 'chain' and 'parallel': networks from empirical.generateChain and
+#            empirical.generateParallelChain with a growing number of tasks
+#
+#          For each network we record the number of events and edges, the
+#          best and median wall time over `repeat` runs and the peak memory
+#          allocated during one more run (traced by tracemalloc, so that run
+#          is not timed). A run is appended to a JSON history file, and
+#          `compare` reports the cases that got slower than in a baseline run.
+#
+#          Output of the benchmarked functions (including the output of the
+#          LP solver subprocess) is discarded, and they run with memo.py
+#          disabled so that every run does the work.
+
+
+## The folders of the dataset
+DATASET = {'dynamically_controllable': 'dataset/dynamically_controllable',
+           'uncontrollable': 'dataset/uncontrollable'}
+
+## Number of tasks of the generated networks
+SIZES = [2, 4, 8, 16, 32]
+
+## The core modules, which should import quickly and without HEAVY packages
+CORE = ['stn', 'dc_stn', 'util', 'algorithm', 'simulation', 'dispatch']
+
+## Packages only loaded on first use by the plotting, LP and stats code
+HEAVY = ['matplotlib', 'plotly', 'scipy', 'pulp']
+
+
+##
+# \brief The benchmarked cases
+#
+# \details Each case maps a network to a function of no argument that runs the
+#          benchmarked code. The network is a fresh copy for every run, and
+#          the work done before returning the function is not timed.
+CASES = {
+    'DC_Checker':           lambda S: lambda: DC_Checker(S, report=False),
+    'DC_STN.is_DC':         lambda S: STNtoDCSTN(S).is_DC,
+    'STN.minimal':          lambda S: S.minimal,
+    'relaxSearch':          lambda S: lambda: relaxSearch(S),
+    'originalLP':           lambda S: lambda: LP.originalLP(S),
+    'dispatch.simulation':  lambda S: lambda: simulation(S, 20, seed=0),
+    'prob_of_DC':           lambda S: lambda: prob_of_DC(S),
+}
+
+
+##
+# \fn quiet()
+# \brief Discard everything written to stdout, by Python code and by
+#        subprocesses such as CBC, while in the context
+@contextlib.contextmanager
+def quiet():
+    with open(os.devnull, 'w') as devnull, \
+            contextlib.redirect_stdout(io.StringIO()):
+        sys.stdout.flush()
+        saved = os.dup(1)
+        os.dup2(devnull.fileno(), 1)
+        try:
+            yield
+        finally:
+            os.dup2(saved, 1)
+            os.close(saved)
+
+
+##
+# \fn datasetNetworks(folder, count)
+# \brief Pick networks of a dataset folder, evenly spread over their sizes
+#
+# @param folder     The folder of json files
+# @param count      The number of networks to pick
+#
+# @return A list of (name, STN) pairs, from the smallest to the largest
+def datasetNetworks(folder, count):
+    networks = []
+    for fname in glob.glob(os.path.join(folder, '*.json')):
+        networks.append((os.path.basename(fname), loadSTNfromJSONfile(fname)))
+    networks.sort(key=lambda item: (len(item[1].verts), item[0]))
+
+    if count >= len(networks):
+        return networks
+    picks = np.linspace(0, len(networks) - 1, count).round().astype(int)
+    return [networks[k] for k in sorted(set(picks))]
+
+
+##
+# \fn generatedNetworks(family, sizes, seed=0)
+# \brief Generate networks of growing size
+#
+# @param family     'chain' or 'parallel' (two agents)
+# @param sizes      The numbers of tasks
+# @param seed       The seed of the generator
+#
+# @return A list of (name, STN) pairs
+def generatedNetworks(family, sizes, seed=0):
+    networks = []
+    with quiet():
+        for task in sizes:
+            if family == 'chain':
+                S = empirical.generateChain(task, 50 * task, seed=seed)
+            else:
+                S = empirical.generateParallelChain(2, task, seed=seed)
+            networks.append(('%s%d' % (family, task), S))
+    return networks
+
+
+##
+# \fn measure(case, STN, repeat)
+# \brief Time a case on one network and measure its peak memory
+#
+# @param case       A function of CASES
+# @param STN        The network (not modified)
+# @param repeat     The number of timed runs
+#
+# @return A dictionary with the timings in seconds and the peak memory in bytes
+def measure(case, STN, repeat):
+    times = []
+    with quiet(), memo.disabled():
+        for _ in range(repeat):
+            run = case(STN.copy())
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+
+        run = case(STN.copy())
+        tracemalloc.start()
+        try:
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return {'best': min(times), 'median': statistics.median(times),
+            'peak': peak}
+
+
+##
+# \fn scaling(points)
+# \brief Fit time = c * events^k over the points of a curve
+#
+# @return The exponent k, or None if there are not enough points
+def scaling(points):
+    points = [p for p in points if p['best'] > 0]
+    if len(set(p['events'] for p in points)) < 2:
+        return None
+    x = np.log([p['events'] for p in points])
+    y = np.log([p['best'] for p in points])
+    return float(np.polyfit(x, y, 1)[0])
+
+
+##
+# \fn run(cases=None, workloads=None, count=8, sizes=SIZES, repeat=3,
+#         budget=10.0, seed=0)
+# \brief Run the benchmarks
+#
+# @param cases      Names of the cases to run (all of CASES by default)
+# @param workloads  Names of the workloads to run (all by default)
+# @param count      The number of networks picked from each dataset folder
+# @param sizes      The numbers of tasks of the generated networks
+# @param repeat     The number of timed runs per network
+# @param budget     Once a case takes longer than this many seconds on a
+#                   network, it is skipped on the larger networks of the
+#                   workload
+# @param seed       The seed of the generated networks
+#
+# @return A dictionary {case: {workload: {'points': [...], 'exponent': k}}}
+def run(cases=None, workloads=None, count=8, sizes=SIZES, repeat=3,
+        budget=10.0, seed=0):
+    cases = cases or list(CASES)
+    workloads = workloads or list(DATASET) + ['chain', 'parallel']
+
+    networks = {}
+    for workload in workloads:
+        if workload in DATASET:
+            networks[workload] = datasetNetworks(DATASET[workload], count)
+        else:
+            networks[workload] = generatedNetworks(workload, sizes, seed)
+
+    results = {}
+    for name in cases:
+        results[name] = {}
+        for workload in workloads:
+            points = []
+            for net_name, S in networks[workload]:
+                try:
+                    point = measure(CASES[name], S, repeat)
+                except Exception as error:
+                    print("{} failed on {}: {!r}".format(name, net_name,
+                                                         error))
+                    continue
+                point.update(network=net_name, events=len(S.verts),
+                             edges=len(S.edges))
+                points.append(point)
+                print("{:20s} {:25s} {:22s} {:10.4f}s {:10d}B".format(
+                    name, workload, net_name, point['best'], point['peak']))
+                if point['best'] > budget:
+                    break
+
+            results[name][workload] = {'points': points,
+                                       'exponent': scaling(points)}
+    return results
+
+
+##
+# \fn coldImports(modules=CORE, threshold=0.5, repeat=3)
+# \brief Time the import of modules in fresh interpreters and check that they
+#        do not load heavy packages
+#
+# @param modules    The names of the modules to import
+# @param threshold  The import time in seconds above which a module fails
+# @param repeat     The number of fresh interpreters per module (the best time
+#                   is kept)
+#
+# @return A list of (module, best time, heavy packages loaded) for every
+#         module that is slower than the threshold or loads a HEAVY package
+def coldImports(modules=CORE, threshold=0.5, repeat=3):
+    script = ("import sys, time\n"
+              "start = time.perf_counter()\n"
+              "import {}\n"
+              "print(time.perf_counter() - start)\n"
+              "print(' '.join(m for m in {!r} if m in sys.modules))")
+    root = os.path.dirname(os.path.abspath(__file__))
+
+    failures = []
+    for module in modules:
+        times = []
+        for _ in range(repeat):
+            out = subprocess.run([sys.executable, '-c',
+                                  script.format(module, HEAVY)],
+                                 cwd=root, capture_output=True, text=True,
+                                 check=True).stdout.splitlines()
+            times.append(float(out[0]))
+            heavy = out[1].split() if len(out) > 1 else []
+
+        best = min(times)
+        print("{:20s} {:10.4f}s {}".format(module, best, ' '.join(heavy)))
+        if best > threshold or heavy:
+            failures.append((module, best, heavy))
+    return failures
+
+
+##
+# \fn record(results, path, label=None)
+# \brief Append the results of a run to a JSON history file
+#
+# @param results    The output of run
+# @param path       The history file (created if it does not exist)
+# @param label      A name for the run, the git commit by default
+#
+# @return The history entry
+def record(results, path, label=None):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    entry = {'label': label or commit, 'commit': commit,
+             'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+             'python': platform.python_version(),
+             'machine': platform.machine(),
+             'results': results}
+
+    history = []
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            history = json.load(f)
+    history.append(entry)
+
+    with open(path, 'w') as f:
+        json.dump(history, f, indent=1)
+    return entry
+
+
+##
+# \fn compare(results, baseline, threshold=1.2)
+# \brief Compare a run with a baseline run, network by network
+#
+# @param results    The output of run
+# @param baseline   The results of the baseline run
+# @param threshold  Ratio of best times above which a case is reported as a
+#                   regression
+#
+# @return A list of (case, workload, network, baseline time, time, ratio) for
+#         every network on which the case got slower than the threshold
+def compare(results, baseline, threshold=1.2):
+    regressions = []
+    for name, workloads in results.items():
+        for workload, curve in workloads.items():
+            old = baseline.get(name, {}).get(workload, {}).get('points', [])
+            old = {p['network']: p for p in old}
+            for point in curve['points']:
+                if point['network'] not in old:
+                    continue
+                before = old[point['network']]['best']
+                ratio = point['best'] / before if before > 0 else float('inf')
+                print("{:20s} {:25s} {:22s} {:8.3f}x".format(
+                    name, workload, point['network'], ratio))
+                if ratio > threshold:
+                    regressions.append((name, workload, point['network'],
+                                        before, point['best'], ratio))
+    return regressions
+
+
+##
+# \fn loadBaseline(path, label=None)
+# \brief Get the results of a run from a history file
+#
+# @param path       The history file
+# @param label      The label of the run, the first run by default
+#
+# @return The results of that run
+def loadBaseline(path, label=None):
+    with open(path, 'r') as f:
+        history = json.load(f)
+    for entry in history:
+        if label is None or entry['label'] == label:
+            return entry['results']
+    raise KeyError("No run labelled {} in {}".format(label, path))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time the hot paths and record the run in a history")
+    parser.add_argument('--case', action='append', choices=list(CASES),
+                        help="case to run (repeatable, default: all)")
+    parser.add_argument('--workload', action='append',
+                        choices=list(DATASET) + ['chain', 'parallel'],
+                        help="workload to run (repeatable, default: all)")
+    parser.add_argument('--count', type=int, default=8,
+                        help="networks picked from each dataset folder")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                        help="numbers of tasks of the generated networks")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--budget', type=float, default=10.0)
+    parser.add_argument('--history', default='result/benchmark_history.json',
+                        help="JSON file the run is appended to")
+    parser.add_argument('--label', help="name of the run in the history")
+    parser.add_argument('--baseline', nargs='?', const='',
+                        help="compare with the run of this label in the "
+                             "history (the first run if no label is given)")
+    parser.add_argument('--threshold', type=float, default=1.2)
+    parser.add_argument('--imports', type=float, nargs='?', const=0.5,
+                        metavar='SECONDS',
+                        help="only check that the core modules import in "
+                             "less than SECONDS (default 0.5) without heavy "
+                             "packages, and exit with 1 if one does not")
+    args = parser.parse_args()
+
+    if args.imports is not None:
+        failures = coldImports(threshold=args.imports)
+        print("{} failures".format(len(failures)))
+        sys.exit(1 if failures else 0)
+
+    results = run(args.case, args.workload, args.count, args.sizes,
+                  args.repeat, args.budget)
+
+    if args.baseline is not None and os.path.exists(args.history):
+        baseline = loadBaseline(args.history, args.baseline or None)
+        regressions = compare(results, baseline, args.threshold)
+        print("{} regressions".format(len(regressions)))
+
+    record(results, args.history, args.label)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,37 @@ import os
 #  \brief convert an AMPL format model file to xml file
 
 
+## The part of the XML document before the model
+HEADER = ("<document>\n"
+          "<category>minco</category>\n"
+          "<solver>BARON</solver>\n"
+          "<inputMethod>AMPL</inputMethod>\n\n"
+          "<model><![CDATA[\n")
+
+## The part of the XML document after the model
+FOOTER = ("\n]]></model>\n\n"
+          "<data><![CDATA[]]></data>\n\n"
+          "<commands><![CDATA[]]></commands>\n\n"
+          "<comments><![CDATA[]]></comments>\n\n"
+          "</document>")
+
+
+##
+# \fn stream_xml(xml_name, chunks)
+# \brief write an xml file around a model given piece by piece
+#
+# @param xml_name       The filename of the output xml file
+# @param chunks         An iterable of strings that make up the model, e.g.
+#                       model.emitModel(STN) or an open model file
+#
+# @post An xml file that can be submitted to the neos server
+def stream_xml(xml_name, chunks):
+   with open(xml_name, 'w') as xml_file:
+       xml_file.write(HEADER)
+       xml_file.writelines(chunks)
+       xml_file.write(FOOTER)
+
+
 ##
 # \fn build_xml(xml_name: str, model_name: str):
 # \brief convert an AMPL format model file to xml file
@@ -16,40 +47,19 @@ import os
 # @post An xml file generated from the model file that can be submitted to
 #       the neos server
 def build_xml(xml_name: str, model_name: str):
-   # Read in the optimiziation problem specification
-   model_file = open(model_name, 'r')
-   model = model_file.read()
-   model_file.close()
-
-   # Build the XML document
-   doc_beg = "<document>"
-   doc_end = "</document>"
-   choice = ("<category>minco</category>\n"
-           "<solver>BARON</solver>\n"
-           "<inputMethod>AMPL</inputMethod>")
-   empty_data = "<data><![CDATA[]]></data>"
-   empty_commands = "<commands><![CDATA[]]></commands>"
-   empty_comments = "<comments><![CDATA[]]></comments>"
-
-   template = (f"{doc_beg}\n{choice}\n\n"
-           "<model><![CDATA[\n"
-           f"{model}\n"
-           "]]></model>\n\n"
-           f"{empty_data}\n\n"
-           f"{empty_commands}\n\n"
-           f"{empty_comments}\n\n"
-           f"{doc_end}")
-
-   xml_file = open(xml_name, 'w')
-   xml_file.write(template)
-   xml_file.close()
+   # Copy the model over in blocks instead of reading it in whole
+   with open(model_name, 'r') as model_file:
+       stream_xml(xml_name, iter(lambda: model_file.read(1 << 16), ''))
 
 
 ##
-# A short interactive program for converting files.
-def main():
-   path = input("Please enter the path of directory:\n")
-   out_path = input("Please enter the path of out directory:\n")
+# A short interactive program for converting files. Directories left to None
+# are asked for.
+def main(path=None, out_path=None):
+   if path is None:
+       path = input("Please enter the path of directory:\n")
+   if out_path is None:
+       out_path = input("Please enter the path of out directory:\n")
    listOfFile = glob.glob(os.path.join(path, '*.mod'))
 
    for fname in listOfFile:
@@ -0,0 +1,404 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+
+##
+# \file cli.py
+# \brief Non-interactive entry point for batch runs
+#
+# \details Every step of the pipeline is a subcommand that takes its inputs
+#          and outputs as arguments instead of asking for them:
+#
+#              python cli.py check dataset/uncontrollable --out dc.json
+#              python cli.py relax dataset/uncontrollable --jobs 8
+#              python cli.py lp dataset --samples 10000 --seed 1
+#              python cli.py simulate dataset --samples 1000 --jobs 8
+#              python cli.py model chains --out-folder models --xml-folder xml
+#              python cli.py neos xml --out-folder jobs --jobs 10
+#              python cli.py stats result/result_success.json
+#
+#          Networks can be given as json files or folders of json files.
+#          With --jobs, the networks are processed in a pool of processes.
+#          A network on which the work fails gets an {'error': ...} record
+#          instead of a result, the others go on, and the failures are listed
+#          at the end.
+#          Every network gets its own random stream spawned from --seed, in
+#          the same way as empirical.sampleAll and dispatch.simulate_and_save,
+#          so the results do not depend on the number of jobs.
+#
+#          With --store, results are kept in a results.ResultStore: a run
+#          skips the networks already computed with the same parameters and
+#          commits each new result as soon as it is done, so an interrupted
+#          sweep is resumed by running the same command again.
+#
+#          With --memo, DC_Checker, relaxSearch, the LPs and prob_of_DC also
+#          keep their results in a folder between runs (see memo.py).
+#
+#          Heavy modules (PuLP, scipy, ...) are only imported by the
+#          subcommands that need them.
+
+
+##
+# \fn networkFiles(paths)
+# \brief The STN json files of a list of files and folders
+def networkFiles(paths):
+    from stn import Dataset
+    return Dataset(paths, cache=False).paths
+
+
+##
+# \fn runAll(work, files, options, jobs=None, seed=None, store=None,
+#           metric=None)
+# \brief Run a function on every network file, in a process pool if asked
+#
+# @param work       A function of (path, options, seed), defined at the top
+#                   level of this file so that it can be sent to workers
+# @param files      The network files
+# @param options    A dictionary passed to every call
+# @param jobs       The number of worker processes (None or 1 runs in this
+#                   process)
+# @param seed       The seed the per-file random streams are spawned from
+# @param store      A results.ResultStore. Files whose result is in it are
+#                   skipped, the others are stored one by one as they are
+#                   done, and their streams are spawned from their content
+#                   instead of their position (see results.networkSeed).
+# @param metric     The name of the results in the store
+#
+# @return A dictionary {file name: result}, printed as it is filled. Networks
+#         on which the work raised an exception get an {'error': ...} record,
+#         which is not stored.
+def runAll(work, files, options, jobs=None, seed=None, store=None,
+           metric=None):
+    result = {}
+    if store is None:
+        import sampling
+        seeds = sampling.spawn_seeds(seed, len(files))
+        tasks = [(work, path, options, s) for path, s in zip(files, seeds)]
+    else:
+        from results import fileHash, networkSeed
+        params = dict(options, seed=seed)
+        digests = {}
+        tasks = []
+        for path in files:
+            digests[path] = fileHash(path)
+            if store.has(digests[path], metric, params):
+                name = os.path.basename(path)
+                result[name] = store.get(digests[path], metric, params)
+                print("{}: {} (stored)".format(name, result[name]))
+            else:
+                tasks.append((work, path, options,
+                              networkSeed(seed, digests[path])))
+
+    pool = None
+    if jobs is not None and jobs > 1 and tasks:
+        pool = multiprocessing.Pool(jobs)
+    outcomes = pool.imap(_run, tasks) if pool else map(_run, tasks)
+
+    failed = []
+    try:
+        for task, outcome in zip(tasks, outcomes):
+            path = task[1]
+            name = os.path.basename(path)
+            print("{}: {}".format(name, outcome))
+            if _failed(outcome):
+                failed.append(name)
+            elif store is not None:
+                store.put(digests[path], metric, params, outcome, name)
+            result[name] = outcome
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    if failed:
+        print("{} of {} networks failed:".format(len(failed), len(files)),
+              file=sys.stderr)
+        for name in failed:
+            print("  {}: {}".format(name, result[name]['error']),
+                  file=sys.stderr)
+
+    return {os.path.basename(path): result[os.path.basename(path)]
+            for path in files}
+
+
+## \brief Unpack a task for a worker, turning an exception into an error
+#         record so that the other networks go on
+def _run(task):
+    work, path, options, seed = task
+    try:
+        return work(path, options, seed)
+    except Exception as e:
+        return {'error': repr(e)}
+
+
+## \brief Whether an outcome of _run is an error record
+def _failed(outcome):
+    return isinstance(outcome, dict) and set(outcome) == {'error'}
+
+
+## \brief The results store given on the command line, or None
+def _store(args):
+    if args.store is None:
+        return None
+    from results import ResultStore
+    return ResultStore(args.store)
+
+
+## \brief Save a result as json, if an output file was given
+def _save(result, out):
+    if out is None:
+        return
+    folder = os.path.dirname(out)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(result, f, indent=1)
+    print("Results saved to", out)
+
+
+# -------------------------------------------------------------------------
+#  Work done on one network
+# -------------------------------------------------------------------------
+
+## \brief Check dynamic controllability
+def _check(path, options, seed):
+    from stn import loadSTNfromJSONfile
+    STN = loadSTNfromJSONfile(path)
+    if options['method'] == 'morris':
+        from util import dc_checking
+        return {'dc': bool(dc_checking(STN))}
+
+    from algorithm import DC_Checker
+    result, conflicts, bounds, weight = DC_Checker(STN, report=False)
+    return {'dc': result, 'conflicts': len(conflicts), 'weight': weight}
+
+
+## \brief Relax to dynamic controllability and compute the degree of DC
+def _relax(path, options, seed):
+    from stn import loadSTNfromJSONfile
+    from relax import relaxSearch
+    from empirical import dynamicMetric
+    STN = loadSTNfromJSONfile(path)
+    new_STN, count, cycles, weights = relaxSearch(STN.copy())
+    if not new_STN:
+        return {'degree': 0}
+
+    new, orig, degree = dynamicMetric(STN.copy(), new_STN.copy())
+    return {'shrinked': new, 'original': orig, 'degree': degree,
+            'relaxations': count}
+
+
+## \brief Approximate the degree of strong controllability and the success
+#         rate of the LP schedule
+def _lp(path, options, seed):
+    from stn import loadSTNfromJSONfile
+    from empirical import sample
+    STN = loadSTNfromJSONfile(path)
+    return sample(STN, success=options['success'], LP=options['lp'],
+                  size=options['samples'], seed=seed,
+                  strategy=options['strategy'], backend=options['backend'])
+
+
+## \brief Success rate of dispatch
+def _simulate(path, options, seed):
+    from stn import loadSTNfromJSONfile
+    from dispatch import simulation
+    STN = loadSTNfromJSONfile(path)
+    return simulation(STN, options['samples'], seed=seed,
+                      strategy=options['strategy'])
+
+
+# -------------------------------------------------------------------------
+#  Subcommands
+# -------------------------------------------------------------------------
+
+def runCheck(args):
+    result = runAll(_check, networkFiles(args.paths),
+                    {'method': args.method}, args.jobs, None,
+                    _store(args), 'check')
+    _save(result, args.out)
+
+
+def runRelax(args):
+    result = runAll(_relax, networkFiles(args.paths), {}, args.jobs, None,
+                    _store(args), 'relax')
+    _save(result, args.out)
+
+
+def runLP(args):
+    options = {'lp': args.lp, 'success': args.success,
+               'samples': args.samples, 'strategy': args.strategy,
+               'backend': args.backend}
+    result = runAll(_lp, networkFiles(args.paths), options, args.jobs,
+                    args.seed, _store(args), 'lp')
+    _save(result, args.out)
+
+
+def runSimulate(args):
+    options = {'samples': args.samples, 'strategy': args.strategy}
+    result = runAll(_simulate, networkFiles(args.paths), options, args.jobs,
+                    args.seed, _store(args), 'simulate')
+    _save(result, args.out)
+
+
+def runModel(args):
+    import model
+    os.makedirs(args.out_folder, exist_ok=True)
+    model.main(args.directory, args.out_folder, args.result)
+    if args.xml_folder is not None:
+        import build_xml
+        os.makedirs(args.xml_folder, exist_ok=True)
+        build_xml.main(args.out_folder, args.xml_folder)
+
+
+def runNeos(args):
+    import neos_jobs
+    password = os.environ.get('NEOS_PASSWORD', '')
+    if args.username and not password:
+        sys.exit("Set NEOS_PASSWORD to submit as {}".format(args.username))
+
+    os.makedirs(args.out_folder, exist_ok=True)
+    result = os.path.join(args.out_folder, 'result.json')
+    neos_jobs.main(args.xml_folder, args.username or '', password,
+                   args.out_folder, args.jobs or 4,
+                   args.url or neos_jobs.NEOS_URL, result)
+
+    if args.json_folder is not None:
+        import empirical
+        empirical.processNeos(args.out_folder, args.json_folder,
+                              args.out_folder)
+
+
+def runStats(args):
+    import result_stats
+    if args.metric is None and any(
+            os.path.splitext(f)[1] in result_stats.STORE_EXTENSIONS
+            for f in args.files):
+        sys.exit("Give the --metric to read from the results stores")
+    os.makedirs(args.out_folder, exist_ok=True)
+    result_stats.main(args.files, args.out_folder, args.metric,
+                      args.resamples, args.level, args.seed)
+
+
+##
+# \fn parser()
+# \brief The argument parser of the command line
+def parser():
+    from sampling import SAMPLING_STRATEGIES
+
+    jobs = argparse.ArgumentParser(add_help=False)
+    jobs.add_argument('--jobs', type=int, default=None,
+                      help="number of worker processes")
+
+    networks = argparse.ArgumentParser(add_help=False, parents=[jobs])
+    networks.add_argument('paths', nargs='+',
+                          help="STN json files or folders of them")
+    networks.add_argument('--out', help="json file the results are saved to")
+    networks.add_argument('--store',
+                          help="SQLite results store: networks already in it "
+                               "are skipped and new results are saved to it "
+                               "one network at a time")
+    networks.add_argument('--memo',
+                          help="folder the analyses of a network are "
+                               "memoized to between runs")
+
+    sampled = argparse.ArgumentParser(add_help=False)
+    sampled.add_argument('--seed', type=int, default=None,
+                         help="seed of the random streams")
+    sampled.add_argument('--samples', type=int, default=50000,
+                         help="number of realizations per network")
+    sampled.add_argument('--strategy', default='uniform',
+                         choices=SAMPLING_STRATEGIES,
+                         help="how realizations are drawn")
+
+    top = argparse.ArgumentParser(
+        description="Run the steps of the experiments in batch")
+    commands = top.add_subparsers(dest='command', required=True)
+
+    sub = commands.add_parser('check', parents=[networks],
+                              help="check dynamic controllability")
+    sub.add_argument('--method', default='dijkstra',
+                     choices=['dijkstra', 'morris'],
+                     help="algorithm.DC_Checker or DC_STN.is_DC")
+    sub.set_defaults(run=runCheck)
+
+    sub = commands.add_parser('relax', parents=[networks],
+                              help="relax to dynamic controllability and "
+                                   "compute the degree of DC")
+    sub.set_defaults(run=runRelax)
+
+    sub = commands.add_parser('lp', parents=[networks, sampled],
+                              help="approximate the degree of strong "
+                                   "controllability and sample the success "
+                                   "rate")
+    sub.add_argument('--lp', default='original',
+                     choices=['original', 'proportion', 'maxmin'])
+    sub.add_argument('--success', default='default',
+                     choices=['default', 'new'],
+                     help="how a realization counts as a success")
+    sub.add_argument('--backend', default='pulp', choices=['pulp', 'highs'])
+    sub.set_defaults(run=runLP)
+
+    sub = commands.add_parser('simulate', parents=[networks, sampled],
+                              help="dispatch success rate")
+    sub.set_defaults(run=runSimulate, samples=1000)
+
+    sub = commands.add_parser('model',
+                              help="write the degree of DC models of a "
+                                   "folder")
+    sub.add_argument('directory', help="folder of STN json files")
+    sub.add_argument('--out-folder', required=True,
+                     help="folder the .mod files are written to")
+    sub.add_argument('--result', default='result_closed_form.json',
+                     help="json file for the values found in closed form")
+    sub.add_argument('--xml-folder',
+                     help="also convert the models to NEOS xml jobs there")
+    sub.set_defaults(run=runModel)
+
+    sub = commands.add_parser('neos', parents=[jobs],
+                              help="submit xml jobs to NEOS (--jobs in "
+                                   "flight, password from NEOS_PASSWORD)")
+    sub.add_argument('xml_folder', help="folder of xml jobs")
+    sub.add_argument('--out-folder', required=True,
+                     help="folder for the job table, job files and "
+                          "result.json")
+    sub.add_argument('--username', help="submit with this NEOS account")
+    sub.add_argument('--url', help="XML-RPC server to submit to (NEOS by "
+                                   "default)")
+    sub.add_argument('--json-folder',
+                     help="also compute the degrees of DC of the STNs of "
+                          "this folder (result_neos.json)")
+    sub.set_defaults(run=runNeos)
+
+    sub = commands.add_parser('stats',
+                              help="correlations of [x, y] result files")
+    sub.add_argument('files', nargs='+',
+                     help="json, JSONL or SQLite results store files")
+    sub.add_argument('--out-folder', default='result',
+                     help="folder for stats.json and pretty_results.txt")
+    sub.add_argument('--metric',
+                     help="metric read from results stores (e.g. lp), "
+                          "required for them")
+    sub.add_argument('--resamples', type=int, default=1000,
+                     help="bootstrap resamples of the confidence intervals")
+    sub.add_argument('--level', type=float, default=0.95,
+                     help="confidence level of the intervals")
+    sub.add_argument('--seed', type=int, default=None,
+                     help="seed of the sampling and of the bootstrap")
+    sub.set_defaults(run=runStats)
+
+    return top
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    if getattr(args, 'memo', None) is not None:
+        import memo
+        memo.configure(folder=args.memo)
+    args.run(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -10,6 +10,8 @@
 # main purpose of this file was to originally check dynamic controllability -
 # a quicker check is provided in algorithm.py, which we prefer.
 
+import instrument
+
 ## \fn enum(*sequential, **named)
 #  \brief Implements enumerations
 #  \details Found on the internet at:
@@ -275,19 +277,34 @@ class DC_STN(object):
             del self.upper_case_edges[(i,j)]
 
 
+    ## \fn is_DC(self,debug_flag=False)
+    #  \brief determines if the STNU is dynamically controllable
+    #  \note When instrument statistics are being collected, records the
+    #    iterations, the reductions of each family per iteration and the time
+    #    spent in each phase
     def is_DC(self,debug_flag=False):
+        stats = instrument.active()
+        families = [('no_case', self.no_case_reductions),
+                    ('upper_case', self.upper_case_reductions),
+                    ('cross_case', self.cross_case_reductions),
+                    ('lower_case', self.lower_case_reductions),
+                    ('label_removal', self.label_removal_reductions)]
         i = 0
         while i < len(self.edges):
-            if not self.all_max_consistent():
+            if stats is not None:
+                stats.add('is_DC.iterations')
+            with instrument.phase('is_DC.all_max_consistent'):
+                consistent = self.all_max_consistent()
+            if not consistent:
                 return False
 
-            num_reductions = 0
-            num_reductions += self.no_case_reductions(debug_flag)
-            num_reductions += self.upper_case_reductions(debug_flag)
-            num_reductions += self.cross_case_reductions(debug_flag)
-            num_reductions += self.lower_case_reductions(debug_flag)
-            num_reductions += self.label_removal_reductions(debug_flag)
-            if num_reductions == 0:
+            counts = {}
+            for name, reduce in families:
+                with instrument.phase('is_DC.' + name):
+                    counts[name] = reduce(debug_flag)
+            if stats is not None:
+                stats.record('is_DC.reductions', counts)
+            if sum(counts.values()) == 0:
                 return True
             i += 1
         return False
@@ -296,6 +313,9 @@ class DC_STN(object):
     #  \brief determines if the all-max projection of this STN is consistent
     #  \note does not change the input STN
     def all_max_consistent(self):
+        stats = instrument.active()
+        if stats is not None:
+            stats.add('floydWarshall.calls')
         verts = list(self.verts.keys())
         num_verts = len(verts)
         B = [ [self.max_projection(i,j) for j in verts] for i in verts ]
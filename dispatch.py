@@ -1,11 +1,13 @@
 from stn import STN, loadSTNfromJSONfile
 from util import STNtoDCSTN, PriorityQueue
 from dc_stn import DC_STN
-import empirical
-import random
+import sampling
 import json
+import multiprocessing
+import os
+from tracing import traced, networkArgs
 
-# For faster checking in safely_scheduled
+# For faster checking in safely_scheduled, and scheduleIsValid
 import simulation as sim
 
 ##
@@ -19,40 +21,125 @@ ZERO_ID = 0
 
 
 ##
-# \fn simulate_and_save(file_names, size, out_name)
+# \fn simulate_and_save(file_names, size, out_name, seed, store)
 # \brief Keep track of dispatch results on networks
-def simulate_and_save(file_names: list, size: int, out_name: str):
-    rates = {}
-    # Loop through files and record the dispatch success rates and
-    # approximated probabilities
-    for name in file_names:
-        success_rate = simulate_file(name, size)
-        rates[name] = success_rate
+#
+# \details The rates are saved as {file name: rate}, keyed by the base name
+#          of each file as in the other result files.
+#
+# \note Each file is simulated with its own stream spawned from seed, so the
+#       rate recorded for a file does not depend on the other files.
+#
+# @param store  A results.ResultStore. Files already in it are skipped and
+#               the others are stored as they are done. The stream of a file
+#               is then spawned from seed (an integer or None) and the
+#               content of the file rather than its position in the list.
+def simulate_and_save(file_names: list, size: int, out_name: str, seed=None,
+                      store=None):
+    if store is not None:
+        from results import networkSeed
+        rates = store.run(
+            file_names, 'simulate',
+            lambda name, digest: simulate_file(
+                name, size, seed=networkSeed(seed, digest)),
+            {'samples': size, 'seed': seed, 'strategy': 'uniform'})
+    else:
+        rates = {}
+        seeds = sampling.spawn_seeds(seed, len(file_names))
+        # Loop through files and record the dispatch success rates and
+        # approximated probabilities
+        for name, file_seed in zip(file_names, seeds):
+            success_rate = simulate_file(name, size, seed=file_seed)
+            rates[os.path.basename(name)] = success_rate
 
     # Save the results
     with open(out_name, 'w') as out_json:
-        out_json.dump(rates)
+        json.dump(rates, out_json)
     print("Results saved to", out_name)
 
 
 ##
-# \fn simulate_file(file_name, size)
+# \fn simulate_file(file_name, size, verbose, seed, strategy)
 # \brief Record dispatch result for single file
-def simulate_file(file_name, size, verbose=False) -> float:
+def simulate_file(file_name, size, verbose=False, seed=None,
+                  strategy='uniform') -> float:
     network = loadSTNfromJSONfile(file_name)
-    result = simulation(network, size, verbose)
+    result = simulation(network, size, verbose, seed=seed, strategy=strategy)
     if verbose:
         print(f"{file_name} worked {100*result}% of the time.")
     return result
 
 
 ##
-# \fn simulation(network, size)
-def simulation(network: STN, size: int, verbose=False) -> float:
+# \fn simulation(network, size, verbose, seed, strategy)
+# \brief Dispatch an STNU on randomly drawn realizations and report the
+#        fraction of successful runs
+#
+# @param network    The STNU to dispatch
+# @param size       The number of realizations to simulate
+# @param verbose    Prints extra statements when set to True
+# @param seed       A seed or numpy Generator for drawing realizations
+# @param strategy   How realizations are drawn (see sampling.py), e.g.
+#                   'sobol' for a scrambled low-discrepancy sequence
+#
+# @return The success rate of dispatch on the network
+@traced(args=networkArgs)
+def simulation(network: STN, size: int, verbose=False, seed=None,
+               strategy='uniform') -> float:
+    total_victories = count_victories(network, size, verbose, seed, strategy)
+
+    goodie = float(total_victories / size)
+    if verbose:
+        print(f"Worked {100*goodie}% of the time.")
+
+    return goodie
+
+
+##
+# \fn simulation_parallel(network, size, jobs, seed, batches, strategy)
+# \brief Split a simulation into batches and run them in a process pool
+#
+# \details Every batch draws from its own stream spawned from seed, and the
+#          batches are fixed independently of jobs. The recombined success
+#          rate is therefore the same no matter how many workers are used.
+#
+# @param network    The STNU to dispatch
+# @param size       The total number of realizations to simulate
+# @param jobs       The number of worker processes
+# @param seed       A seed or SeedSequence for the whole simulation
+# @param batches    The number of batches the simulation is split into
+# @param strategy   How realizations are drawn in each batch
+#
+# @return The success rate of dispatch on the network
+def simulation_parallel(network: STN, size: int, jobs=None, seed=None,
+                        batches=16, strategy='uniform') -> float:
+    batches = max(1, min(batches, size))
+    seeds = sampling.spawn_seeds(seed, batches)
+    sizes = [size // batches + (k < size % batches) for k in range(batches)]
+    tasks = [(network, n, False, s, strategy) for n, s in zip(sizes, seeds)]
+
+    with multiprocessing.Pool(jobs) as pool:
+        victories = pool.starmap(count_victories, tasks)
+
+    return float(sum(victories) / size)
+
+
+##
+# \fn count_victories(network, size, verbose, seed, strategy)
+# \brief Count successful dispatches over a batch of random realizations
+#
+# @param network    The STNU to dispatch
+# @param size       The number of realizations to simulate
+# @param verbose    Prints extra statements when set to True
+# @param seed       A seed or numpy Generator for drawing realizations
+# @param strategy   How realizations are drawn (see sampling.py)
+#
+# @return The number of realizations on which dispatch succeeded
+def count_victories(network: STN, size: int, verbose=False, seed=None,
+                    strategy='uniform') -> int:
     # Collect useful data from the original network
-    contingent_pairs = network.contingentEdges.keys()
-    contingents = {src: sink for (src, sink) in contingent_pairs}
-    uncontrollables = set(contingents.values())
+    contingents = network.children
+    uncontrollables = network.uncontrollables
 
     total_victories = 0
     dc_network = STNtoDCSTN(network)
@@ -76,8 +163,8 @@ def simulation(network: STN, size: int, verbose=False) -> float:
                 del dc_network.normal_edges[(vert, vert)]
 
     # Run the simulation
-    for j in range(size):
-        realization = generate_realization(network)
+    realizations = generate_realizations(network, size, seed, strategy)
+    for realization in realizations:
         copy = dc_network.copy()
         result = dispatch(network, copy, realization, contingents,
                           uncontrollables, verbose)
@@ -86,11 +173,7 @@ def simulation(network: STN, size: int, verbose=False) -> float:
         if result:
             total_victories += 1
 
-    goodie = float(total_victories / size)
-    if verbose:
-        print(f"Worked {100*goodie}% of the time.")
-
-    return goodie
+    return total_victories
 
 
 ##
@@ -101,7 +184,8 @@ def simulation(network: STN, size: int, verbose=False) -> float:
 # @param network                The original STNU we are scheduling on
 # @param dc_network             The modified STNU with inferred constraints
 # @param realization            An assignment of values for contingent edges
-# @param contingent_map         A dictionary for contingent edges
+# @param contingent_map         A dictionary from contingent sources to
+#                               their uncontrollables (STN.children)
 # @param uncontrollable_events  A collection of uncontrollables
 # @param verbose                Prints extra statements when set to True
 #
@@ -184,8 +268,7 @@ def dispatch(network: STN,
             return False
 
         # If the executed event was a contingent source
-        if current_event in contingent_map:
-            uncontrollable = contingent_map[current_event]
+        for uncontrollable in contingent_map.get(current_event, ()):
             delay = realization[uncontrollable]
             set_time = current_time + delay
             enabled.add(uncontrollable)
@@ -259,7 +342,7 @@ def dispatch(network: STN,
         print("Network is: ")
         print(network)
 
-    good = empirical.scheduleIsValid(network, schedule)
+    good = sim.scheduleIsValid(network, schedule)
     if verbose:
         msg = "We're safe!" if good else "We failed!"
         print(msg)
@@ -267,10 +350,15 @@ def dispatch(network: STN,
 
 
 ##
-# \fn generate_realization(network)
+# \fn generate_realization(network, rng)
 # \brief Uniformly at random pick values for contingent edges in STNU
-def generate_realization(network: STN) -> dict:
-    realization = {}
-    for nodes, edge in network.contingentEdges.items():
-        realization[nodes[1]] = random.uniform(-edge.Cji, edge.Cij)
-    return realization
+def generate_realization(network: STN, rng=None) -> dict:
+    return generate_realizations(network, 1, rng)[0]
+
+
+##
+# \fn generate_realizations(network, size, rng, strategy)
+# \brief Draw size realizations of the contingent edges in STNU at once
+def generate_realizations(network: STN, size: int, rng=None,
+                          strategy='uniform') -> list:
+    return sampling.sample_realizations(network, size, rng, strategy)
@@ -1,16 +1,22 @@
 from stn import STN
 from stn import loadSTNfromJSONfile
+from stn import Dataset
 from LP import *
 from relax import *
 from util import *
 from dispatch import *
 from probability import *
-import matplotlib.pyplot as plt
 import glob
 import json
 import os
-import random
 import math
+import sampling
+import LP
+import sparse_lp
+import nlp
+import numpy as np
+from simulation import scheduleIsValid
+from results import networkSeed
 
 ##
 # \file empirical.py
@@ -43,6 +49,22 @@ def newInterval(STN, epsilons):
     return original, shrinked
 
 
+##
+# \fn lpBackend(backend)
+# \brief Pick the module that solves the DSC LPs
+#
+# @param backend        'pulp' for LP.py (PuLP and CBC) or 'highs' for
+#                       sparse_lp.py (scipy sparse matrices and HiGHS)
+#
+# @return A module providing originalLP, proportionLP, maxminLP and minmaxLP
+def lpBackend(backend):
+    if backend == 'highs':
+        return sparse_lp
+    elif backend == 'pulp':
+        return LP
+    raise ValueError("Unknown LP backend: {}".format(backend))
+
+
 ##
 # \fn calculateMetric(original, shrinked)
 # \brief Compute our degree of strong controllability
@@ -63,120 +85,117 @@ def calculateMetric(original, shrinked):
 
     return new, orig, float(new/orig)
 
-##
-# \fn scheduleIsValid(network: STN, schedule: dict) -> STN
-# \brief Given an STNU and schedule, checks if the schedule is valid or not.
-#
-# @param network       An input STNU
-#
-# @param schedule      A dictionary whose keys are vertex IDs and whose values
-#                      are the times selected for those events.
-#
-# @return              True/False if the schedule is valid/invalid.
-def scheduleIsValid(network: STN, schedule: dict) -> STN:
-    ## Check that the schedule is actually defined on all relevant vertices
-    # This number is arbitrary - any sufficiently small, positive constant works
-    epsilon = 0.001
-    vertices = network.getAllVerts()
-    for vertex in vertices:
-        vertexID = vertex.nodeID
-        assert vertexID in schedule
-
-    # Check that the schedule is valid
-    edges = network.getAllEdges()
-    for edge in edges:
-        # Loop through the constraints
-        start = edge.i
-        fin   = edge.j
-        uBound = edge.Cij
-        lBound = -edge.Cji
-
-        boundedAbove = (schedule[fin] - schedule[start]) <= uBound + epsilon
-        boundedBelow = (schedule[fin] - schedule[start]) >= lBound - epsilon
-
-        # Check if constraint is not satisfied
-        if ((not boundedAbove) or (not boundedBelow)):
-            return False
-
-    return True
-
 
 # -------------------------------------------------------------------------
 #  Sample to get success rate
 # -------------------------------------------------------------------------
 
 ##
-# \fn sampleOnce(original, shrinked)
+# \fn sampleOnce(original, shrinked, rng=None)
 # \brief Check whether a randomly generated realization is inside strong
 #        controllable region
 #
 # @param original       A list of original contingent intervals
 # @param shrinked       A list of shrinked contingent intervals
+# @param rng            A seed or numpy Generator to draw the realization from
 #
 # @return Return True if the random realization falls into the strongly
 #         controllable region. Return False otherwise
-def sampleOnce(original, shrinked):
-    for i in range(len(original)):
-        x,y = original[i]
-        a,b = shrinked[i]
+def sampleOnce(original, shrinked, rng=None):
+    return bool(sampleInside(original, shrinked, 1, rng)[0])
+
 
-        real = random.uniform(x, y)
-        if real < a or real > b:
-            return False
+##
+# \fn sampleInside(original, shrinked, size, rng=None, strategy='uniform')
+# \brief Draw realizations in bulk and check which of them are inside the
+#        strongly controllable region
+#
+# @param original       A list of original contingent intervals
+# @param shrinked       A list of shrinked contingent intervals
+# @param size           The number of realizations to draw
+# @param rng            A seed or numpy Generator to draw the realizations from
+# @param strategy       How realizations are drawn (see sampling.py)
+#
+# @return A boolean array that is True for realizations that fall into the
+#         strongly controllable region
+def sampleInside(original, shrinked, size, rng=None, strategy='uniform'):
+    low = np.array([x for x, y in original], dtype=float)
+    high = np.array([y for x, y in original], dtype=float)
+    real = sampling.sample_intervals(low, high, size, rng, strategy)
 
-    return True
+    a = np.array([x for x, y in shrinked], dtype=float)
+    b = np.array([y for x, y in shrinked], dtype=float)
+    return np.all((real >= a) & (real <= b), axis=1)
 
 
 ##
-# \fn getSchedule(STN, schedule)
+# \fn getSchedule(STN, schedule, rng=None, durations=None)
 # \brief Construct a possible schedule for an STN given a fixed decision
 #
 # @param STN            An STNU we want to test
 # @param schedule       A dictionary with the fixed decision
+# @param rng            A seed or numpy Generator to draw durations from
+# @param durations      Optional durations of the contingent edges (in the
+#                       order of STN.contingentEdges), drawn if not given
 #
 # @return a schedule for the given STNU
-def getSchedule(STN, schedule):
-    for edge in list(STN.contingentEdges.values()):
+def getSchedule(STN, schedule, rng=None, durations=None):
+    if durations is None:
+        durations = sampling.sample_realizations(STN, 1, rng)[0]
+        durations = [durations[e.j] for e in STN.contingentEdges.values()]
+
+    for edge, real in zip(list(STN.contingentEdges.values()), durations):
         start_time = schedule[edge.i]
-        real = random.uniform(-edge.Cji, edge.Cij)
         time = start_time + real
         schedule[edge.j] = time
     return schedule
 
 
 ##
-# \fn altSampleOnce(STN, schedule)
+# \fn altSampleOnce(STN, schedule, rng=None, durations=None)
 # \brief Another strategy of sampling to test strong controllability
 #
 # @param STN            An STNU we want to test
 # @param schedule       A dictionary with the fixed decision
+# @param rng            A seed or numpy Generator to draw durations from
+# @param durations      Optional durations of the contingent edges
 #
 # @return Return True if the schedule generate is valid. Return False otherwise
-def altSampleOnce(STN, schedule):
-    s = getSchedule(STN, schedule)
+def altSampleOnce(STN, schedule, rng=None, durations=None):
+    s = getSchedule(STN, schedule, rng, durations)
     if scheduleIsValid(STN, s):
         return True
     return False
 
 
 ##
-# \fn sample(STN, success='default', LP='original')
-# \brief Compute the success rate of an STNU by randomly sample 50000 times
+# \fn sample(STN, success='default', LP='original', size=50000, seed=None,
+#            strategy='uniform', backend='pulp')
+# \brief Compute the success rate of an STNU by randomly sampling size times
 #
 # \note There are three kinds of LPs we can use to compute the amount of
 #       uncertainty removed from each contingent interval
 #
 # @param STN      An STN to test
 # @param LP       The type of LP we want to use
+# @param size     The number of realizations to sample
+# @param seed     A seed or numpy Generator to draw the realizations from
+# @param strategy How realizations are drawn (see sampling.py). The
+#                 low-discrepancy strategies need far fewer samples than
+#                 'uniform' for the same accuracy.
+# @param backend  'pulp' to solve the LP with PuLP (LP.py), or 'highs' to
+#                 solve it in-process with sparse_lp.py
 #
 # @return The degree of controllability and the success rate for input STN
-def sample(STN, success='default', LP='original'):
+def sample(STN, success='default', LP='original', size=50000, seed=None,
+           strategy='uniform', backend='pulp'):
+    solver = lpBackend(backend)
     if LP == 'original':
-        _, bounds, epsilons = originalLP(STN.copy(), naiveObj=False)
+        _, bounds, epsilons = solver.originalLP(STN.copy(), naiveObj=False)
     elif LP == 'proportion':
-        _, _, bounds, epsilons = proportionLP(STN.copy())
+        _, _, bounds, epsilons = solver.proportionLP(STN.copy())
     else:
-        _, _, bounds, epsilons = maxminLP(STN.copy())
+        _, _, bounds, epsilons = solver.maxminLP(STN.copy())
 
     original, shrinked = newInterval(STN, epsilons)
     degree = calculateMetric(original, shrinked)[2]
@@ -188,34 +207,62 @@ def sample(STN, success='default', LP='original'):
             schedule[i] = time
 
     # Collect the sample data.
-    count = 0
-    for i in range(50000):
-        result = sampleOnce(original, shrinked) if success == 'default' \
-                                else altSampleOnce(STN, schedule.copy())
-        if result:
-            count += 1
+    rng = sampling.get_rng(seed)
+    if success == 'default':
+        inside = sampleInside(original, shrinked, size, rng, strategy)
+        count = int(np.count_nonzero(inside))
+    else:
+        count = 0
+        _, low, high = sampling.contingent_bounds(STN)
+        realizations = sampling.sample_intervals(low, high, size, rng,
+                                                 strategy)
+        for durations in realizations:
+            if altSampleOnce(STN, schedule.copy(), durations=durations):
+                count += 1
 
-    success = float(count/50000)
+    success = float(count/size)
 
     return degree, success
 
 
 ##
-# \fn sampleAll(listOfFile, success='default', LP='original')
+# \fn sampleAll(listOfFile, success='default', LP='original', seed=None,
+#               size=50000, strategy='uniform', backend='pulp', store=None)
 # \brief Compute the success rate for a list of STNUs
 #
 # @param STN      An STN to test
 # @param LP       The type of LP we want to use
+# @param seed     A seed to spawn one random stream per file from
+# @param size     The number of realizations to sample per STNU
+# @param strategy How realizations are drawn (see sampling.py)
+# @param backend  The LP backend, 'pulp' or 'highs'
+# @param store    A results.ResultStore. STNUs already in it are skipped and
+#                 the others are stored as they are done. The stream of a
+#                 file is then spawned from seed (an integer or None) and the
+#                 content of the file rather than its position in the list.
 #
 # @return a list of (degree, success) tuple for STNUs in the list
-def sampleAll(listOfFile, success='default', LP='original'):
+def sampleAll(listOfFile, success='default', LP='original', seed=None,
+              size=50000, strategy='uniform', backend='pulp', store=None):
+    if store is not None:
+        def compute(path, digest):
+            print("Processing file: ", os.path.basename(path))
+            return sample(loadSTNfromJSONfile(path), success=success, LP=LP,
+                          size=size, seed=networkSeed(seed, digest),
+                          strategy=strategy, backend=backend)
+
+        params = {'success': success, 'LP': LP, 'seed': seed, 'size': size,
+                  'strategy': strategy, 'backend': backend}
+        return store.run(listOfFile, 'sample', compute, params)
+
     result = {}
-    for fname in listOfFile:
-        p, f = os.path.split(fname)
+    seeds = sampling.spawn_seeds(seed, len(listOfFile))
+    for (f, STN), file_seed in zip(Dataset(listOfFile), seeds):
         print("Processing file: ", f)
-        STN = loadSTNfromJSONfile(fname)
-        degree, success = sample(STN, success=success, LP=LP)
-        result[f] = (degree, success)
+        degree, rate = sample(STN, success=success, LP=LP, size=size,
+                              seed=file_seed, strategy=strategy,
+                              backend=backend)
+        result[f] = (degree, rate)
 
 
     return result
@@ -249,16 +296,25 @@ def actual_vol(result_name):
 
 
 ##
-# \fn compare(actual_Dict)
+# \fn compare(actual_Dict, backend='pulp', dynamic_folder=None,
+#             uncertain_folder=None)
 # \brief Compute the actual and approximated degree of strong controllability
 #
 # @param actual_Dict        A dictionary containing actual volume
+# @param backend            The LP backend, 'pulp' or 'highs'
+# @param dynamic_folder     The directory with DC STNUs (asked for if None)
+# @param uncertain_folder   The directory with uncertain STNUs (asked for if
+#                           None)
 #
 # @return A dictionary in which keys are the name of the network and values are
 #         (approximation, actual degree)
-def compare(actual_Dict):
-    dynamic_folder = input("Please input directory with DC STNUs:\n")
-    uncertain_folder = input("Please input directory with uncertain STNUs:\n")
+def compare(actual_Dict, backend='pulp', dynamic_folder=None,
+            uncertain_folder=None):
+    if dynamic_folder is None:
+        dynamic_folder = input("Please input directory with DC STNUs:\n")
+    if uncertain_folder is None:
+        uncertain_folder = input(
+            "Please input directory with uncertain STNUs:\n")
 
     compare_Dict = {}
     for x in list(actual_Dict.keys()):
@@ -271,7 +327,7 @@ def compare(actual_Dict):
 
         STN = loadSTNfromJSONfile(fname)
 
-        _, _, epsilons = originalLP(STN.copy())
+        _, _, epsilons = lpBackend(backend).originalLP(STN.copy())
         original, shrinked = newInterval(STN, epsilons)
 
         old, new, degree = calculateMetric(original, shrinked)
@@ -281,12 +337,38 @@ def compare(actual_Dict):
     return compare_Dict
 
 
+##
+# \fn plot(result_name=None, out_folder=None, dynamic_folder=None,
+#          uncertain_folder=None, seed=None, size=50000)
+# \brief Plot the approximated degree of strong controllability against the
+#        actual degree and against the success rate
+#
+# \details Arguments left to None are asked for.
+#
+# @param result_name        The json file with the solver's results
+# @param out_folder         The directory the png files are saved to
+# @param dynamic_folder     The directory with DC STNUs
+# @param uncertain_folder   The directory with uncertain STNUs
+# @param seed               The seed of the success rate sampling
+# @param size               The number of realizations sampled per STNU
+def plot(result_name=None, out_folder=None, dynamic_folder=None,
+         uncertain_folder=None, seed=None, size=50000):
+    import matplotlib.pyplot as plt
+
+    if result_name is None:
+        result_name = input("Please input path to result json file: \n")
+    if dynamic_folder is None:
+        dynamic_folder = input("Please input directory with DC STNUs:\n")
+    if uncertain_folder is None:
+        uncertain_folder = input(
+            "Please input directory with uncertain STNUs:\n")
+    if out_folder is None:
+        out_folder = input("Please input the output directory:\n")
 
-def plot():
     # Plot actual vs approximated
-    result_name = input("Please input path to result json file: \n")
     actual_Dict = actual_vol(result_name)
-    compare_Dict = compare(actual_Dict)
+    compare_Dict = compare(actual_Dict, dynamic_folder=dynamic_folder,
+                           uncertain_folder=uncertain_folder)
 
     L = list(compare_Dict.values())
     x = [d[0] for d in L]
@@ -299,20 +381,16 @@ def plot():
     plt.ylabel('Actual degree of strong controllability')
     plt.title('Accuracy of Approximation Using DSC LP')
 
-    out_folder = input("Please input the output directory:\n")
     fname = os.path.join(out_folder, 'accuracy.png')
     plt.savefig(fname, format='png')
     plt.close()
 
     # Plot success rate
-    dynamic_folder = input("Please input directory with DC STNUs:\n")
-    uncertain_folder = input("Please input directory with uncertain STNUs:\n")
-
     listOfFile = []
     listOfFile += glob.glob(os.path.join(dynamic_folder, '*.json'))
     listOfFile += glob.glob(os.path.join(uncertain_folder, '*.json'))
 
-    resultD_1= sampleAll(listOfFile, success='new')
+    resultD_1= sampleAll(listOfFile, success='new', seed=seed, size=size)
     result_1 = list(resultD_1.values())
     x_1 = [d[0] for d in result_1]
     y_1 = [d[1] for d in result_1]
@@ -323,7 +401,6 @@ def plot():
     plt.ylabel("Probabiliy of success")
     plt.title("Success rate of ...")
 
-    out_folder = input("Please input the output directory:\n")
     fname = os.path.join(out_folder, 'success_rate.png')
     plt.savefig(fname, format='png')
     plt.close()
@@ -348,28 +425,25 @@ def dynamicMetric(STN, new_STN):
 
 
 ##
-# \fn computeDynamic(nlp=True)
+# \fn computeDynamic(folders=None)
 # \brief compute degree of controllability for all uncontrollable STNUs we have
 #
-# @param nlp        Flag indicating whether we want to use NLP
+# @param folders    The directories (or files) of the STNUs, by default the
+#                   uncertain and chain folders asked for
 #
 # @return A dictionary in which keys are names of the STNU json file and value
 #         is the degree of controllability
-def computeDynamic(nlp=False):
-    uncertain_folder = input("Please input uncertain STNUs folder:\n")
-    chain_folder = input("Please input chain STNUs folde:\n")
-
-    listOfFile = []
-    listOfFile += glob.glob(os.path.join(uncertain_folder, '*.json'))
-    listOfFile += glob.glob(os.path.join(chain_folder, '*.json'))
+def computeDynamic(folders=None):
+    if folders is None:
+        uncertain_folder = input("Please input uncertain STNUs folder:\n")
+        chain_folder = input("Please input chain STNUs folde:\n")
+        folders = [uncertain_folder, chain_folder]
 
     degree = {}
-    for fname in listOfFile:
-        p, f = os.path.split(fname)
+    for f, STN in Dataset(folders):
         print("Processing: ", f)
 
-        STN = loadSTNfromJSONfile(fname)
-        new_STN, count = relaxSearch(STN.copy(), nlp=nlp)
+        new_STN, count = relaxSearch(STN.copy())[:2]
 
         if not new_STN:
             degree[f] = 0
@@ -381,22 +455,26 @@ def computeDynamic(nlp=False):
 
 
 ##
-# \fn generateData(num)
+# \fn generateData(num, seed=None, data_folder=None)
 # \brief generate uncontrollable STNUs with decent degree of dynamic
 #        controllability
 #
-# @param num    number of STNUs we want to generate
-def generateData(num):
-    data_folder = input("Please input destination directory:\n")
+# @param num            number of STNUs we want to generate
+# @param seed           A seed or numpy Generator used for all generated chains
+# @param data_folder    The destination directory (asked for if None)
+def generateData(num, seed=None, data_folder=None):
+    if data_folder is None:
+        data_folder = input("Please input destination directory:\n")
+    rng = sampling.get_rng(seed)
     while num != 0:
-        new = generateChain(50, 2500)
+        new = generateChain(50, 2500, seed=rng)
         result, conflicts, bounds, weight = DC_Checker(new.copy(), report=False)
 
         if result:
             print("Failed. Dynamically controllable...")
             continue
 
-        new_STN, count = relaxSearch(new.copy(), nlp=False)
+        new_STN, count = relaxSearch(new.copy())[:2]
         if not new_STN:
             print("Failed. Not able to resolve conflict...")
             continue
@@ -427,13 +505,27 @@ def readNeos(filename, json_folder):
         line = f.readline()
 
     obj_value = float(line[17:])
-    actual = math.exp(obj_value)
 
     p, f = os.path.split(filename)
     fname = f[:-4] + '.json'
     json_file = os.path.join(json_folder, fname)
 
     STN = loadSTNfromJSONfile(json_file)
+    return dynamicDegree(STN, obj_value)
+
+
+##
+# \fn dynamicDegree(STN, obj_value)
+# \brief compute degree of dynamic controllability from the optimal value of
+#        the model built by model.modelObjDynamic
+#
+# @param STN            An input STNU
+# @param obj_value      The optimal log volume of the conflicting contingent
+#                       edges
+#
+# @return an STNU's volume of Omega and Omega' and the computed degree of DC
+def dynamicDegree(STN, obj_value):
+    actual = math.exp(obj_value)
     result, conflicts, bounds, weight = DC_Checker(STN.copy(), report=False)
     contingent = bounds['contingent']
 
@@ -450,30 +542,53 @@ def readNeos(filename, json_folder):
 
 
 ##
-# \fn processNeos()
+# \fn processNeos(txt_folder=None, json_folder=None, output_folder=None)
 # \brief compute degree of dynamic controllability from the output file of
 #        Neos Server for all new chains we generated
 #
+# \details Single-conflict models are solved in closed form (see
+#          nlp.Problem.waterFilling), so the Neos output is only read for the
+#          others. Folders left to None are asked for.
+#
+# @param txt_folder     The folder with the txt Neos files
+# @param json_folder    The folder with the STNU json files
+# @param output_folder  The folder result_neos.json is saved to
+#
 # @return A dictionary of dictionary with information about an STNU's
 #         volume of Omega and Omega', and the computed degree of DC
-def processNeos():
-    txt_folder = input("Please input folder with txt Neos file:\n")
-    json_folder = input("Please input folder with json file:\n")
+def processNeos(txt_folder=None, json_folder=None, output_folder=None):
+    if txt_folder is None:
+        txt_folder = input("Please input folder with txt Neos file:\n")
+    if json_folder is None:
+        json_folder = input("Please input folder with json file:\n")
+    if output_folder is None:
+        output_folder = input("Please input output folder:\n")
 
     result = {}
-    text_L = glob.glob(os.path.join(txt_folder, '*.txt'))
-    for filename in text_L:
-        p, f = os.path.split(filename)
-        fname = f[:-4] + '.json'
+    json_L = glob.glob(os.path.join(json_folder, '*.json'))
+    for json_file in json_L:
+        p, fname = os.path.split(json_file)
         print("Processing: ", fname)
 
-        new, orig, degree = readNeos(filename, json_folder)
+        STN = loadSTNfromJSONfile(json_file)
+        obj_value = nlp.closedFormValue(STN)
+        if obj_value is None:
+            filename = os.path.join(txt_folder, fname[:-5] + '.txt')
+            if not os.path.exists(filename):
+                print("No Neos output for this file...")
+                continue
+            new, orig, degree = readNeos(filename, json_folder)
+        elif obj_value == float('-inf'):
+            print("The conflict cannot be resolved...")
+            continue
+        else:
+            new, orig, degree = dynamicDegree(STN, obj_value)
+
         result[fname] = {}
         result[fname]['shrinked'] = new
         result[fname]['original'] = orig
         result[fname]['degree'] = degree
 
-    output_folder = input("Please input output folder:\n")
     filename = os.path.join(output_folder, 'result_neos.json')
 
     with open(filename, 'w') as f:
@@ -482,16 +597,22 @@ def processNeos():
     return result
 
 
-
 ##
-# \fn processOptimal()
-# \brief compute degree of dynamic controllability using the optimal solution
-#        for all new chains we generated
+# \fn processLocal(json_folder=None, output_folder=None)
+# \brief compute degree of dynamic controllability for all new chains we
+#        generated, solving the models locally with nlp.py instead of NEOS
+#
+# @param json_folder    The folder with the STNU json files (asked for if None)
+# @param output_folder  The folder result_local.json is saved to (asked for if
+#                       None)
 #
 # @return A dictionary of dictionary with information about an STNU's
 #         volume of Omega and Omega', and the computed degree of DC
-def processOptimal():
-    json_folder = input("Please input folder with json file:\n")
+def processLocal(json_folder=None, output_folder=None):
+    if json_folder is None:
+        json_folder = input("Please input folder with json file:\n")
+    if output_folder is None:
+        output_folder = input("Please input output folder:\n")
     json_list = glob.glob(os.path.join(json_folder, '*.json'))
 
     result = {}
@@ -500,7 +621,47 @@ def processOptimal():
         print("Processing: ", f)
 
         STN = loadSTNfromJSONfile(fname)
-        new_STN, count = relaxSearch(STN.copy())
+        obj_value = nlp.getObjValue(STN, dynamic=True)
+        if obj_value is None:
+            print("The model has no feasible point...")
+            continue
+
+        new, orig, degree = dynamicDegree(STN, obj_value)
+        result[f] = {}
+        result[f]['shrinked'] = new
+        result[f]['original'] = orig
+        result[f]['degree'] = degree
+
+    filename = os.path.join(output_folder, 'result_local.json')
+
+    with open(filename, 'w') as f:
+        json.dump(result, f)
+
+    return result
+
+
+##
+# \fn processOptimal(json_folder=None, output_folder=None)
+# \brief compute degree of dynamic controllability using the optimal solution
+#        for all new chains we generated
+#
+# @param json_folder    The folder with the STNU json files (asked for if None)
+# @param output_folder  The folder result_optimal.json is saved to (asked for
+#                       if None)
+#
+# @return A dictionary of dictionary with information about an STNU's
+#         volume of Omega and Omega', and the computed degree of DC
+def processOptimal(json_folder=None, output_folder=None):
+    if json_folder is None:
+        json_folder = input("Please input folder with json file:\n")
+    if output_folder is None:
+        output_folder = input("Please input output folder:\n")
+
+    result = {}
+    for f, STN in Dataset(json_folder):
+        print("Processing: ", f)
+
+        new_STN, count = relaxSearch(STN.copy())[:2]
         new, orig, degree = dynamicMetric(STN.copy(), new_STN.copy())
 
         result[f] = {}
@@ -508,7 +669,6 @@ def processOptimal():
         result[f]['original'] = orig
         result[f]['degree'] = degree
 
-    output_folder = input("Please input output folder:\n")
     filename = os.path.join(output_folder, 'result_optimal.json')
 
     with open(filename, 'w') as f:
@@ -523,7 +683,7 @@ def processOptimal():
 # -------------------------------------------------------------------------
 
 ##
-# \fn generateChain(task, free)
+# \fn generateChain(task, free, seed=None)
 # \brief generate a consistent STNUs in a chainlike structure
 #
 # \details The chainlike STNU is very common in real life application, such as
@@ -534,17 +694,20 @@ def processOptimal():
 # @param task  The number of tasks need to be completed
 # @param free  The total length of the free constraint intervals we want
 #              in the generated STNU
+# @param seed  A seed or numpy Generator to draw the bounds from
 #
 # @return Return the generated STNU
-def generateChain(task, free):
+def generateChain(task, free, seed=None):
     totalEvent = 2 * (task+1)
+    rng = sampling.get_rng(seed)
+    randint = lambda a, b: int(rng.integers(a, b, endpoint=True))
 
     while True:
         new = STN()
         for i in range(totalEvent):
             new.addVertex(i)
 
-        L = [random.randint(0, 100) for i in range(task)]
+        L = [randint(0, 100) for i in range(task)]
         s = sum(L)
         L = [int(x/s*free) for x in L]
         diff = free - sum(L)
@@ -554,12 +717,12 @@ def generateChain(task, free):
         for i in range(totalEvent-1):
             type = 'stcu' if i % 2==0 else 'stc'
             if type == 'stcu':
-                lowBound = random.randint(0,50)
-                length = random.randint(1,50)
+                lowBound = randint(0,50)
+                length = randint(1,50)
                 bounds.append((lowBound, lowBound+length))
                 new.addEdge(i, i+1, lowBound, lowBound+length, type='stcu')
             else:
-                lowBound = random.randint(0,100)
+                lowBound = randint(0,100)
                 length = L[int((i-1)/2)]
                 bounds.append((lowBound, lowBound+length))
                 new.addEdge(i, i+1, lowBound, lowBound+length)
@@ -576,8 +739,19 @@ def generateChain(task, free):
             return new
 
 
-def generateParallelChain(agent, task):
+##
+# \fn generateParallelChain(agent, task, seed=None)
+# \brief generate a dynamically controllable STNU made of parallel chains
+#
+# @param agent The number of agents, each executing one chain
+# @param task  The number of tasks in each chain
+# @param seed  A seed or numpy Generator to draw the bounds from
+#
+# @return Return the generated STNU
+def generateParallelChain(agent, task, seed=None):
     total_event = ((2 * task) + 1) * agent + 1
+    rng = sampling.get_rng(seed)
+    randint = lambda a, b: int(rng.integers(a, b, endpoint=True))
 
     while True:
         new = STN()
@@ -599,14 +773,14 @@ def generateParallelChain(agent, task):
                 if type == 'stcu':
                     # low = round(random.uniform(10, 20), 2)
                     # high = round(random.uniform(30, 40), 2)
-                    low = random.randint(10, 20)
-                    high = random.randint(30, 40)
+                    low = randint(10, 20)
+                    high = randint(30, 40)
                     new.addEdge(j, j+1, low, high, type='stcu')
                 else:
                     # low = round(random.uniform(5, 10), 2)
                     # high = round(random.uniform(30, 35), 2)
-                    low = random.randint(5, 10)
-                    high = random.randint(35, 40)
+                    low = randint(5, 10)
+                    high = randint(35, 40)
                     new.addEdge(j, j+1, low, high)
 
             new.addEdge(end, total_event, -10, 10)
@@ -617,8 +791,8 @@ def generateParallelChain(agent, task):
 
         # low = round(random.uniform(0.35*up_bound, 0.45*up_bound), 2)
         # high = round(random.uniform(0.5*up_bound, 0.6*up_bound), 2)
-        low = random.randint(int(0.45*up_bound), int(0.53*up_bound))
-        high = random.randint(int(0.55*up_bound), int(0.65*up_bound))
+        low = randint(int(0.45*up_bound), int(0.53*up_bound))
+        high = randint(int(0.55*up_bound), int(0.65*up_bound))
         new.addEdge(0, total_event, low, high)
 
         print("\n\nChecking consistensy...")
@@ -0,0 +1,309 @@
+import numpy as np
+
+import sampling
+from stn import STN, packNetworks
+
+##
+# \file generator.py
+# \brief Generate large consistent STNUs directly as arrays of edges
+#
+# \details empirical.generateChain and empirical.generateParallelChain draw
+#          random bounds and retry until the network is consistent (and, for
+#          parallel chains, DC), which gets very slow for large networks.
+#          The generators here are consistent by construction: they first draw
+#          a witness schedule, an increasing time for every event in a
+#          topological order of the plan, then give every edge an interval
+#          that contains the difference of the witness times of its ends. The
+#          witness schedule satisfies every constraint, so the network is
+#          consistent (contingent edges included). Dynamic controllability is
+#          not guaranteed.
+#
+#          Everything is drawn with vectorized numpy calls, so networks with
+#          millions of edges take seconds. The result is an EdgeTable, which
+#          can be turned into an STN, a JSON object, or written to a packed
+#          file (see stn/stnpack.py).
+#
+#          Parameters shared by the generators:
+#          - contingent: the fraction of eligible edges made contingent. Only
+#            precedence edges are eligible, and an event gets at most one
+#            incoming contingent edge.
+#          - duration:   (low, high) range of the witness durations of
+#            precedence edges
+#          - slack:      (low, high) range of how far the bounds of an edge
+#            reach beyond its witness duration, on each side. A positive
+#            minimum keeps the witness strictly inside every interval, so
+#            consistency does not hinge on floating point rounding.
+#          - seed:       a seed or numpy Generator (see sampling.py)
+
+
+##
+# \class EdgeTable
+# \brief The events and edges of a generated STNU as numpy arrays
+#
+# \details Events are 0 (the zero timepoint) to events - 1. Edge k goes from
+#          first[k] to second[k] with bounds [low[k], high[k]], and is
+#          contingent if contingent[k].
+class EdgeTable(object):
+
+    ## \brief EdgeTable Constructor
+    def __init__(self, events, first, second, low, high, contingent,
+                 witness=None):
+        ## The number of events, including the zero timepoint
+        self.events = events
+        self.first = first
+        self.second = second
+        self.low = low
+        self.high = high
+        self.contingent = contingent
+
+        ## A schedule (one time per event) satisfying every edge
+        self.witness = witness
+
+    ## \brief The number of edges
+    def __len__(self):
+        return len(self.first)
+
+    ## \brief Check that the witness schedule satisfies every edge
+    def isWitnessed(self):
+        diff = self.witness[self.second] - self.witness[self.first]
+        return bool(np.all((self.low <= diff + 1e-9) &
+                           (diff <= self.high + 1e-9)))
+
+    ## \brief The network as arrays in the layout of PackedSTNs.network
+    def arrays(self):
+        return {'nodes': np.arange(1, self.events), 'first': self.first,
+                'second': self.second, 'low': self.low, 'high': self.high,
+                'type': self.contingent.astype(np.uint8)}
+
+    ## \brief The network as an STN object
+    def toSTN(self):
+        types = np.where(self.contingent, 'stcu', 'stc').tolist()
+        edges = list(zip(self.first.tolist(), self.second.tolist(),
+                         self.low.tolist(), self.high.tolist(), types,
+                         [None] * len(self)))
+        S = STN()
+        S.addBulk(range(self.events), edges)
+        return S
+
+    ## \brief The network as a JSON object (see stn/stnjsontools.py)
+    def toJSONobj(self):
+        types = np.where(self.contingent, 'stcu', 'stc').tolist()
+        constraints = [{'first_node': i, 'second_node': j, 'type': t,
+                        'min_duration': low, 'max_duration': high}
+                       for i, j, t, low, high in zip(
+                           self.first.tolist(), self.second.tolist(), types,
+                           self.low.tolist(), self.high.tolist())]
+        return {'nodes': [{'node_id': v} for v in range(1, self.events)],
+                'constraints': constraints}
+
+
+##
+# \fn pack(tables, path, names=None)
+# \brief Write generated networks to a packed file
+#
+# @param tables     A list of EdgeTables
+# @param path       The filename of the packed file
+# @param names      The names of the networks, defaults to their indices
+#
+# @post A packed file that stn.PackedSTNs can read
+def pack(tables, path, names=None):
+    packNetworks([table.arrays() for table in tables], path, names)
+
+
+##
+# \fn build(events, first, second, witness, precedence, contingent, slack,
+#           rng)
+# \brief Give bounds to edges around the witness schedule and pick the
+#        contingent ones
+#
+# @param events         The number of events
+# @param first          The start events of the edges
+# @param second         The end events of the edges
+# @param witness        The witness schedule
+# @param precedence     Boolean array, True for edges that order their ends
+#                       (lower bound kept nonnegative, eligible to be
+#                       contingent)
+# @param contingent     The fraction of eligible edges made contingent
+# @param slack          (low, high) range of the slack on each side
+# @param rng            A numpy Generator
+#
+# @return An EdgeTable
+def build(events, first, second, witness, precedence, contingent, slack, rng):
+    m = len(first)
+    diff = witness[second] - witness[first]
+    low = diff - rng.uniform(slack[0], slack[1], m)
+    high = diff + rng.uniform(slack[0], slack[1], m)
+    low = np.where(precedence, np.maximum(low, 0.0), low)
+
+    # Eligible edges drawn as contingent, keeping one per end event
+    draw = precedence & (rng.random(m) < contingent)
+    candidates = np.flatnonzero(draw)
+    _, keep = np.unique(second[candidates], return_index=True)
+    isContingent = np.zeros(m, dtype=bool)
+    isContingent[candidates[keep]] = True
+
+    # Round outwards, so the bounds still contain the witness durations
+    return EdgeTable(events, first, second, np.floor(low * 1e4) / 1e4,
+                     np.ceil(high * 1e4) / 1e4, isContingent, witness)
+
+
+##
+# \fn chain(tasks, contingent=0.5, duration=(1, 50), slack=(1, 20),
+#           deadline=0.5, seed=None)
+# \brief A single chain of events, like empirical.generateChain
+#
+# @param tasks      The number of links in the chain
+# @param deadline   Where the deadline edge from the zero timepoint to the end
+#                   of the chain falls between the witness end time (0) and
+#                   the sum of the upper bounds of the links (1)
+#
+# @return An EdgeTable with tasks + 1 events and tasks + 1 edges
+def chain(tasks, contingent=0.5, duration=(1, 50), slack=(1, 20),
+          deadline=0.5, seed=None):
+    rng = sampling.get_rng(seed)
+    events = tasks + 1
+    witness = np.concatenate(
+        ([0.0], np.cumsum(rng.uniform(duration[0], duration[1], tasks))))
+
+    first = np.arange(tasks)
+    second = first + 1
+    table = build(events, first, second, witness, np.ones(tasks, dtype=bool),
+                  contingent, slack, rng)
+    if tasks < 2:
+        return table
+
+    # The deadline edge from the zero timepoint to the end of the chain
+    end = witness[-1]
+    bound = np.ceil((end + deadline * (table.high.sum() - end)) * 1e4) / 1e4
+    table.first = np.append(table.first, 0)
+    table.second = np.append(table.second, events - 1)
+    table.low = np.append(table.low, 0.0)
+    table.high = np.append(table.high, bound)
+    table.contingent = np.append(table.contingent, False)
+    return table
+
+
+##
+# \fn parallelChains(agents, tasks, contingent=0.5, duration=(1, 50),
+#                    slack=(1, 20), sync=10.0, seed=None)
+# \brief Chains of tasks, one per agent, that start at the zero timepoint and
+#        end together at a final event, like empirical.generateParallelChain
+#
+# @param agents     The number of chains
+# @param tasks      The number of links in each chain
+# @param sync       Bound on how far apart each chain end may be from the
+#                   final event, on top of its witness difference
+#
+# @return An EdgeTable with agents * tasks + 2 events
+def parallelChains(agents, tasks, contingent=0.5, duration=(1, 50),
+                   slack=(1, 20), sync=10.0, seed=None):
+    rng = sampling.get_rng(seed)
+    final = agents * tasks + 1
+    events = final + 1
+
+    # Agent a owns events 1 + a*tasks to (a+1)*tasks
+    durations = rng.uniform(duration[0], duration[1], (agents, tasks))
+    times = np.cumsum(durations, axis=1)
+    witness = np.zeros(events)
+    witness[1:final] = times.ravel()
+    witness[final] = times[:, -1].max() + rng.uniform(0, sync)
+
+    ids = np.arange(1, final).reshape(agents, tasks)
+    starts = np.concatenate((np.zeros((agents, 1), dtype=int), ids[:, :-1]),
+                            axis=1)
+    first = np.concatenate((starts.ravel(), ids[:, -1]))
+    second = np.concatenate((ids.ravel(), np.full(agents, final)))
+    precedence = np.arange(len(first)) < agents * tasks
+
+    table = build(events, first, second, witness, precedence, contingent,
+                  slack, rng)
+    # Chain ends may also be up to `sync` after the final event
+    ends = ~precedence
+    table.low[ends] = np.minimum(table.low[ends], -sync)
+    return table
+
+
+##
+# \fn randomPlan(events, density=2.0, contingent=0.3, duration=(1, 50),
+#                slack=(1, 20), seed=None)
+# \brief A random partially ordered plan
+#
+# \details Events 1 to events - 1 are in topological order. Each of them gets
+#          one predecessor drawn among the earlier events (the zero timepoint
+#          included), and further precedence edges between random pairs of
+#          events are added until there are about density * events edges.
+#
+# @param events     The number of events, including the zero timepoint
+# @param density    The average number of edges per event
+#
+# @return An EdgeTable
+def randomPlan(events, density=2.0, contingent=0.3, duration=(1, 50),
+               slack=(1, 20), seed=None):
+    rng = sampling.get_rng(seed)
+    n = events
+
+    # Gaps between consecutive events in the topological order. An edge from
+    # i to j then has witness duration witness[j] - witness[i] > 0.
+    witness = np.concatenate(
+        ([0.0], np.cumsum(rng.uniform(duration[0], duration[1], n - 1))))
+
+    # One predecessor per event, drawn close to it so durations stay in range
+    second = np.arange(1, n)
+    back = np.minimum(rng.geometric(0.5, n - 1), second)
+    first = second - back
+
+    extra = max(int(density * n) - (n - 1), 0)
+    if extra:
+        j = rng.integers(2, n, extra) if n > 2 else np.zeros(0, dtype=int)
+        i = j - np.minimum(rng.geometric(0.2, len(j)), j)
+        first = np.concatenate((first, i))
+        second = np.concatenate((second, j))
+
+    # Drop repeated pairs, keeping the first occurrence
+    _, keep = np.unique(first.astype(np.int64) * n + second,
+                        return_index=True)
+    keep.sort()
+    first, second = first[keep], second[keep]
+
+    return build(n, first, second, witness, np.ones(len(first), dtype=bool),
+                 contingent, slack, rng)
+
+
+##
+# \fn agentGrid(agents, tasks, syncEvery=5, contingent=0.5, duration=(1, 50),
+#               slack=(1, 20), seed=None)
+# \brief Chains of tasks, one per agent, with sync points between neighbouring
+#        agents every few tasks
+#
+# \details Agent a owns events 1 + a*tasks to (a+1)*tasks. Every `syncEvery`
+#          tasks, the events of neighbouring agents at the same step are tied
+#          by a requirement edge whose bounds contain their witness
+#          difference (which can be negative).
+#
+# @param agents     The number of chains
+# @param tasks      The number of links in each chain
+# @param syncEvery  The number of tasks between sync points
+#
+# @return An EdgeTable
+def agentGrid(agents, tasks, syncEvery=5, contingent=0.5, duration=(1, 50),
+              slack=(1, 20), seed=None):
+    rng = sampling.get_rng(seed)
+    events = agents * tasks + 1
+
+    times = np.cumsum(rng.uniform(duration[0], duration[1], (agents, tasks)),
+                      axis=1)
+    witness = np.concatenate(([0.0], times.ravel()))
+
+    ids = np.arange(1, events).reshape(agents, tasks)
+    starts = np.concatenate((np.zeros((agents, 1), dtype=int), ids[:, :-1]),
+                            axis=1)
+    steps = np.arange(syncEvery - 1, tasks, syncEvery)
+    syncFirst = ids[:-1, steps].ravel()
+    syncSecond = ids[1:, steps].ravel()
+
+    first = np.concatenate((starts.ravel(), syncFirst))
+    second = np.concatenate((ids.ravel(), syncSecond))
+    precedence = np.arange(len(first)) < agents * tasks
+
+    return build(events, first, second, witness, precedence, contingent,
+                 slack, rng)
@@ -0,0 +1,168 @@
+import contextlib
+import json
+import os
+import time
+from collections import defaultdict
+
+##
+# \file instrument.py
+# \brief Opt-in counters and phase timers for the DC checkers
+#
+# \details Instrumentation is off unless some code runs inside collect():
+#
+#              with instrument.collect() as stats:
+#                  DC_Checker(STN)
+#              print(stats.toDict())
+#
+#          Instrumented functions call active() once, which returns None when
+#          nothing is being collected, and only touch the counters behind an
+#          `if stats is not None` check, so the disabled cost is one local
+#          comparison per counted event. Phases are timed with phase(), which
+#          is a no-op context when disabled.
+#
+#          Counters recorded by algorithm.DCDijkstra and DC_Checker:
+#          - DCDijkstra.calls, DCDijkstra.novelEdges
+#          - heap.push, heap.pop, heap.decKeyScans (queue entries scanned by
+#            PriorityQueue.addOrDecKey)
+#          - DCDijkstra.depth (maximum recursion depth)
+#          - time in DC_Checker.normal, DC_Checker.search, DC_Checker.conflict
+#
+#          and by dc_stn.DC_STN.is_DC:
+#          - is_DC.iterations, floydWarshall.calls
+#          - the series is_DC.reductions, one {family: reductions} per
+#            iteration
+#          - time in is_DC.all_max_consistent and in each reduction family
+#
+#          and by the memoized functions of memo.py: memo.hits, memo.misses
+
+
+## The statistics being collected, None when instrumentation is off
+_current = None
+
+
+##
+# \class Stats
+# \brief Counters, maxima, phase times and per-iteration series
+class Stats(object):
+
+    ## \brief Stats Constructor
+    #  \param name      A name for what is measured (e.g. the network file)
+    def __init__(self, name=None):
+        self.name = name
+        self.counters = defaultdict(int)
+        self.maxima = {}
+        self.times = defaultdict(float)
+        self.series = defaultdict(list)
+
+    ## \brief Add n to a counter
+    def add(self, key, n=1):
+        self.counters[key] += n
+
+    ## \brief Keep the maximum of the values seen for a key
+    def max(self, key, value):
+        if value > self.maxima.get(key, value - 1):
+            self.maxima[key] = value
+
+    ## \brief Append a value to a series
+    def record(self, key, value):
+        self.series[key].append(value)
+
+    ## \brief Time the enclosed code and add it to a phase
+    @contextlib.contextmanager
+    def phase(self, key):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[key] += time.perf_counter() - start
+
+    ## \brief Add the statistics of another Stats object to this one
+    def merge(self, other):
+        for key, n in other.counters.items():
+            self.counters[key] += n
+        for key, value in other.maxima.items():
+            self.max(key, value)
+        for key, t in other.times.items():
+            self.times[key] += t
+        for key, values in other.series.items():
+            self.series[key] += values
+
+    ## \brief The statistics as a JSON-ready dictionary
+    def toDict(self):
+        return {'name': self.name, 'counters': dict(self.counters),
+                'maxima': dict(self.maxima), 'times': dict(self.times),
+                'series': dict(self.series)}
+
+    ## \brief Write the statistics to a JSON file
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.toDict(), f, indent=1)
+
+    def __repr__(self):
+        return "Stats({})".format(self.toDict())
+
+
+##
+# \fn active()
+# \brief The Stats object being collected into, or None
+def active():
+    return _current
+
+
+##
+# \fn collect(name=None)
+# \brief Collect statistics of the code run inside the context
+#
+# \details Contexts can be nested; the inner one collects on its own and is
+#          merged into the outer one when it ends.
+#
+# @param name       A name stored with the statistics
+#
+# @return A context yielding the Stats object
+@contextlib.contextmanager
+def collect(name=None):
+    global _current
+    outer = _current
+    stats = Stats(name)
+    _current = stats
+    try:
+        yield stats
+    finally:
+        _current = outer
+        if outer is not None:
+            outer.merge(stats)
+
+
+##
+# \fn phase(key)
+# \brief Time the enclosed code into a phase of the active Stats, if any
+def phase(key):
+    if _current is None:
+        return contextlib.nullcontext()
+    return _current.phase(key)
+
+
+##
+# \fn collectFiles(listOfFile, function, outfolder=None)
+# \brief Run a function on every STN json file with instrumentation on
+#
+# @param listOfFile     Paths of STN json files
+# @param function       The function to run on each STN, e.g. DC_Checker
+# @param outfolder      If given, the statistics of each file are saved there
+#                       as <file name>.stats.json
+#
+# @return A dictionary of Stats objects keyed by file name
+def collectFiles(listOfFile, function, outfolder=None):
+    from stn import loadSTNfromJSONfile
+
+    result = {}
+    for fname in listOfFile:
+        f = os.path.basename(fname)
+        STN = loadSTNfromJSONfile(fname)
+        with collect(f) as stats:
+            function(STN)
+        result[f] = stats
+
+        if outfolder is not None:
+            stats.save(os.path.join(outfolder, f[:-5] + '.stats.json'))
+    return result
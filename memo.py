@@ -0,0 +1,218 @@
+import contextlib
+import copy
+import functools
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+
+import instrument
+
+##
+# \file memo.py
+# \brief Memoization of the expensive analyses of a network, keyed by the
+#        fingerprint of the STN
+#
+# \details DC_Checker, relaxSearch, LP.originalLP, sparse_lp.originalLP and
+#          prob_of_DC are wrapped with the memoized decorator. A call on a
+#          network that was analysed before with the same arguments (e.g.
+#          the same json file loaded again by sampleAll and then by compare)
+#          returns the earlier result instead of computing it again.
+#
+#          Results are keyed by the name of the function, STN.fingerprint()
+#          of its first argument and the repr of its other arguments. The
+#          fingerprint is a hash of the content of the network that every
+#          mutating STN method resets, so a modified network is a new key.
+#
+#          Memoization is off until configure() is called, since keying
+#          and copying results costs time on networks that are only analysed
+#          once. configure() keeps results in memory in a least recently
+#          used table of MAXSIZE entries, and configure(folder=...) also
+#          pickles them to that folder, which makes them available to later
+#          runs and to worker processes. Every hit returns a copy of the
+#          result, so callers are free to modify it.
+#
+#          The memoized functions do not modify their input network (those
+#          that change a network work on a copy of it), so a call has the
+#          same effects whether or not it hits. A hit does no work:
+#          instrument and tracing see no calls inside it. The memo counts
+#          memo.hits and memo.misses in the instrument statistics being
+#          collected.
+#
+#              memo.configure(folder='result/memo')
+#              with memo.disabled():
+#                  DC_Checker(STN)         # always computed
+
+
+## The default number of results kept in memory
+MAXSIZE = 1024
+
+## The version of the stored results, bumped whenever a memoized function
+#  changes its results so that stale pickles are not loaded
+MEMO_VERSION = 1
+
+## The memoized functions, keyed by name
+REGISTRY = {}
+
+
+##
+# \class Memo
+# \brief A least recently used table of results with an optional folder of
+#        pickles behind it
+class Memo(object):
+
+    ## \brief Memo Constructor
+    #  \param maxsize   The number of results kept in memory
+    #  \param folder    The folder results are pickled to, or None
+    def __init__(self, maxsize=MAXSIZE, folder=None):
+        self.maxsize = maxsize
+        self.folder = folder
+        self.enabled = True
+        self.table = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if folder is not None:
+            os.makedirs(folder, exist_ok=True)
+
+    ## \brief The file a result is pickled to
+    def _file(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.folder,
+                            '%s-%s.v%d.pickle' % (key[0], digest, MEMO_VERSION))
+
+    ##
+    # \brief Look up a result
+    #
+    # @param key        The key of the result
+    # @param default    Returned if the result is not stored
+    def get(self, key, default=None):
+        if key in self.table:
+            self.table.move_to_end(key)
+            return self.table[key]
+
+        if self.folder is not None:
+            try:
+                with open(self._file(key), 'rb') as f:
+                    value = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                return default
+            self._keep(key, value)
+            return value
+        return default
+
+    ## \brief Store a result
+    def put(self, key, value):
+        self._keep(key, value)
+        if self.folder is not None:
+            fname = self._file(key)
+            tmp = '%s.%d.tmp' % (fname, os.getpid())
+            try:
+                with open(tmp, 'wb') as f:
+                    pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, fname)
+            except (OSError, pickle.PicklingError, TypeError,
+                    AttributeError):
+                # Results that cannot be pickled are only kept in memory
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+
+    ## \brief Keep a result in memory, dropping the least recently used
+    def _keep(self, key, value):
+        self.table[key] = value
+        self.table.move_to_end(key)
+        while len(self.table) > self.maxsize:
+            self.table.popitem(last=False)
+
+    ## \brief Forget the results kept in memory (not the pickled ones)
+    def clear(self):
+        self.table.clear()
+        self.hits = 0
+        self.misses = 0
+
+    ## \brief Hits, misses and size of the memo
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self.table), 'maxsize': self.maxsize,
+                'folder': self.folder, 'enabled': self.enabled}
+
+
+## The memo used by the memoized functions, None when memoization is off
+_memo = None
+
+
+##
+# \fn configure(maxsize=MAXSIZE, folder=None)
+# \brief Turn memoization on with a new memo, e.g. to keep results on disk
+#
+# @param maxsize    The number of results kept in memory
+# @param folder     The folder results are pickled to, or None
+#
+# @return The new Memo
+def configure(maxsize=MAXSIZE, folder=None):
+    global _memo
+    _memo = Memo(maxsize, folder)
+    return _memo
+
+
+##
+# \fn current()
+# \brief The memo used by the memoized functions, None when memoization is
+#        off
+def current():
+    return _memo
+
+
+##
+# \fn disabled()
+# \brief A context in which memoized functions always compute their result,
+#        e.g. to time them
+@contextlib.contextmanager
+def disabled():
+    memo = _memo
+    if memo is None:
+        yield None
+        return
+    enabled, memo.enabled = memo.enabled, False
+    try:
+        yield memo
+    finally:
+        memo.enabled = enabled
+
+
+##
+# \fn memoized(name=None)
+# \brief Decorator memoizing a function whose first argument is an STN
+#
+# @param name       The name of the results, the function name by default
+#
+# @return The decorator. The memoized function is added to REGISTRY.
+def memoized(name=None):
+    def decorate(function):
+        key = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(network, *args, **kwargs):
+            memo = _memo
+            if memo is None or not memo.enabled:
+                return function(network, *args, **kwargs)
+
+            k = (key, network.fingerprint(), repr(args),
+                 repr(sorted(kwargs.items())))
+            stats = instrument.active()
+            value = memo.get(k, memo)
+            if value is not memo:
+                memo.hits += 1
+                if stats is not None:
+                    stats.add('memo.hits')
+                return copy.deepcopy(value)
+
+            memo.misses += 1
+            if stats is not None:
+                stats.add('memo.misses')
+            value = function(network, *args, **kwargs)
+            memo.put(k, copy.deepcopy(value))
+            return value
+
+        REGISTRY[key] = wrapper
+        return wrapper
+    return decorate
@@ -1,68 +1,126 @@
 from stn import STN
 from stn import loadSTNfromJSONfile
+from stn import Dataset
 from algorithm import *
 import os
-import glob
+import json
 
 ## \file model.py
 #  \brief convert STNU to optimization problem in an AMPL format file
 
 MAX_FLOAT = 10000000000
 
+##
+# \fn formatLinear(expr)
+# \brief Write a linear expression of the model in AMPL syntax
+#
+# @param expr       A list of terms (coef, var) as in buildModel
+#
+# @return The expression as a string, e.g. 'T3HI - T1LO' or '5.0 - EPS3HI'
+def formatLinear(expr):
+    text = ''
+    for coef, var in expr:
+        if var is None:
+            sign, term = '+', str(coef)
+        else:
+            sign, term = '-' if coef < 0 else '+', var
+        if text:
+            text += ' %s %s' % (sign, term)
+        else:
+            text = term if sign == '+' else '-' + term
+    return text
+
+
+##
+# \fn emitAMPL(variables, objective, constraints)
+# \brief Generate the AMPL model file of a model piece by piece
+#
+# @param variables      A list of variables (name, lowbound, upbound)
+# @param objective      A list of linear expressions whose logs are summed
+# @param constraints    A list of constraints (name, lhs, op, rhs)
+#
+# @return A generator of strings that concatenate to the model file
+def emitAMPL(variables, objective, constraints):
+    for name, low, high in variables:
+        if high is None:
+            yield 'var %s >= %s;\n' % (name, low)
+        else:
+            yield 'var %s >= %s, <= %s;\n' % (name, low, high)
+
+    yield '\nmaximize VOLUME: '
+    for k, expr in enumerate(objective):
+        yield '%slog(%s)' % (' + ' if k else '', formatLinear(expr))
+    yield ';\n\n'
+
+    for name, lhs, op, rhs in constraints:
+        yield 'subject to %s: %s %s %s;\n' % \
+            (name, formatLinear(lhs), op, formatLinear(rhs))
+
+
 # -------------------------------------------------------------------------
 # Strong controllability
 # -------------------------------------------------------------------------
 
 ##
-# \fn prepare(STN)
-# \brief extract all constraints, variables, and Objective function for the
-#        optimization problem of an STNU
+# \fn buildModel(STN)
+# \brief extract all variables, the objective function and all constraints
+#        of the optimization problem of an STNU
 #
-# @param STN        An STN to be processed
+# \details The model is returned in structural form, which emitAMPL writes
+#          to a model file and nlp.Problem solves locally. A linear
+#          expression is a list of terms (coef, var) with coef 1 or -1 for a
+#          variable, and (value, None) for a constant.
 #
-# @return A dictionary of bound variables and a dictionary of epsilon variable
-#         in the form of (var, lowbound, upbound). A dictionary of constraints
-#         and the objective function in string form.
-def prepare(STN):
-    bounds = {}
-    epsilons = {}
-    constraints = {}
-
+# @param STN        An STN to be processed (its makespan is set when some
+#                   events are unbounded)
+#
+# @return A list of variables (name, lowbound, upbound) with None for no
+#         upper bound, a list of the linear expressions whose logs are summed
+#         in the objective and a list of constraints (name, lhs, op, rhs)
+def buildModel(STN):
     for i in STN.verts:
         if STN.getEdgeWeight(0,i) == float('inf'):
             STN.setMakespan(MAX_FLOAT)
             break
 
-    for i in list(STN.verts.keys()):
-        bounds[(i, '+')] = ('T%iHI'%i, 0, STN.getEdgeWeight(0,i))
-
+    verts = list(STN.verts.keys())
+    variables = []
+    for i in verts:
         low = 0 if STN.getEdgeWeight(i,0) == float('inf') else\
                             -STN.getEdgeWeight(i,0)
+        variables.append(('T%iHI'%i, 0, STN.getEdgeWeight(0,i)))
+        variables.append(('T%iLO'%i, low, None))
 
-        bounds[(i, '-')] = ('T%iLO'%i, low, None)
-
+    for i in verts:
         if i in STN.uncontrollables:
-            epsilons[(i, '-')] = ('EPS%iLO'%i, 0, None)
-            epsilons[(i, '+')] = ('EPS%iHI'%i, 0, None)
-            constraints[i] = bounds[(i, '-')][0] + " <= " + bounds[(i, '+')][0]
-        elif i == 0:
-            constraints[(i, '-')] = bounds[(i, '-')][0] + " == 0"
-            constraints[(i, '+')] = bounds[(i, '+')][0] + " == 0"
-        else:
-            constraints[i] = bounds[(i, '-')][0] + " == " + bounds[(i, '+')][0]
+            variables.append(('EPS%iLO'%i, 0, None))
+            variables.append(('EPS%iHI'%i, 0, None))
+
+    objective = [[(1, 'T%iHI'%i), (-1, 'T%iLO'%i)]
+                 for i in STN.uncontrollables]
 
+    constraints = []
+    for i in verts:
+        high, low = [(1, 'T%iHI'%i)], [(1, 'T%iLO'%i)]
+        if i == 0:
+            constraints.append(('ZERO_U', low, '==', [(0, None)]))
+            constraints.append(('ZERO_L', high, '==', [(0, None)]))
+        elif i in STN.uncontrollables:
+            constraints.append(('LIMIT%i'%i, low, '<=', high))
+        else:
+            constraints.append(('LIMIT%i'%i, low, '==', high))
 
     for i,j in STN.edges:
+        name = 'C%i_%i' % (i, j)
         if (i,j) in STN.contingentEdges:
-
-            constraints[(i, j, '+')] = bounds[(j, '+')][0] + ' - ' + \
-                bounds[(i, '+')][0] + ' == ' + str(STN.getEdgeWeight(i,j)) \
-                + ' - ' + epsilons[(j, '+')][0]
-            constraints[(i, j, '-')] = bounds[(j, '-')][0] + ' - ' + \
-                bounds[(i, '-')][0] + ' == ' + str(-STN.getEdgeWeight(j,i))\
-                + ' + ' + epsilons[(j, '-')][0]
-
-
+            constraints.append((name + 'U',
+                                [(1, 'T%iHI'%j), (-1, 'T%iHI'%i)], '==',
+                                [(STN.getEdgeWeight(i,j), None),
+                                 (-1, 'EPS%iHI'%j)]))
+            constraints.append((name + 'L',
+                                [(1, 'T%iLO'%j), (-1, 'T%iLO'%i)], '==',
+                                [(-STN.getEdgeWeight(j,i), None),
+                                 (1, 'EPS%iLO'%j)]))
         else:
             # NOTE: We need to handle the infinite weight edges. Otherwise
             #       the LP would be infeasible
@@ -70,20 +128,26 @@ def prepare(STN):
                                             else STN.getEdgeWeight(i,j)
             low = MAX_FLOAT if STN.getEdgeWeight(j,i) == float('inf') \
                                             else STN.getEdgeWeight(j,i)
+            constraints.append((name + 'U',
+                                [(1, 'T%iHI'%j), (-1, 'T%iLO'%i)], '<=',
+                                [(high, None)]))
+            constraints.append((name + 'L',
+                                [(1, 'T%iHI'%i), (-1, 'T%iLO'%j)], '<=',
+                                [(low, None)]))
 
-            constraints[(i, j, '+')] = bounds[(j, '+')][0] + ' - ' + \
-                                        bounds[(i, '-')][0] + ' <= ' + str(high)
-            constraints[(i, j, '-')] = bounds[(i, '+')][0] + ' - ' + \
-                                        bounds[(j, '-')][0] + ' <= ' + str(low)
-
+    return variables, objective, constraints
 
-    Obj = ''
-    for i in STN.uncontrollables:
-        Obj += 'log(' + bounds[(i, '+')][0] + ' - ' + bounds[(i, '-')][0] \
-                                                                        + ') + '
-    Obj = Obj[:-3]
 
-    return bounds, epsilons, constraints, Obj
+##
+# \fn emitModel(STN)
+# \brief Generate the AMPL model of the strong controllability problem piece
+#        by piece
+#
+# @param STN        An STN to be processed (modified as in buildModel)
+#
+# @return A generator of strings that concatenate to the model file
+def emitModel(STN):
+    return emitAMPL(*buildModel(STN))
 
 
 ##
@@ -96,51 +160,8 @@ def prepare(STN):
 # @post An AMPL format model file that contains optimization problem for the
 #       input STN
 def modelObj(STN, fname):
-    bounds, epsilons, constraints, Obj = prepare(STN)
-
-    f = open(fname, 'w')
-    for v, l, h in list(bounds.values()):
-        line = 'var ' + v + ' >= ' + str(l)
-
-        if h != None:
-            line += ', <= ' + str(h)
-
-        line += ';'
-        f.write(line +'\n')
-
-    for v, l, h in list(epsilons.values()):
-        line = 'var ' + v + ' >= ' + str(l)
-
-        if h != None:
-            line += ', <= ' + str(h)
-
-        line += ';'
-        f.write(line +'\n')
-
-    Obj_line = '\nmaximize VOLUME: ' + Obj + ';\n\n'
-    f.write(Obj_line)
-
-    for i in list(STN.verts.keys()):
-        line = 'subject to '
-        if i == 0:
-            upper = 'ZERO_U: ' + constraints[(i, '-')] + ';\n'
-            lower = 'ZERO_L: ' + constraints[(i, '+')] + ';\n'
-            f.write(line + upper + line + lower)
-            del constraints[(i, '-')]
-            del constraints[(i, '+')]
-        else:
-            line += 'LIMIT' + str(i) + ': ' + constraints[i] + ';\n'
-            f.write(line)
-            del constraints[i]
-
-
-    for i,j,x in list(constraints.keys()):
-        con = constraints[(i, j, x)]
-        L = 'L' if x == '-' else 'U'
-        line = 'subject to C' + str(i) + '_' + str(j) + L + ': ' + con + ';\n'
-        f.write(line)
-
-    f.close()
+    with open(fname, 'w') as f:
+        f.writelines(emitModel(STN))
 
 
 ##
@@ -163,67 +184,74 @@ def modelFile(path):
 # -------------------------------------------------------------------------
 
 ##
-# \fn prepareDynamic(STN)
-# \brief extract all constraints, variables, and Objective function for the
-#        optimization problem of an STNU (degree of DC)
+# \fn buildModelDynamic(STN)
+# \brief extract all variables, the objective function and the constraint of
+#        the optimization problem of an STNU (degree of DC)
 #
-# @param STN        An STN to be processed
+# @param STN        An STN to be processed (not modified)
 #
-# @return A dictionary of epsilons variables and constraint, objective
-#         function string
-def prepareDynamic(STN):
-    epsilons = {}
+# @return The model in the structural form of buildModel
+def buildModelDynamic(STN):
     result, conflicts, bounds, weight = DC_Checker(STN.copy())
-
     contingent = bounds['contingent']
 
-    constraint = ''
-    Obj = ''
+    variables = []
+    objective = []
+    total = []
     for i,j in list(contingent.keys()):
         edge, bound = contingent[(i,j)]
         length = edge.Cij + edge.Cji
-        epsilons[j] = ('EPS_%i'%j, 0, length)
+        variables.append(('EPS_%i'%j, 0, length))
+        objective.append([(length, None), (-1, 'EPS_%i'%j)])
+        total.append((1, 'EPS_%i'%j))
 
-        constraint += epsilons[j][0] + ' + '
-        Obj += 'log(' + str(length) + ' - ' + epsilons[j][0] + ') + '
+    constraints = [('WEIGHT', total, '>=', [(-weight, None)])]
+    return variables, objective, constraints
 
-    constraint = constraint[:-3] + ' >= ' + str(-weight)
-    Obj = Obj[:-3]
-
-    return epsilons, constraint, Obj
 
+##
+# \fn emitModelDynamic(STN)
+# \brief Generate the AMPL model of the degree of DC problem piece by piece
+#
+# @param STN        An STN to be processed (not modified)
+#
+# @return A generator of strings that concatenate to the model file
+def emitModelDynamic(STN):
+    return emitAMPL(*buildModelDynamic(STN))
 
 
 ##
-# \fn modelObjDynamic(STN, fname)
+# \fn modelObjDynamic(STN, fname, closedForm=False)
 # \brief convert an STN obj to AMPL format model file to use in the solver
 #        for compute degree of DC
 #
 # @param STN        An STN object to be processed
 # @param fname      The filename for the output model file
+# @param closedForm Flag indicating whether single-conflict models should be
+#                   solved right away (see nlp.Problem.waterFilling) instead
+#                   of being written out for the solver
 #
 # @post An AMPL format model file that contains optimization problem for the
-#       input STN for computing degree of DC
-def modelObjDynamic(STN, fname):
-    epsilons, constraint, Obj = prepareDynamic(STN.copy())
-
-    f = open(fname, 'w')
-    for v, l, h in list(epsilons.values()):
-        line = 'var ' + v + ' >= ' + str(l)
-
-        if h != None:
-            line += ', <= ' + str(h)
-
-        line += ';'
-        f.write(line +'\n')
-
-    Obj_line = '\nmaximize VOLUME: ' + Obj + ';\n\n'
-    f.write(Obj_line)
-
-    constraint_line = 'subject to WEIGHT: ' + constraint + ';\n'
-    f.write(constraint_line)
-
-    f.close()
+#       input STN for computing degree of DC, unless it was solved in closed
+#       form
+#
+# @return None if the model file was written, otherwise the optimal
+#         objective value (-inf if the conflict cannot be resolved)
+def modelObjDynamic(STN, fname, closedForm=False):
+    model = buildModelDynamic(STN)
+    if closedForm:
+        # nlp imports this module, so it can only be imported here
+        import nlp
+        problem = nlp.Problem(*model)
+        x = problem.waterFilling()
+        if x is False:
+            return float('-inf')
+        if x is not None:
+            return problem.objective(x)
+
+    with open(fname, 'w') as f:
+        f.writelines(emitAMPL(*model))
+    return None
 
 
 
@@ -233,28 +261,70 @@ def modelObjDynamic(STN, fname):
 # \note This function is used to compute degree of dynamic controllability
 #
 # @param path       The path to an STN json file
+# @param closedForm See modelObjDynamic
 #
-# @post An AMPL model file
-def modelDynamicFile(path):
+# @post An AMPL model file, unless it was solved in closed form
+#
+# @return See modelObjDynamic
+def modelDynamicFile(path, closedForm=False):
     STN = loadSTNfromJSONfile(path)
     p, f = os.path.split(path)
     fname = f[:-5] + '.mod'
     fname = os.path.join('../../../model/dynamic/model', fname)
-    modelObjDynamic(STN, fname)
+    return modelObjDynamic(STN, fname, closedForm)
+
+
+##
+# \fn modelXML(STN, xml_name, dynamic=False)
+# \brief write the NEOS XML job of an STN directly, without going through an
+#        intermediate model file
+#
+# @param STN        An STN object to be processed
+# @param xml_name   The filename for the output xml file
+# @param dynamic    Flag indicating whether to use the degree of DC model
+#                   instead of the strong controllability one
+#
+# @post An xml file with the same content build_xml.build_xml would produce
+#       from the model file of the STN
+def modelXML(STN, xml_name, dynamic=False):
+    from build_xml import stream_xml
+    chunks = emitModelDynamic(STN) if dynamic else emitModel(STN)
+    stream_xml(xml_name, chunks)
 
 # -------------------------------------------------------------------------
 #  Main function
 # -------------------------------------------------------------------------
 
 
-def main():
-    directory = input("Please input the folder containing STN json file:\n")
-    listOfFile = glob.glob(os.path.join(directory, '*.json'))
-
-    for path in listOfFile:
-        p, f = os.path.split(path)
+##
+# \fn main(directory=None, out_folder='../../../model/dynamic/model',
+#          result_name='result_closed_form.json')
+# \brief Write the degree of DC model of every STN of a folder
+#
+# @param directory      The folder containing STN json files (asked for if
+#                       None)
+# @param out_folder     The folder the .mod files are written to
+# @param result_name    The json file the closed form values are saved to
+def main(directory=None, out_folder='../../../model/dynamic/model',
+         result_name='result_closed_form.json'):
+    if directory is None:
+        directory = input(
+            "Please input the folder containing STN json file:\n")
+
+    # Models solved in closed form never need to go to NEOS. Their values are
+    # saved in the format of NeosClient's result.json.
+    result = {'normal': {}, 'unbounded': [], 'waiting': []}
+    for f, STN in Dataset(directory):
         print("Processing: ", f)
-        modelDynamicFile(path)
+        fname = os.path.join(out_folder, f[:-5] + '.mod')
+        obj = modelObjDynamic(STN, fname, closedForm=True)
+        if obj == float('-inf'):
+            result['unbounded'].append(f)
+        elif obj is not None:
+            result['normal'][f[:-5]] = obj
+
+    with open(result_name, 'w') as f:
+        json.dump(result, f)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,385 @@
+import asyncio
+import glob
+import json
+import os
+import re
+import socketserver
+import threading
+import time
+import xmlrpc.client as xmlrpclib
+from xmlrpc.server import SimpleXMLRPCServer
+
+##
+# \file neos_jobs.py
+# \brief Submit many XML jobs to NEOS concurrently and collect their
+#        objective values
+#
+# \details NeosClient.main submits one job at a time, polls it every second
+#          and then sleeps for a minute. JobManager instead keeps up to
+#          `limit` jobs in flight, polls each of them with exponential
+#          backoff and records every job number and password in a JSON job
+#          table as soon as it is known, so an interrupted run picks up the
+#          pending jobs instead of submitting them again.
+#
+#          The XML-RPC calls are blocking, so each one runs in a worker
+#          thread through asyncio.to_thread with its own ServerProxy.
+#
+#          LocalNeosServer is a stand-in for the NEOS server that implements
+#          the calls we use and solves the models locally with nlp.py. Point
+#          a JobManager at its url to try the pipeline without NEOS.
+
+
+## The NEOS XML-RPC endpoint
+NEOS_URL = "https://neos-server.org:3333"
+
+## How NEOS reports the objective value in the final results
+OBJECTIVE = re.compile("\nObjective ([\\+0-9.e-]+)\n")
+
+
+##
+# \class JobTable
+# \brief The jobs of a run, persisted to a JSON file after every change
+#
+# \details Entries are {xml name: {'job': job number, 'password': job
+#          password, 'status': 'submitted', 'done' or 'unbounded',
+#          'objective': objective value or None}}.
+class JobTable(object):
+
+    ## \brief JobTable Constructor
+    #  \param path      The JSON file holding the table (loaded if it exists)
+    def __init__(self, path):
+        self.path = path
+        self.jobs = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.jobs = json.load(f)
+
+    ## \brief Get the entry of a job, or None
+    def get(self, name):
+        return self.jobs.get(name)
+
+    ## \brief Update the entry of a job and save the table
+    def update(self, name, **fields):
+        self.jobs.setdefault(name, {}).update(fields)
+        self.save()
+
+    ## \brief Forget a job and save the table
+    def remove(self, name):
+        self.jobs.pop(name, None)
+        self.save()
+
+    ## \brief Write the table atomically, so a crash never leaves it corrupt
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.jobs, f, indent=1)
+        os.replace(tmp, self.path)
+
+
+##
+# \class JobManager
+# \brief Runs NEOS jobs concurrently under an in-flight limit
+class JobManager(object):
+
+    ##
+    # \brief JobManager Constructor
+    #
+    # @param outfolder      The folder for the job table and the per-job txt
+    #                       files (same format as NeosClient.getObjValue)
+    # @param url            The XML-RPC server to submit to
+    # @param limit          Maximal number of jobs submitted but not finished
+    # @param username       The username of your account to the neos server
+    # @param user_password  The password of your account to the neos server
+    # @param poll           Initial delay between status polls, in seconds
+    # @param maxPoll        Polling delay cap, the delay doubles up to it
+    # @param timeout        Seconds to wait for one job before leaving it
+    #                       pending in the job table (None waits forever)
+    def __init__(self, outfolder='.', url=NEOS_URL, limit=4, username=None,
+                 user_password=None, poll=1.0, maxPoll=30.0, timeout=None):
+        self.outfolder = outfolder
+        self.url = url
+        self.limit = limit
+        self.username = username
+        self.user_password = user_password
+        self.poll = poll
+        self.maxPoll = maxPoll
+        self.timeout = timeout
+        self.table = JobTable(os.path.join(outfolder, 'neos_jobs.json'))
+
+    ## \brief Make one blocking XML-RPC call in a worker thread
+    async def _call(self, method, *args):
+        def call():
+            server = xmlrpclib.ServerProxy(self.url, allow_none=True)
+            return getattr(server, method)(*args)
+        return await asyncio.to_thread(call)
+
+    ##
+    # \brief Run the jobs of a list of XML files
+    #
+    # @param xml_files      Paths of the XML files to process
+    #
+    # @return A dictionary in the format of NeosClient.main's result.json:
+    #         objective values under 'normal', and lists of the jobs that
+    #         were 'unbounded' or still 'waiting' when we gave up on them
+    async def run(self, xml_files):
+        alive = await self._call('ping')
+        if alive != "NeosServer is alive\n":
+            raise ConnectionError("Could not make connection to NEOS Server")
+
+        slots = asyncio.Semaphore(self.limit)
+        outcomes = await asyncio.gather(*[self._job(xml_name, slots)
+                                          for xml_name in xml_files])
+
+        result = {'normal': {}, 'unbounded': [], 'waiting': []}
+        for xml_name, obj in zip(xml_files, outcomes):
+            f = os.path.split(xml_name)[1]
+            if obj == 'waiting':
+                result['waiting'].append(f)
+            elif obj is None:
+                result['unbounded'].append(f)
+            else:
+                result['normal'][f[:-4]] = obj
+        return result
+
+    ##
+    # \brief Submit (or resume) one job and wait for its objective value
+    #
+    # @return The objective value, None if no objective was reported, or
+    #         'waiting' if the job timed out
+    async def _job(self, xml_name, slots):
+        name = os.path.split(xml_name)[1]
+        entry = self.table.get(name)
+        if entry and entry.get('status') == 'done':
+            return entry['objective']
+        if entry and entry.get('status') == 'unbounded':
+            return None
+
+        async with slots:
+            if entry and entry.get('status') == 'submitted':
+                jobNumber, password = entry['job'], entry['password']
+                print("Resuming job {} for {}".format(jobNumber, name))
+            else:
+                jobNumber, password = await self._submit(xml_name)
+
+            status = await self._wait(jobNumber, password)
+            if status == 'waiting':
+                return 'waiting'
+            if status != 'Done':
+                # NEOS lost the job (e.g. it expired), so submit it again
+                self.table.remove(name)
+                jobNumber, password = await self._submit(xml_name)
+                status = await self._wait(jobNumber, password)
+                if status != 'Done':
+                    return 'waiting'
+
+            msg = await self._call('getFinalResults', jobNumber, password)
+
+        return self._record(name, jobNumber, password, msg.data.decode())
+
+    ## \brief Submit an XML file and record the job in the table
+    async def _submit(self, xml_name):
+        with open(xml_name, 'r') as f:
+            xml = f.read()
+        if self.username and self.user_password:
+            jobNumber, password = await self._call(
+                'authenticatedSubmitJob', xml, self.username,
+                self.user_password)
+        else:
+            jobNumber, password = await self._call('submitJob', xml)
+        if jobNumber == 0:
+            raise RuntimeError("NEOS Server error: %s" % password)
+
+        name = os.path.split(xml_name)[1]
+        self.table.update(name, job=jobNumber, password=password,
+                          status='submitted', objective=None)
+        print("Submitted {} as job {}".format(name, jobNumber))
+        return jobNumber, password
+
+    ##
+    # \brief Poll a job with exponential backoff until it is no longer
+    #        queued or running
+    #
+    # @return The final job status, or 'waiting' on timeout
+    async def _wait(self, jobNumber, password):
+        start = time.monotonic()
+        delay = self.poll
+        while True:
+            status = await self._call('getJobStatus', jobNumber, password)
+            if status not in ('Waiting', 'Running'):
+                return status
+            if self.timeout is not None and \
+                    time.monotonic() - start + delay > self.timeout:
+                return 'waiting'
+            await asyncio.sleep(delay)
+            delay = min(2 * delay, self.maxPoll)
+
+    ##
+    # \brief Save the outcome of a finished job to its txt file and the table
+    #
+    # @return The objective value, or None if none was reported
+    def _record(self, name, jobNumber, password, decoded_msg):
+        out = OBJECTIVE.findall(decoded_msg)
+        obj = float(out[0]) if out else None
+
+        fname = os.path.join(self.outfolder, name[:-4] + '.txt')
+        with open(fname, 'w') as file:
+            file.write("Job number = %d\nJob password = %s\n" %
+                       (jobNumber, password))
+            if obj is None:
+                file.write("\nPossibly unbounded...\n")
+            else:
+                file.write("Objective Value: {}".format(obj))
+
+        self.table.update(name, status='done' if obj is not None else
+                          'unbounded', objective=obj)
+        return obj
+
+
+##
+# \class LocalNeosServer
+# \brief A local XML-RPC stand-in for the parts of NEOS that JobManager and
+#        NeosClient use
+#
+# \details Models are taken out of the XML documents built by build_xml and
+#          solved with nlp.parseAMPL. A job reports 'Running' for `delay`
+#          seconds after its submission, then 'Done'.
+class LocalNeosServer(object):
+
+    ##
+    # \brief LocalNeosServer Constructor
+    #
+    # @param host       The host to listen on
+    # @param port       The port to listen on (0 picks a free one)
+    # @param delay      Seconds each job pretends to run
+    def __init__(self, host='localhost', port=0, delay=0.0):
+        self.delay = delay
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+        class Server(socketserver.ThreadingMixIn, SimpleXMLRPCServer):
+            daemon_threads = True
+
+        self.server = Server((host, port), allow_none=True,
+                             logRequests=False)
+        for method in ('ping', 'printQueue', 'submitJob',
+                       'authenticatedSubmitJob', 'getJobStatus',
+                       'getFinalResults'):
+            self.server.register_function(getattr(self, method), method)
+        self.thread = None
+
+    ## \brief The url to give to JobManager or xmlrpc.client.ServerProxy
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    ## \brief Serve requests in a background thread
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        return self
+
+    ## \brief Stop serving
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def ping(self):
+        return "NeosServer is alive\n"
+
+    def printQueue(self):
+        with self.lock:
+            return "{} jobs\n".format(len(self.jobs))
+
+    def submitJob(self, xml):
+        match = re.search(r'<model><!\[CDATA\[(.*?)\]\]></model>', xml,
+                          re.S)
+        if match is None:
+            return 0, "No model in the job"
+
+        with self.lock:
+            jobNumber = len(self.jobs) + 1
+            password = 'pw%d' % jobNumber
+            self.jobs[jobNumber] = {'password': password,
+                                    'model': match.group(1),
+                                    'submitted': time.monotonic()}
+        return jobNumber, password
+
+    def authenticatedSubmitJob(self, xml, username, user_password):
+        return self.submitJob(xml)
+
+    def _lookup(self, jobNumber, password):
+        with self.lock:
+            job = self.jobs.get(jobNumber)
+        if job is None:
+            return None, "Unknown Job"
+        if job['password'] != password:
+            return None, "Bad Password"
+        return job, None
+
+    def getJobStatus(self, jobNumber, password):
+        job, error = self._lookup(jobNumber, password)
+        if error:
+            return error
+        if time.monotonic() - job['submitted'] < self.delay:
+            return "Running"
+        return "Done"
+
+    def getFinalResults(self, jobNumber, password):
+        job, error = self._lookup(jobNumber, password)
+        if error:
+            return xmlrpclib.Binary(error.encode())
+
+        import nlp
+        status, value, solution = nlp.parseAMPL(job['model']).solve()
+        text = "Local stand-in for NEOS\n"
+        if status == 'Optimal':
+            text += "\nObjective %.10g\n" % value
+        else:
+            text += "\n{}\n".format(status)
+        return xmlrpclib.Binary(text.encode())
+
+
+##
+# \fn main(xml_folder=None, username=None, password=None, outfolder=None,
+#          limit=None, url=NEOS_URL, result_name='result.json')
+# \brief I/O for submitting all XML files of a folder concurrently
+#
+# \details Arguments left to None are asked for. An empty username or
+#          password submits the jobs anonymously.
+#
+# @return The result of JobManager.run, also saved to result_name
+def main(xml_folder=None, username=None, password=None, outfolder=None,
+         limit=None, url=NEOS_URL, result_name='result.json'):
+    if xml_folder is None:
+        xml_folder = input("Please input directory for xml files:\n")
+    xml_L = sorted(glob.glob(os.path.join(xml_folder, '*.xml')))
+    if username is None:
+        username = input("Please input Neos username:\n")
+    if password is None:
+        password = input("Please input Neos password:\n")
+    if outfolder is None:
+        outfolder = input("Please enter output folder for job file:\n")
+    if limit is None:
+        limit = int(input("Please input the number of jobs in flight:\n")
+                    or 4)
+
+    manager = JobManager(outfolder, url=url, limit=limit,
+                         username=username or None,
+                         user_password=password or None)
+    result = asyncio.run(manager.run(xml_L))
+
+    with open(result_name, 'w') as f:
+        json.dump(result, f)
+    return result
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,544 @@
+from scipy import sparse
+from scipy.optimize import linprog, minimize
+from scipy.sparse.linalg import splu
+import numpy as np
+import re
+
+from stn import loadSTNfromJSONfile
+from model import buildModel, buildModelDynamic, MAX_FLOAT
+from relax import waterLevel
+
+##
+# \file nlp.py
+# \brief Solve the log-volume models of model.py locally instead of on NEOS
+#
+# \details model.modelObj and model.modelObjDynamic write AMPL files that are
+#          wrapped by build_xml and solved by BARON on the NEOS server. Both
+#          models maximize a sum of logs of affine expressions subject to
+#          linear constraints, which is a concave problem, so a local method
+#          reaches the global optimum. Here the models built by
+#          model.buildModel and model.buildModelDynamic are turned into
+#          sparse matrices, a starting point inside the domain of the logs is found
+#          with an LP, and the problem is solved by a primal-dual interior
+#          point method with analytic gradients and Hessians and sparse
+#          factorizations. scipy's SLSQP is available as well, but is dense
+#          and slow on the larger networks. On the dataset the values agree
+#          with result/result_solver.json to the accuracy of BARON.
+#
+#          Single-conflict models, which is what model.buildModelDynamic
+#          produces, are recognized and solved in closed form by
+#          water-filling.
+#
+#          Bounds and <= constraints of model.MAX_FLOAT, which model.py uses
+#          for infinite edges, are treated as absent, since they never bind
+#          and would ruin the scaling of the problem.
+#
+#          The returned objective values are the ones NeosClient.getObjValue
+#          reports, so they can be used in place of the NEOS results.
+
+
+## Tolerance on the scaled residuals and the duality gap
+TOLERANCE = 1e-8
+
+## Maximal number of solver iterations
+MAX_ITER = 200
+
+_TERM = re.compile(r'\s*([+-]?)\s*([A-Za-z_][A-Za-z_0-9]*|[0-9.eE+-]+)')
+_LOG = re.compile(r'log\(([^()]*)\)')
+_VAR = re.compile(r'var (\S+) >= (\S+?)(?:, <= (\S+))?')
+
+
+##
+# \fn parseLinear(expr)
+# \brief Parse a linear AMPL expression such as 'T3HI - T1LO + 5'
+#
+# @param expr       The expression string, with terms joined by ' + ' or ' - '
+#
+# @return A list of terms (coef, var) as in model.buildModel
+def parseLinear(expr):
+    terms = []
+    if not expr.strip():
+        return terms
+    for term in re.split(r'\s+(?=[+-]\s)', expr.strip()):
+        match = _TERM.fullmatch(term)
+        if match is None:
+            raise ValueError("Cannot parse term '{}' in '{}'".format(term,
+                                                                    expr))
+        sign = -1.0 if match.group(1) == '-' else 1.0
+        token = match.group(2)
+        try:
+            terms.append((sign * float(token), None))
+        except ValueError:
+            terms.append((sign, token))
+    return terms
+
+
+##
+# \fn linearOf(expr, index)
+# \brief Collect the terms of a linear expression by column
+#
+# @param expr       A list of terms (coef, var) as in model.buildModel
+# @param index      A dictionary from variable names to columns
+#
+# @return A dictionary {column: coefficient} and the constant term
+def linearOf(expr, index):
+    coefs = {}
+    const = 0.0
+    for coef, var in expr:
+        if var is None:
+            const += coef
+        else:
+            col = index[var]
+            coefs[col] = coefs.get(col, 0.0) + coef
+    return coefs, const
+
+
+##
+# \class Problem
+# \brief maximize sum_k log(L x + c)_k subject to linear constraints and
+#        bounds on x
+class Problem(object):
+
+    ##
+    # \brief Problem Constructor
+    #
+    # @param variables      A list of (name, lowbound, upbound) tuples as
+    #                       returned by model.buildModel, with None for
+    #                       unbounded
+    # @param objective      A list of the linear expressions whose logs are
+    #                       summed
+    # @param constraints    A list of constraints (name, lhs, op, rhs) with
+    #                       op '==', '<=' or '>='
+    def __init__(self, variables, objective, constraints):
+        ## Variable names in column order
+        self.names = [v for v, l, h in variables]
+        index = {v: k for k, v in enumerate(self.names)}
+
+        ## Column bounds (-inf/inf for unbounded)
+        self.lower = np.array([-np.inf if l is None else l
+                               for v, l, h in variables], dtype=float)
+        self.upper = np.array([np.inf if h is None else h
+                               for v, l, h in variables], dtype=float)
+        self.upper[self.upper >= MAX_FLOAT] = np.inf
+
+        rows, lo, hi = [], [], []
+        for name, lhs, op, rhs in constraints:
+            if op not in ('==', '<=', '>='):
+                raise ValueError("Unknown operator '{}' in {}".format(op,
+                                                                      name))
+
+            # Move everything to the left: coefs . x + const (op) 0
+            left, lconst = linearOf(lhs, index)
+            right, rconst = linearOf(rhs, index)
+            for col, coef in right.items():
+                left[col] = left.get(col, 0.0) - coef
+            bound = rconst - lconst
+            if op == '<=' and bound >= MAX_FLOAT:
+                continue
+            rows.append(left)
+            lo.append(-np.inf if op == '<=' else bound)
+            hi.append(np.inf if op == '>=' else bound)
+
+        ## Linear constraints lo <= A x <= hi
+        self.A = self._matrix(rows)
+        self.lo = np.array(lo, dtype=float)
+        self.hi = np.array(hi, dtype=float)
+
+        terms = [linearOf(expr, index) for expr in objective]
+
+        ## The arguments of the logs are L x + c
+        self.L = self._matrix([coefs for coefs, const in terms])
+        self.c = np.array([const for coefs, const in terms], dtype=float)
+
+    def _matrix(self, rows):
+        data, row_ind, col_ind = [], [], []
+        for r, coefs in enumerate(rows):
+            for col, coef in coefs.items():
+                row_ind.append(r)
+                col_ind.append(col)
+                data.append(coef)
+        return sparse.csr_matrix((data, (row_ind, col_ind)),
+                                 shape=(len(rows), len(self.names)))
+
+    ## \brief The objective value at x (-inf outside the domain of the logs)
+    def objective(self, x):
+        args = self.L @ x + self.c
+        if np.any(args <= 0):
+            return -np.inf
+        return float(np.sum(np.log(args)))
+
+    ##
+    # \brief Find a point inside the domain of the logs
+    #
+    # \details Solves the LP maximize t subject to L x + c >= t, the linear
+    #          constraints and the bounds. A positive t gives a strictly
+    #          feasible start for SLSQP.
+    #
+    # @return The point, or None if every feasible point has a zero
+    #         argument (or the constraints are infeasible)
+    def interior(self):
+        n, m = len(self.names), self.L.shape[0]
+        ones = sparse.csr_matrix(np.ones((m, 1)))
+        A_ub = [sparse.hstack([-self.L, ones])]
+        b_ub = [self.c]
+        A_eq, b_eq = [], []
+        for k in range(self.A.shape[0]):
+            row = sparse.hstack([self.A[k], sparse.csr_matrix((1, 1))])
+            if self.lo[k] == self.hi[k]:
+                A_eq.append(row)
+                b_eq.append([self.lo[k]])
+                continue
+            if self.hi[k] < np.inf:
+                A_ub.append(row)
+                b_ub.append([self.hi[k]])
+            if self.lo[k] > -np.inf:
+                A_ub.append(-row)
+                b_ub.append([-self.lo[k]])
+
+        # Cap t so that the LP stays bounded, scaled to the size of the
+        # constraints
+        cap = max(1.0, float(np.max(np.abs(self.c), initial=0)))
+        bounds = list(zip(self.lower, self.upper)) + [(-np.inf, cap)]
+        cost = np.zeros(n + 1)
+        cost[-1] = -1
+        res = linprog(cost, A_ub=sparse.vstack(A_ub, format='csr'),
+                      b_ub=np.concatenate(b_ub),
+                      A_eq=sparse.vstack(A_eq, format='csr') if A_eq
+                      else None,
+                      b_eq=np.concatenate(b_eq) if b_eq else None,
+                      bounds=bounds,
+                      method='highs')
+        if res.status != 0 or res.x[-1] <= 0:
+            return None
+        return res.x[:n]
+
+    ##
+    # \brief Split the constraints into equalities E x = e and inequalities
+    #        G x <= h (column bounds included)
+    def _standardForm(self):
+        eq = self.lo == self.hi
+        n = len(self.names)
+        I = sparse.identity(n, format='csr')
+        upper = np.isfinite(self.hi) & ~eq
+        lower = np.isfinite(self.lo) & ~eq
+        colUpper = np.isfinite(self.upper)
+        colLower = np.isfinite(self.lower)
+        G = sparse.vstack([self.A[upper], -self.A[lower], I[colUpper],
+                           -I[colLower]], format='csr')
+        h = np.concatenate((self.hi[upper], -self.lo[lower],
+                            self.upper[colUpper], -self.lower[colLower]))
+        return self.A[eq], self.lo[eq], G, h
+
+    ##
+    # \brief Maximize the objective
+    #
+    # @param method     'auto' to use waterFilling when the model allows it
+    #                   and the interior point method otherwise, 'interior'
+    #                   for the primal-dual interior point method below, or
+    #                   'SLSQP' to use scipy.optimize.minimize (dense, only
+    #                   practical for small models)
+    #
+    # @return A tuple (status, objective value, {name: value}), where status
+    #         is 'Optimal', 'Infeasible' or 'Not Solved'. The objective and
+    #         solution are None unless the status is 'Optimal'.
+    def solve(self, method='auto'):
+        if method == 'auto':
+            closed = self.waterFilling()
+            if closed is not None:
+                x = closed
+                if x is False:
+                    return 'Infeasible', None, None
+                return 'Optimal', self.objective(x), dict(zip(self.names, x))
+            method = 'interior'
+
+        x0 = self.interior()
+        if x0 is None:
+            return 'Infeasible', None, None
+
+        if method == 'SLSQP':
+            x = self._slsqp(x0)
+        elif method == 'interior':
+            x = self._interior(x0)
+        else:
+            raise ValueError("Unknown method: {}".format(method))
+
+        if x is None:
+            return 'Not Solved', None, None
+        if self.objective(x0) > self.objective(x):
+            x = x0
+        return 'Optimal', self.objective(x), dict(zip(self.names, x))
+
+    ##
+    # \brief Solve single-conflict models in closed form
+    #
+    # \details The model of model.buildModelDynamic removes a total of at least
+    #          -weight from the contingent edges of one conflict: maximize
+    #          sum log(length_k - EPS_k) subject to sum EPS_k >= -weight and
+    #          0 <= EPS_k <= length_k. This is the water-filling problem
+    #          relax.optimalRelax solves, so no iterative solver is needed.
+    #
+    # @return The optimal x, False if the model has this form but no point
+    #         with a finite objective, or None if the model does not have
+    #         this form
+    def waterFilling(self):
+        n = len(self.names)
+        if self.A.shape[0] != 1 or self.L.shape[0] != n or n == 0:
+            return None
+
+        # The only constraint must be sum(x) >= bound
+        row = self.A.tocoo()
+        if self.hi[0] != np.inf or row.nnz != n or np.any(row.data != 1):
+            return None
+
+        # Each log must be log(upper_k - x_k) with x_k in [0, upper_k]
+        L = self.L.tocoo()
+        if L.nnz != n or np.any(L.data != -1) or \
+                len(np.unique(L.col)) != n:
+            return None
+        length = np.empty(n)
+        length[L.col] = self.c[L.row]
+        if np.any(self.lower != 0) or np.any(self.upper != length):
+            return None
+
+        # The edges may keep a total length of at most S
+        S = float(np.sum(length) - self.lo[0])
+        if S <= 0:
+            return False
+
+        order = np.argsort(length, kind='stable')
+        m, A = waterLevel(length[order].tolist(), S)
+        x = np.zeros(n)
+        if A is not None:
+            cut = order[m:]
+            x[cut] = length[cut] - A
+        return x
+
+    ##
+    # \brief Primal-dual interior point method
+    #
+    # \details Solves min -sum(log(L x + c)) subject to E x = e and
+    #          G x + s = h with s >= 0. The iterates stay inside the domain of
+    #          the logs, but E x = e and G x + s = h are only met at
+    #          convergence, so any point with L x0 + c > 0 is a valid start.
+    #          Each iteration solves one sparse system in (dx, dnu) of the
+    #          size of the model, so large networks take about as long as an
+    #          LP.
+    #
+    # @return The optimal x, or None if the method did not converge
+    def _interior(self, x0):
+        E, e, G, h = self._standardForm()
+        L, c = self.L, self.c
+        LT, GT, ET = L.T.tocsr(), G.T.tocsr(), E.T.tocsr()
+        n, m, k = len(x0), G.shape[0], E.shape[0]
+
+        # Start perfectly centered: s * lam = 1
+        x = x0.copy()
+        s = np.maximum(h - G @ x, 1.0)
+        lam = 1.0 / s
+        nu = np.zeros(k)
+        scale = 1.0 + max(np.max(np.abs(h), initial=0),
+                          np.max(np.abs(e), initial=0),
+                          np.max(np.abs(c), initial=0))
+        reg = 1e-10
+        best = (np.inf, None)
+
+        def stepLength(v, dv):
+            neg = dv < 0
+            return min(1.0, np.min(-v[neg] / dv[neg], initial=np.inf))
+
+        for _ in range(MAX_ITER):
+            a = L @ x + c
+            grad = -(LT @ (1.0 / a))
+            r1 = grad + ET @ nu + GT @ lam
+            p1 = E @ x - e
+            p3 = G @ x + s - h
+            mu = s @ lam / m if m else 0.0
+
+            primal = max(np.max(np.abs(p1), initial=0),
+                         np.max(np.abs(p3), initial=0)) / scale
+            dual = np.max(np.abs(r1), initial=0) / \
+                (1.0 + np.max(np.abs(grad), initial=0))
+            gap = mu * m / (1.0 + abs(np.sum(np.log(a))))
+            error = max(primal, dual, gap)
+            if error < TOLERANCE:
+                return x
+            if error < best[0]:
+                best = (error, x.copy())
+
+            H = LT @ sparse.diags(1.0 / a ** 2) @ L + \
+                GT @ sparse.diags(lam / s) @ G
+            K = sparse.bmat([[H + reg * sparse.identity(n), ET],
+                             [E, -reg * sparse.identity(k)]], format='csc')
+            try:
+                solver = splu(K)
+            except RuntimeError:
+                # The system becomes singular when the iterates get too
+                # close to the boundary
+                break
+
+            def direction(sigma):
+                r3 = lam * s - sigma * mu
+                rhs = -r1 - GT @ ((-r3 + lam * p3) / s)
+                d = solver.solve(np.concatenate((rhs, -p1)))
+                dx, dnu = d[:n], d[n:]
+                ds = -p3 - G @ dx
+                dlam = (-r3 - lam * ds) / s
+                return dx, dnu, ds, dlam
+
+            def maxStep(dx, ds, dlam):
+                return min(stepLength(a, L @ dx), stepLength(s, ds),
+                           stepLength(lam, dlam))
+
+            # Mehrotra predictor-corrector: the affine step tells how far
+            # the barrier parameter can be reduced
+            dx, dnu, ds, dlam = direction(0.0)
+            alpha = maxStep(dx, ds, dlam)
+            affine = (s + alpha * ds) @ (lam + alpha * dlam) / m if m else 0.0
+            sigma = (affine / mu) ** 3 if mu > 0 else 0.0
+            dx, dnu, ds, dlam = direction(sigma)
+
+            alpha = min(1.0, 0.99 * maxStep(dx, ds, dlam))
+            x += alpha * dx
+            s += alpha * ds
+            lam += alpha * dlam
+            nu += alpha * dnu
+
+        # Close to the optimum the steps can stall on rounding errors, in
+        # which case the best iterate is good enough
+        return best[1] if best[0] < 100 * TOLERANCE else None
+
+    ##
+    # \brief SLSQP with analytic gradients, starting from x0
+    #
+    # @return The final x, or None if it left the domain of the logs
+    def _slsqp(self, x0):
+        L, LT, c = self.L, self.L.T.tocsr(), self.c
+
+        def fun(x):
+            args = L @ x + c
+            if np.any(args <= 0):
+                return np.inf
+            return -float(np.sum(np.log(args)))
+
+        def jac(x):
+            return -(LT @ (1.0 / (L @ x + c)))
+
+        E, e, G, h = self._standardForm()
+        E, G = E.toarray(), G.toarray()
+        constraints = [{'type': 'ineq', 'fun': lambda x: h - G @ x,
+                        'jac': lambda x: -G}]
+        if len(e):
+            constraints.append({'type': 'eq', 'fun': lambda x: E @ x - e,
+                                'jac': lambda x: E})
+
+        res = minimize(fun, x0, jac=jac, method='SLSQP',
+                       constraints=constraints,
+                       options={'ftol': TOLERANCE, 'maxiter': MAX_ITER})
+        return res.x if np.isfinite(fun(res.x)) else None
+
+
+##
+# \fn problemOf(STN)
+# \brief Build the strong controllability volume problem of model.modelObj
+#
+# @param STN        An STN to be processed (modified by setMakespan as in
+#                   model.buildModel)
+#
+# @return A Problem instance
+def problemOf(STN):
+    return Problem(*buildModel(STN))
+
+
+##
+# \fn problemOfDynamic(STN)
+# \brief Build the degree of DC problem of model.modelObjDynamic
+#
+# @param STN        An STN to be processed
+#
+# @return A Problem instance
+def problemOfDynamic(STN):
+    return Problem(*buildModelDynamic(STN))
+
+
+##
+# \fn parseAMPL(model)
+# \brief Build a Problem from the text of a model file written by
+#        model.modelObj or model.modelObjDynamic
+#
+# @param model      The AMPL model as a string
+#
+# @return A Problem instance
+def parseAMPL(model):
+    variables, objective, constraints = [], [], []
+    for statement in model.split(';'):
+        statement = ' '.join(statement.split())
+        match = _VAR.fullmatch(statement)
+        if match:
+            name, low, high = match.groups()
+            variables.append((name, float(low),
+                              None if high is None else float(high)))
+        elif statement.startswith('maximize '):
+            Obj = statement.split(':', 1)[1]
+            objective = [parseLinear(expr) for expr in _LOG.findall(Obj)]
+        elif statement.startswith('subject to '):
+            name, con = statement[len('subject to '):].split(':', 1)
+            for op in ('==', '<=', '>='):
+                if op in con:
+                    lhs, rhs = con.split(op)
+                    break
+            else:
+                raise ValueError("Not a constraint: '{}'".format(con))
+            constraints.append((name, parseLinear(lhs), op,
+                                parseLinear(rhs)))
+        elif statement:
+            raise ValueError("Unknown statement: '{}'".format(statement))
+    return Problem(variables, objective, constraints)
+
+
+##
+# \fn getObjValue(STN, dynamic=False)
+# \brief Solve a model locally and report its optimal objective value
+#
+# \details A drop-in replacement for NeosClient.getObjValue(..., output=True)
+#
+# @param STN        An STN to be processed
+# @param dynamic    Flag indicating whether we solve the degree of DC model
+#                   (model.modelObjDynamic) or the strong controllability
+#                   model (model.modelObj)
+#
+# @return The optimal objective value, or None if there is no feasible point
+#         with a finite objective
+def getObjValue(STN, dynamic=False):
+    problem = problemOfDynamic(STN) if dynamic else problemOf(STN.copy())
+    status, value, solution = problem.solve()
+    return value
+
+
+##
+# \fn getObjValueFile(path, dynamic=False)
+# \brief Solve the model of an STN json file locally
+#
+# @param path       The path to an STN json file
+# @param dynamic    See getObjValue
+#
+# @return The optimal objective value, or None
+def getObjValueFile(path, dynamic=False):
+    return getObjValue(loadSTNfromJSONfile(path), dynamic)
+
+
+##
+# \fn closedFormValue(STN)
+# \brief Solve the degree of DC model of an STN in closed form if possible
+#
+# @param STN        An STN to be processed
+#
+# @return The optimal objective value, -inf if the conflict cannot be
+#         resolved, or None if the model needs an iterative solver
+def closedFormValue(STN):
+    problem = problemOfDynamic(STN)
+    x = problem.waterFilling()
+    if x is False:
+        return float('-inf')
+    if x is not None:
+        return problem.objective(x)
+    return None
@@ -1,14 +1,26 @@
 from algorithm import DC_Checker
 from stn import STN, loadSTNfromJSONfile
-from relax import relaxSearch
+from memo import memoized
 
-from scipy.stats import norm
-from math import sqrt, log, exp
+from math import sqrt, log, exp, lgamma
+from functools import lru_cache
 from typing import List
+import multiprocessing
+import numpy as np
 
 ##
 # \file probability.py
 # \brief Computing some probabilities for degree of dynamic controllability
+# \note  scipy.stats and relax.py (PuLP) are imported where they are used, so
+#        that importing this file stays cheap
+
+
+## Conflicts with at most this many edges are evaluated exactly by
+#  inclusion-exclusion; larger ones by numerically convolving the densities.
+EXACT_MAX_EDGES = 12
+
+## The number of grid cells used when convolving densities of large conflicts
+CONVOLUTION_GRID = 1 << 14
 
 
 ##
@@ -33,9 +45,142 @@ def prob_small_sum(lengths: list, S: float) -> float:
 
     z_score = (S - mean) / sqrt(variance)
 
+    from scipy.stats import norm
     return norm.cdf(z_score)
 
 
+##
+# \fn prob_small_sum_exact(lengths, S)
+# \brief Computes P(a_1 + ... + a_n <= S) for a_i ~ U(0, l_i) without the
+#        normal approximation used by prob_small_sum
+#
+# \details Small conflicts use the Irwin-Hall style inclusion-exclusion formula
+#          P = sum_J (-1)^|J| (S - sum_{j in J} l_j)_+^n / (n! prod l_i).
+#          By symmetry of the sum around L/2 (L = sum l_i) only subsets with
+#          sum below L/2 are needed, which prunes about half of them. When
+#          there are too many edges, or the alternating sum would lose too
+#          much precision, the densities are convolved on a fine grid
+#          instead. Both forms are cached per tuple of lengths, so many
+#          thresholds can be evaluated at the cost of one.
+#
+# @param lengths   An array of the lengths l_i
+# @param S         A sum the (a_i)s should be less than, or an array of them
+#
+# @return          The probability that a_1 + ... + a_n <= S, as a float if S
+#                  is a number and as an array if S is an array
+def prob_small_sum_exact(lengths: list, S):
+    key = tuple(sorted(float(l) for l in lengths if l > 0))
+    thresholds = np.asarray(S, dtype=float)
+    flat = thresholds.ravel()
+    total = sum(key)
+
+    result = np.empty_like(flat)
+    result[flat <= 0] = 0.0
+    result[flat >= total] = 1.0
+    inside = (flat > 0) & (flat < total)
+
+    if np.any(inside):
+        # Reflect the upper half onto the lower half
+        s = flat[inside]
+        upper = s > total / 2
+        s = np.where(upper, total - s, s)
+
+        terms = _inclusion_exclusion_terms(key)
+        if terms is not None:
+            prob = _eval_terms(terms, len(key), s)
+        else:
+            grid, cdf = _convolved_cdf(key)
+            prob = np.interp(s, grid, cdf)
+
+        prob = np.clip(prob, 0.0, 1.0)
+        result[inside] = np.where(upper, 1.0 - prob, prob)
+
+    result = result.reshape(thresholds.shape)
+    return float(result) if result.ndim == 0 else result
+
+
+##
+# \fn _inclusion_exclusion_terms(lengths)
+# \brief Enumerate the signed subset sums needed by inclusion-exclusion
+#
+# @param lengths   A sorted tuple of positive lengths
+#
+# @return Arrays (sums, signs, log_scale) for all subsets whose sum is below
+#         half of the total, or None if the formula is not numerically safe
+@lru_cache(maxsize=4096)
+def _inclusion_exclusion_terms(lengths: tuple):
+    n = len(lengths)
+    if n > EXACT_MAX_EDGES:
+        return None
+
+    half = sum(lengths) / 2
+    sums = [0.0]
+    signs = [1.0]
+    # Lengths are sorted, so once a subset sum reaches half we can stop
+    # extending it with any of the remaining lengths.
+    stack = [(0, 0.0, 1.0)]
+    while stack:
+        start, total, sign = stack.pop()
+        for k in range(start, n):
+            new_total = total + lengths[k]
+            if new_total >= half:
+                break
+            sums.append(new_total)
+            signs.append(-sign)
+            stack.append((k + 1, new_total, -sign))
+
+    log_scale = sum(log(l) for l in lengths) + lgamma(n + 1)
+
+    # The largest term bounds the cancellation error of the alternating sum
+    largest = n * log(half) - log_scale
+    if largest + log(len(sums)) > log(1e5):
+        return None
+
+    return np.array(sums), np.array(signs), log_scale
+
+
+##
+# \fn _eval_terms(terms, n, s)
+# \brief Evaluate the inclusion-exclusion sum at an array of thresholds
+def _eval_terms(terms, n: int, s):
+    sums, signs, log_scale = terms
+    diff = s[:, None] - sums[None, :]
+    positive = diff > 0
+    logs = n * np.log(np.where(positive, diff, 1.0)) - log_scale
+    values = np.where(positive, np.exp(logs), 0.0)
+    return values @ signs
+
+
+##
+# \fn _convolved_cdf(lengths)
+# \brief Compute the CDF of a sum of uniforms by convolving their densities
+#        on a grid with an FFT
+#
+# @param lengths   A sorted tuple of positive lengths
+#
+# @return The grid points and the CDF of the sum at those points
+@lru_cache(maxsize=1024)
+def _convolved_cdf(lengths: tuple):
+    total = sum(lengths)
+    h = total / CONVOLUTION_GRID
+    size = CONVOLUTION_GRID + len(lengths) + 1
+    nfft = 1 << (size - 1).bit_length()
+
+    spectrum = np.ones(nfft // 2 + 1, dtype=complex)
+    for l in lengths:
+        # Exact mass of U(0, l) falling in each grid cell [kh, (k+1)h)
+        edges = np.minimum(np.arange(int(l / h) + 2) * h, l)
+        mass = np.diff(edges) / l
+        spectrum *= np.fft.rfft(mass, nfft)
+
+    pmf = np.fft.irfft(spectrum, nfft)[:size]
+    cdf = np.cumsum(np.clip(pmf, 0.0, None))
+    # A single uniform is fully counted at the right end of its cell, and
+    # every further edge adds half a cell on average
+    grid = (np.arange(size) + 1 + (len(lengths) - 1) / 2) * h
+    return grid, cdf / cdf[-1]
+
+
 ##
 # \fn special_prob()
 # \brief Returns the closed form answer that should only work in a special case.
@@ -54,28 +199,61 @@ def special_prob(lengths: list, S: float) -> float:
 
 
 ##
-# \fn prob_of_DC_file()
-def prob_of_DC_file(file_name: str) -> float:
+# \fn prob_of_DC_file(file_name, exact)
+def prob_of_DC_file(file_name: str, exact=True) -> float:
     network = loadSTNfromJSONfile(file_name)
-    return prob_of_DC(network)
+    return prob_of_DC(network, exact)
 
 
-def prob_of_multiple_conflicts(lengths_list: List[list], weights: List[float]):
+##
+# \fn prob_of_multiple_conflicts(lengths_list, weights, exact)
+# \brief Multiply the probabilities that each conflict is resolved
+#
+# @param lengths_list   A list holding the edge lengths of each conflict
+# @param weights        A list holding the sum S for each conflict
+# @param exact          Use prob_small_sum_exact instead of the normal
+#                       approximation
+def prob_of_multiple_conflicts(lengths_list: List[list], weights: List[float],
+                               exact=True):
     probability = 1.0
     m = len(lengths_list)
     assert len(weights) == m, "The input lists have different lengths!"
 
+    small_sum = prob_small_sum_exact if exact else prob_small_sum
     for j in range(m):
-        probability = probability * (prob_small_sum(lengths_list[j],
-                                                    weights[j]))
+        probability = probability * (small_sum(lengths_list[j], weights[j]))
 
     return probability
 
 
 ##
-# \fn prob_of_DC()
-def prob_of_DC(network: STN) -> float:
-    _, num_conflicts, cycles, neg_weights = relaxSearch(network)
+# \fn prob_of_DC(network, exact)
+@memoized()
+def prob_of_DC(network: STN, exact=True) -> float:
+    conflicts = conflict_sums(network)
+    if conflicts is None:
+        return 0.0
+
+    lengths_list, weights_list = conflicts
+    return prob_of_multiple_conflicts(lengths_list, weights_list, exact)
+
+
+##
+# \fn conflict_sums(network)
+# \brief Relax an STNU and collect, for every conflict, the lengths of its
+#        contingent edges and the sum S they should stay below
+#
+# \note The input network is not modified
+#
+# @param network   An STNU
+#
+# @return A list of lengths for each conflict and the list of their sums, or
+#         None if the conflicts cannot be resolved
+def conflict_sums(network: STN):
+    from relax import relaxSearch
+    result, num_conflicts, cycles, neg_weights = relaxSearch(network)
+    if result is None:
+        return None
 
     lengths_list = [[] for j in range(num_conflicts)]
     weights_list = []
@@ -88,4 +266,84 @@ def prob_of_DC(network: STN) -> float:
         S = sum(lengths_list[j]) + neg_weights[j]
         weights_list.append(S)
 
-    return prob_of_multiple_conflicts(lengths_list, weights_list)
+    return lengths_list, weights_list
+
+
+##
+# \fn _conflict_sums_of(item)
+# \brief Pool worker for prob_of_DC_batch, taking a file name or an STN
+def _conflict_sums_of(item):
+    if isinstance(item, str):
+        network = loadSTNfromJSONfile(item)
+    else:
+        network = item.copy()
+    return conflict_sums(network)
+
+
+##
+# \fn prob_of_DC_batch(networks, exact, jobs)
+# \brief Compute prob_of_DC for many networks at once
+#
+# \details Conflicts are extracted in a process pool and gathered into flat
+#          (ragged) arrays of edge lengths with one sum S per conflict. The
+#          normal approximation is then a single vectorized norm.cdf call
+#          over every conflict in the batch; exact probabilities are
+#          evaluated conflict by conflict with prob_small_sum_exact.
+#
+# @param networks  A list of JSON file names and/or STN objects
+# @param exact     Use prob_small_sum_exact instead of the normal
+#                  approximation
+# @param jobs      The number of worker processes (1 runs in this process,
+#                  None uses every CPU)
+#
+# @return A dictionary from each file name (or, for STN objects, the index
+#         in networks) to the probability that the network is DC
+def prob_of_DC_batch(networks: list, exact=True, jobs=None) -> dict:
+    keys = [item if isinstance(item, str) else k
+            for k, item in enumerate(networks)]
+
+    if jobs == 1:
+        extracted = [_conflict_sums_of(item) for item in networks]
+    else:
+        with multiprocessing.Pool(jobs) as pool:
+            extracted = pool.map(_conflict_sums_of, networks)
+
+    # Ragged arrays: every edge knows its conflict and every conflict knows
+    # its network
+    lengths = []
+    edge_owner = []
+    sums = []
+    conflict_owner = []
+    for k, conflicts in enumerate(extracted):
+        if conflicts is None:
+            continue
+        for edge_lengths, S in zip(*conflicts):
+            lengths += edge_lengths
+            edge_owner += [len(sums)] * len(edge_lengths)
+            sums.append(S)
+            conflict_owner.append(k)
+
+    lengths = np.array(lengths, dtype=float)
+    edge_owner = np.array(edge_owner, dtype=int)
+    sums = np.array(sums, dtype=float)
+    conflict_owner = np.array(conflict_owner, dtype=int)
+
+    if exact:
+        starts = np.searchsorted(edge_owner, np.arange(len(sums)))
+        ends = np.searchsorted(edge_owner, np.arange(len(sums)), 'right')
+        probs = np.array([prob_small_sum_exact(lengths[a:b], S)
+                          for a, b, S in zip(starts, ends, sums)])
+    else:
+        from scipy.stats import norm
+        mean = np.bincount(edge_owner, lengths, len(sums)) / 2
+        variance = np.bincount(edge_owner, lengths * lengths, len(sums)) / 12
+        with np.errstate(divide='ignore', invalid='ignore'):
+            probs = norm.cdf((sums - mean) / np.sqrt(variance))
+
+    result = np.ones(len(networks))
+    np.multiply.at(result, conflict_owner, probs)
+    for k, conflicts in enumerate(extracted):
+        if conflicts is None:
+            result[k] = 0.0
+
+    return dict(zip(keys, result.tolist()))
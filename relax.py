@@ -1,5 +1,9 @@
 from algorithm import *
 from pulp import *
+from itertools import accumulate
+import numpy as np
+from tracing import traced, networkArgs
+from memo import memoized
 
 ## \file relax.py
 #  \brief relaxation algorithm for dynamic controllability
@@ -177,6 +181,12 @@ def relaxDeltaLP(bounds, weight, debug=False):
 # \fn optimalRelax(bounds, weight)
 # \brief optimal solution for compute relax strategy
 #
+# \details Shrinking the contingent edges in a conflict by a total of -weight
+#          while keeping the largest volume is a water-filling problem: the
+#          longest edges are cut down to a common level A, and the others are
+#          left alone. After sorting (O(k log k)) the level is found from
+#          prefix sums by binary search.
+#
 # @param bounds       A dictionary of bounds we can relax to resolve conflict
 # @param weight       Weight of the semi-reducible negative cycle
 #
@@ -189,19 +199,10 @@ def optimalRelax(bounds, weight):
 
     length = [e.Cij + e.Cji for e in contingent]
     S = sum(length) + weight
-    n = len(contingent)
     if S < 0:
         return None
 
-    m = None
-    for i in range(n):
-        previous = length[:i]
-        test_sum = sum(previous) + (n - i) * length[i]
-        if test_sum >= S:
-            m = i
-            break
-
-    A = (S - sum(length[:m])) / (n - m)
+    m, A = waterLevel(length, S)
     epsilons = {}
     for e in contingent[m:]:
         epsilons[e.j] = e.Cij + e.Cji - A
@@ -209,18 +210,85 @@ def optimalRelax(bounds, weight):
     return epsilons
 
 
+##
+# \fn waterLevel(length, S)
+# \brief Find the level the longest edges of a conflict are shrunk to
+#
+# @param length       A list of edge lengths sorted in increasing order
+# @param S            The total length the edges may keep (0 <= S)
+#
+# @return The index m of the first shrunk edge and the common level A. Edges
+#         length[m:] are cut down to A, the others are left unchanged.
+def waterLevel(length, S):
+    n = len(length)
+    prefix = [0] + list(accumulate(length))
+
+    # Keeping length[:i] and cutting the rest to length[i] keeps a total of
+    # prefix[i] + (n - i) * length[i], which is nondecreasing in i.
+    lo, hi = 0, n
+    while lo < hi:
+        i = (lo + hi) // 2
+        if prefix[i] + (n - i) * length[i] >= S:
+            hi = i
+        else:
+            lo = i + 1
+
+    m = lo
+    if m == n:
+        return n, None
+
+    return m, (S - prefix[m]) / (n - m)
+
+
+##
+# \fn optimalRelaxBatch(lengths_list, weights)
+# \brief Run optimalRelax on a batch of conflicts given as arrays
+#
+# @param lengths_list A list of arrays holding the edge lengths of each
+#                     conflict
+# @param weights      An array with the weight of each conflict
+#
+# @return A list holding, for each conflict, an array of the amount removed
+#         from each edge (in input order), or None if the conflict cannot be
+#         resolved
+def optimalRelaxBatch(lengths_list, weights):
+    result = []
+    for lengths, weight in zip(lengths_list, weights):
+        lengths = np.asarray(lengths, dtype=float)
+        S = lengths.sum() + weight
+        if S < 0:
+            result.append(None)
+            continue
+
+        order = np.argsort(lengths, kind='stable')
+        m, A = waterLevel(lengths[order], S)
+        epsilons = np.zeros(len(lengths))
+        if A is not None:
+            epsilons[order[m:]] = lengths[order[m:]] - A
+        result.append(epsilons)
+    return result
+
+
 ##
 # \fn relaxSearch(STN)
 # \brief run relaxation algorithm on an STNU so that it becomes dynamically
 #        controllable
 #
-# @param STN       An STNU we want to relax/process
+# @param STN       An STNU we want to relax/process (not modified)
 #
 # @return The dynamically controllable relaxed STNU and the number of conflict
 #         need to be resolved
+@memoized()
+@traced(args=networkArgs)
 def relaxSearch(STN):
+    # Relax a copy, so that the input is left alone whether or not the result
+    # comes from the memo
+    STN = STN.copy()
     relexations = []
-    result, conflicts, bounds, weight = DC_Checker(STN.copy(), report=False)
+    # The networks checked here change after every relaxation, so they are
+    # not worth memoizing
+    check = DC_Checker.__wrapped__
+    result, conflicts, bounds, weight = check(STN.copy(), report=False)
 
     count = 0
     cycles = []
@@ -234,7 +302,7 @@ def relaxSearch(STN):
 
         if not epsilons:
             print("The STNU cannot resolve the conflict...")
-            return None, 0, None
+            return None, 0, None, None
 
         for (i, j) in list(STN.contingentEdges.keys()):
             if j not in list(epsilons.keys()):
@@ -247,7 +315,6 @@ def relaxSearch(STN):
                 STN.modifyEdge(j, i, edge.Cji - epsilons[j])
 
         count += 1
-        result, conflicts, bounds, weight = DC_Checker(
-            STN.copy(), report=False)
+        result, conflicts, bounds, weight = check(STN.copy(), report=False)
 
     return STN, count, cycles, weights
@@ -1,10 +1,339 @@
 import json
-from scipy.stats.stats import pearsonr
+import numbers
+import os
+import sqlite3
+
+import numpy as np
 
 ##
 # \file result_stats.py
 # \brief Collect correlation between success rate & DSC approximation
 #        in STNUs.
+#
+# \details Data files hold [x, y] pairs, one per network:
+#          - a json dictionary {network: [x, y]} (result_success.json, ...)
+#          - a JSONL file, one [x, y] pair or {network: [x, y]} object per
+#            line
+#          - an SQLite results store (results.py), where the pairs are the
+#            values of one metric, e.g. 'lp' whose values are
+#            [degree of SC, success rate]
+#
+#          Records are read as a stream and processed CHUNK at a time, so
+#          the memory used does not grow with the number of records:
+#          - Pearson's r is computed from running moments over every record
+#          - Spearman's rho and Kendall's tau are computed on a uniform
+#            sample of at most SAMPLE records (every record if there are
+#            fewer), kept by bottom-k sampling on random keys
+#          - confidence intervals are percentile bootstraps over a sample of
+#            BOOTSTRAP_SAMPLE records (KENDALL_SAMPLE for Kendall's tau),
+#            with the resamples computed as rows of one array
+
+
+## The extensions of SQLite results stores
+STORE_EXTENSIONS = ('.sqlite', '.db')
+
+## The number of records read and processed at a time
+CHUNK = 1 << 16
+
+## The number of records the rank correlations are computed on
+SAMPLE = 100000
+
+## The number of records the bootstrap resamples are drawn from
+BOOTSTRAP_SAMPLE = 10000
+
+## The number of records the bootstrap of Kendall's tau is drawn from
+KENDALL_SAMPLE = 500
+
+## The number of bootstrap resamples
+RESAMPLES = 1000
+
+## The number of cells of the arrays of resamples computed at once
+BATCH_CELLS = 1 << 20
+
+
+##
+# \fn read_pairs(path, metric=None, params=None)
+# \brief Stream the [x, y] pairs of a data file
+#
+# @param path       A json, JSONL or SQLite (.sqlite, .db) file
+# @param metric     For a results store, the metric whose values are read
+#                   (required, since metrics have values of different kinds)
+# @param params     For a results store, the parameters of the values
+#                   (any parameters if None)
+#
+# @return A generator of [x, y] pairs
+def read_pairs(path: str, metric=None, params=None):
+    extension = os.path.splitext(path)[1]
+    if extension in STORE_EXTENSIONS:
+        if metric is None:
+            raise ValueError("A metric is needed to read the results store "
+                             "{}".format(path))
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        from results import ResultStore
+        query = 'SELECT value FROM results WHERE metric=?'
+        arguments = [metric]
+        if params is not None:
+            query += ' AND params=?'
+            arguments.append(ResultStore.key(params))
+
+        db = sqlite3.connect(path)
+        try:
+            for (value,) in db.execute(query, arguments):
+                yield json.loads(value)
+        finally:
+            db.close()
+
+    elif extension == '.jsonl':
+        with open(path) as data_file:
+            for line in data_file:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if isinstance(record, dict):
+                    yield from record.values()
+                else:
+                    yield record
+
+    else:
+        with open(path) as data_file:
+            yield from json.load(data_file).values()
+
+
+##
+# \fn chunks(pairs, size=CHUNK)
+# \brief Group a stream of [x, y] pairs into arrays
+#
+# @param pairs      An iterable of [x, y] pairs
+# @param size       The number of pairs per array
+#
+# @return A generator of float arrays of shape (size, 2), the last one
+#         possibly shorter. Pairs with a missing or infinite value are
+#         dropped, and a record that is not an [x, y] pair of numbers raises
+#         a ValueError.
+def chunks(pairs, size=CHUNK):
+    buffer = []
+    for pair in pairs:
+        buffer.append(pair)
+        if len(buffer) == size:
+            yield _finite(buffer)
+            buffer = []
+    if buffer:
+        yield _finite(buffer)
+
+
+## \brief The pairs of a list with finite values, as a float array
+def _finite(buffer):
+    try:
+        # None becomes nan
+        block = np.array(buffer, dtype=float)
+    except (TypeError, ValueError):
+        block = None
+
+    if block is None or block.ndim != 2 or block.shape[1] != 2:
+        for record in buffer:
+            if not isinstance(record, (list, tuple)) or len(record) != 2 or \
+                    not all(v is None or isinstance(v, numbers.Real)
+                            for v in record):
+                break
+        raise ValueError("Records should be [x, y] pairs of numbers, not "
+                         "{!r}".format(record))
+    return block[np.isfinite(block).all(axis=1)]
+
+
+##
+# \class Moments
+# \brief Running count, means, second moments and co-moment of (X, Y)
+#
+# \details Chunks are merged with the pairwise update of Chan et al., which
+#          is as accurate as a two-pass computation.
+class Moments(object):
+
+    ## \brief Moments Constructor
+    def __init__(self):
+        self.n = 0
+        self.mean = np.zeros(2)
+        self.m2 = np.zeros(2)
+        self.c = 0.0
+
+    ## \brief Add a chunk of pairs, an array of shape (m, 2)
+    def update(self, chunk):
+        m = len(chunk)
+        if m == 0:
+            return
+        mean = chunk.mean(axis=0)
+        centered = chunk - mean
+        m2 = (centered * centered).sum(axis=0)
+        c = centered[:, 0] @ centered[:, 1]
+
+        n = self.n + m
+        delta = mean - self.mean
+        self.mean = self.mean + delta * m / n
+        self.m2 = self.m2 + m2 + delta * delta * self.n * m / n
+        self.c = self.c + c + delta[0] * delta[1] * self.n * m / n
+        self.n = n
+
+    ##
+    # \brief Pearson's correlation of the pairs added so far
+    #
+    # @return The correlation and its two-sided p-value, as pearsonr
+    def pearson(self) -> tuple:
+        from scipy.stats import t
+        if self.n < 2 or self.m2[0] == 0 or self.m2[1] == 0:
+            return float('nan'), float('nan')
+        r = float(np.clip(self.c / np.sqrt(self.m2[0] * self.m2[1]), -1, 1))
+        if self.n == 2 or abs(r) == 1:
+            return r, 1.0 if self.n == 2 else 0.0
+        dof = self.n - 2
+        statistic = r * np.sqrt(dof / (1 - r * r))
+        return r, float(2 * t.sf(abs(statistic), dof))
+
+
+##
+# \class Sample
+# \brief A uniform sample of at most `size` pairs of a stream
+#
+# \details Every pair gets a uniform random key and the pairs with the
+#          `size` smallest keys are kept. The kept pairs are in key order, so
+#          any prefix of the sample is itself a uniform sample.
+class Sample(object):
+
+    ## \brief Sample Constructor
+    #  \param size      The maximum number of pairs kept
+    #  \param rng       A numpy Generator
+    def __init__(self, size, rng):
+        self.size = size
+        self.rng = rng
+        self.keys = np.empty(0)
+        self.pairs = np.empty((0, 2))
+
+    ## \brief Add a chunk of pairs, an array of shape (m, 2)
+    def update(self, chunk):
+        keys = np.concatenate([self.keys, self.rng.random(len(chunk))])
+        pairs = np.concatenate([self.pairs, chunk])
+        if len(keys) > self.size:
+            kept = np.argpartition(keys, self.size - 1)[:self.size]
+            keys, pairs = keys[kept], pairs[kept]
+        order = np.argsort(keys)
+        self.keys, self.pairs = keys[order], pairs[order]
+
+
+##
+# \fn pearson_rows(x, y)
+# \brief Pearson's correlation of every row of two arrays of shape (b, n)
+def pearson_rows(x, y):
+    x = x - x.mean(axis=1, keepdims=True)
+    y = y - y.mean(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (x * y).sum(axis=1) / np.sqrt((x * x).sum(axis=1) *
+                                             (y * y).sum(axis=1))
+
+
+##
+# \fn spearman_rows(x, y)
+# \brief Spearman's correlation of every row of two arrays of shape (b, n)
+def spearman_rows(x, y):
+    from scipy.stats import rankdata
+    return pearson_rows(rankdata(x, axis=1), rankdata(y, axis=1))
+
+
+##
+# \fn kendall_rows(x, y)
+# \brief Kendall's tau-b of every row of two arrays of shape (b, n)
+#
+# \details Sums the signs of the pairs (i, j), i < j, one i at a time over
+#          every row at once. Ties count in neither direction.
+def kendall_rows(x, y):
+    concordance = np.zeros(len(x))
+    x_pairs = np.zeros(len(x))
+    y_pairs = np.zeros(len(x))
+    for i in range(x.shape[1] - 1):
+        sx = np.sign(x[:, i + 1:] - x[:, i:i + 1])
+        sy = np.sign(y[:, i + 1:] - y[:, i:i + 1])
+        concordance += (sx * sy).sum(axis=1)
+        x_pairs += np.abs(sx).sum(axis=1)
+        y_pairs += np.abs(sy).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return concordance / np.sqrt(x_pairs * y_pairs)
+
+
+## The statistics of the bootstrap
+ROW_STATISTICS = {'pearson': pearson_rows,
+                  'spearman': spearman_rows,
+                  'kendall': kendall_rows}
+
+
+##
+# \fn bootstrap(pairs, statistic, rng, resamples=RESAMPLES, level=0.95)
+# \brief Percentile bootstrap confidence interval of a correlation
+#
+# @param pairs      An array of shape (n, 2)
+# @param statistic  A function of two arrays of shape (b, n) returning the
+#                   statistic of every row, e.g. pearson_rows
+# @param rng        A numpy Generator
+# @param resamples  The number of resamples
+# @param level      The confidence level
+#
+# @return The [low, high] interval, or [nan, nan] with fewer than 3 pairs
+def bootstrap(pairs, statistic, rng, resamples=RESAMPLES, level=0.95):
+    n = len(pairs)
+    if n < 3:
+        return [float('nan'), float('nan')]
+
+    batch = max(1, BATCH_CELLS // n)
+    values = []
+    for start in range(0, resamples, batch):
+        index = rng.integers(0, n, size=(min(batch, resamples - start), n))
+        values.append(statistic(pairs[index, 0], pairs[index, 1]))
+    values = np.concatenate(values)
+
+    tail = (1 - level) / 2 * 100
+    low, high = np.nanpercentile(values, [tail, 100 - tail])
+    return [float(low), float(high)]
+
+
+##
+# \fn correlations(pairs, resamples=RESAMPLES, level=0.95, seed=None)
+# \brief Pearson, Spearman and Kendall correlations of a stream of pairs,
+#        with bootstrap confidence intervals
+#
+# @param pairs      An iterable of [x, y] pairs, e.g. read_pairs(path)
+# @param resamples  The number of bootstrap resamples (0 for no intervals)
+# @param level      The confidence level of the intervals
+# @param seed       The seed of the sampling and of the bootstrap
+#
+# @return A dictionary with the number of records 'n', the size of the
+#         sample the rank correlations are computed on 'sample', and for
+#         each of 'pearson', 'spearman' and 'kendall' a dictionary
+#         {'r', 'p', 'ci'}
+def correlations(pairs, resamples=RESAMPLES, level=0.95, seed=None):
+    from scipy.stats import spearmanr, kendalltau
+
+    rng = np.random.default_rng(seed)
+    moments = Moments()
+    sample = Sample(SAMPLE, rng)
+    for chunk in chunks(pairs):
+        moments.update(chunk)
+        sample.update(chunk)
+
+    kept = sample.pairs
+    result = {'n': moments.n, 'sample': len(kept)}
+    r, p = moments.pearson()
+    result['pearson'] = {'r': r, 'p': p}
+
+    for name, function in [('spearman', spearmanr), ('kendall', kendalltau)]:
+        if len(kept) < 2:
+            r, p = float('nan'), float('nan')
+        else:
+            r, p = function(kept[:, 0], kept[:, 1])
+        result[name] = {'r': float(r), 'p': float(p)}
+
+    for name, statistic in ROW_STATISTICS.items():
+        size = KENDALL_SAMPLE if name == 'kendall' else BOOTSTRAP_SAMPLE
+        result[name]['ci'] = bootstrap(kept[:size], statistic, rng,
+                                       resamples, level) if resamples \
+            else None
+    return result
 
 
 ##
@@ -14,9 +343,10 @@ from scipy.stats.stats import pearsonr
 # @param file_name      The name of the data file
 # @return               The correlation and p-value of the input data
 def correlation_from_file(file_name: str) -> tuple:
-    with open(file_name) as data_file:
-        data = json.load(data_file)
-    return correlation_of_dict(data)
+    moments = Moments()
+    for chunk in chunks(read_pairs(file_name)):
+        moments.update(chunk)
+    return moments.pearson()
 
 
 ##
@@ -27,48 +357,54 @@ def correlation_from_file(file_name: str) -> tuple:
 # @param data      A dictionary storing data points
 # @return          The correlation and p-value of the input data
 def correlation_of_dict(data: dict) -> tuple:
-    data_pts = data.values()
-    x_pts = []
-    y_pts = []
-
-    for pt in data_pts:
-        x_pts.append(pt[0])
-        y_pts.append(pt[1])
-
-    return pearsonr(x_pts, y_pts)
+    moments = Moments()
+    for chunk in chunks(data.values()):
+        moments.update(chunk)
+    return moments.pearson()
 
 
 ##
-# \fn main()
-# \brief Takes in json dictionary of data and prints out correlations.
-def main():
-    relpath = "result/"
-    fnames = ['result_success.json', 'result_compare.json']
+# \fn main(file_names=None, relpath="result/", metric=None,
+#          resamples=RESAMPLES, level=0.95, seed=None)
+# \brief Takes in data files of [x, y] pairs and prints out correlations.
+#
+# @param file_names     Paths of the data files, by default
+#                       result_success.json and result_compare.json in relpath
+# @param relpath        The folder the results are written to
+# @param metric         The metric read from SQLite results stores
+# @param resamples      The number of bootstrap resamples
+# @param level          The confidence level of the intervals
+# @param seed           The seed of the sampling and of the bootstrap
+def main(file_names=None, relpath="result/", metric=None,
+         resamples=RESAMPLES, level=0.95, seed=None):
+    if file_names is None:
+        file_names = [os.path.join(relpath, f) for f in
+                      ['result_success.json', 'result_compare.json']]
 
     pretty_out = 'pretty_results.txt'
     raw_out = 'stats.json'
 
     stats = {}
-    for file_name in fnames:
-        stats[file_name] = correlation_from_file(f"{relpath}{file_name}")
-
-    # Clear file
-    open(f"{relpath}{pretty_out}", 'w').close()
+    for path in file_names:
+        file_name = os.path.basename(path)
+        stats[file_name] = correlations(read_pairs(path, metric), resamples,
+                                        level, seed)
 
     # Write to file
-    pretty_file = open(f"{relpath}{pretty_out}", 'a')
-    for file_name, stat in stats.items():
-        line: str = (f"The data in {file_name} had"
-                     "\n\tCorrelation:\t"
-                     f"{stat[0]}"
-                     "\n\tP-value:\t"
-                     f"{stat[1]}"
-                     "\n\n")
-        pretty_file.write(line)
-    pretty_file.close()
+    with open(os.path.join(relpath, pretty_out), 'w') as pretty_file:
+        for file_name, stat in stats.items():
+            line: str = (f"The data in {file_name} had {stat['n']} records"
+                         f" ({stat['sample']} for the rank correlations)\n")
+            for name in ROW_STATISTICS:
+                line += (f"\t{name.capitalize()}:\t{stat[name]['r']}"
+                         f"\tP-value:\t{stat[name]['p']}")
+                if stat[name]['ci'] is not None:
+                    line += f"\t{level:.0%} CI:\t{stat[name]['ci']}"
+                line += "\n"
+            pretty_file.write(line + "\n")
 
     # Store dictionary in JSON file
-    with open(f"{relpath}{raw_out}", 'w') as storage:
+    with open(os.path.join(relpath, raw_out), 'w') as storage:
         json.dump(stats, storage)
     return 0
 
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+##
+# \file results.py
+# \brief A persistent store of experiment results in SQLite
+#
+# \details Every result is stored under the sha1 of the json content of its
+#          network (the same hash as the Dataset cache), the name of the
+#          metric (e.g. 'simulate', 'lp') and the parameters it was computed
+#          with. Results are committed one network at a time, so an
+#          interrupted run loses at most the network it was working on, and
+#          ResultStore.run skips the networks already in the store: a sweep
+#          resumes where it stopped, and a network that shows up again (under
+#          any file name) is not computed twice.
+#
+#          Sampled metrics need a random stream per network that does not
+#          depend on the other networks of the run, otherwise a stored result
+#          could not be reused. networkSeed spawns it from the seed and the
+#          content hash of the network.
+
+
+## The table of results
+SCHEMA = """CREATE TABLE IF NOT EXISTS results (
+    network TEXT NOT NULL,
+    metric  TEXT NOT NULL,
+    params  TEXT NOT NULL,
+    name    TEXT,
+    value   TEXT NOT NULL,
+    seconds REAL,
+    created TEXT,
+    PRIMARY KEY (network, metric, params))"""
+
+
+##
+# \fn fileHash(path)
+# \brief The sha1 of the content of a file, as used by the Dataset cache
+def fileHash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+##
+# \fn networkSeed(seed, digest)
+# \brief The random stream of one network, spawned from a seed and the
+#        content hash of the network
+#
+# @param seed       An integer seed, or None for fresh entropy
+# @param digest     The content hash of the network (see fileHash)
+#
+# @return A numpy SeedSequence
+def networkSeed(seed, digest):
+    import numpy as np
+    return np.random.SeedSequence(seed, spawn_key=(int(digest[:16], 16),))
+
+
+##
+# \class ResultStore
+# \brief Results keyed by network content hash, metric and parameters
+class ResultStore(object):
+
+    ## \brief ResultStore Constructor
+    #  \param path      The SQLite file (created if it does not exist)
+    def __init__(self, path='result/results.sqlite'):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=60)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(SCHEMA)
+        self.db.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    ## \brief Close the database
+    def close(self):
+        self.db.close()
+
+    ## \brief The canonical text of a parameter dictionary
+    @staticmethod
+    def key(params):
+        return json.dumps(params or {}, sort_keys=True, separators=(',', ':'))
+
+    ##
+    # \brief Get a stored result
+    #
+    # @param network    The content hash of the network
+    # @param metric     The name of the metric
+    # @param params     The parameters of the result
+    # @param default    Returned if there is no such result
+    def get(self, network, metric, params=None, default=None):
+        row = self.db.execute(
+            'SELECT value FROM results WHERE network=? AND metric=? AND '
+            'params=?', (network, metric, self.key(params))).fetchone()
+        return json.loads(row[0]) if row is not None else default
+
+    ## \brief Whether a result is stored
+    def has(self, network, metric, params=None):
+        return self.db.execute(
+            'SELECT 1 FROM results WHERE network=? AND metric=? AND '
+            'params=?', (network, metric, self.key(params))).fetchone() \
+            is not None
+
+    ##
+    # \brief Store a result and commit it
+    #
+    # @param network    The content hash of the network
+    # @param metric     The name of the metric
+    # @param params     The parameters of the result
+    # @param value      The result, anything json can encode
+    # @param name       The file name of the network
+    # @param seconds    The time it took to compute the result
+    def put(self, network, metric, params, value, name=None, seconds=None):
+        self.db.execute(
+            'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (network, metric, self.key(params), name, json.dumps(value),
+             seconds, time.strftime('%Y-%m-%dT%H:%M:%S')))
+        self.db.commit()
+
+    ##
+    # \brief The results of a metric by network file name, in the format of
+    #        the json files of result/
+    #
+    # @param metric     The name of the metric
+    # @param params     The parameters of the results
+    #
+    # @return A dictionary {file name: value}
+    def table(self, metric, params=None):
+        rows = self.db.execute(
+            'SELECT name, value FROM results WHERE metric=? AND params=? '
+            'ORDER BY name', (metric, self.key(params)))
+        return {name: json.loads(value) for name, value in rows}
+
+    ##
+    # \brief Compute a metric on networks, skipping those already stored
+    #
+    # @param paths      The json files of the networks
+    # @param metric     The name of the metric
+    # @param compute    A function of (path, content hash) returning the
+    #                   result for one network
+    # @param params     The parameters of the results
+    #
+    # @return A dictionary {file name: value} for every path, stored or new
+    def run(self, paths, metric, compute, params=None):
+        result = {}
+        for path in paths:
+            name = os.path.basename(path)
+            digest = fileHash(path)
+            value = self.get(digest, metric, params, self)
+            if value is self:
+                start = time.perf_counter()
+                value = compute(path, digest)
+                self.put(digest, metric, params, value, name,
+                         time.perf_counter() - start)
+                # Same types as a stored result (e.g. lists, not tuples)
+                value = json.loads(json.dumps(value))
+            result[name] = value
+        return result
@@ -0,0 +1,149 @@
+import numpy as np
+import warnings
+
+##
+# \file sampling.py
+# \brief Seedable random streams for drawing realizations of contingent edges
+#
+# \details Every sampler in the project (dispatch simulations, strong
+#          controllability sampling and the STNU generators) takes a `seed`
+#          or `rng` argument that is passed through get_rng. Seeds may be
+#          None, an int, a numpy SeedSequence or an existing numpy Generator.
+#          Parallel runs should give each worker its own stream with
+#          spawn_seeds so that results can be split and recombined
+#          deterministically.
+#
+#          Realizations can be drawn with plain uniform sampling or with one
+#          of the variance reducing strategies in SAMPLING_STRATEGIES:
+#          scrambled Sobol and Halton low-discrepancy sequences, Latin
+#          hypercube sampling and antithetic pairs. All of them are unbiased,
+#          so success rates estimated from them can be averaged as usual.
+
+
+## The strategies accepted by unit_samples
+SAMPLING_STRATEGIES = ('uniform', 'sobol', 'halton', 'lhs', 'antithetic')
+
+
+##
+# \fn get_rng(seed)
+# \brief Build a numpy Generator from a seed
+#
+# @param seed     None, an int, a SeedSequence or a numpy Generator. A
+#                 Generator is returned unchanged so that one stream can be
+#                 shared by several samplers.
+#
+# @return A numpy.random.Generator
+def get_rng(seed=None) -> np.random.Generator:
+    return np.random.default_rng(seed)
+
+
+##
+# \fn spawn_seeds(seed, n)
+# \brief Split a seed into n independent child streams
+#
+# @param seed     None, an int, a SeedSequence or a numpy Generator
+# @param n        The number of child streams we want
+#
+# @return A list of n SeedSequence objects, one for each worker or batch
+def spawn_seeds(seed, n: int) -> list:
+    if isinstance(seed, np.random.Generator):
+        seed = seed.bit_generator.seed_seq
+    elif not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return seed.spawn(n)
+
+
+##
+# \fn unit_samples(dim, size, rng, strategy)
+# \brief Draw points from the unit hypercube [0, 1)^dim
+#
+# @param dim        The dimension of the hypercube (number of contingent edges)
+# @param size       The number of points to draw
+# @param rng        A seed or Generator to draw from (also used to scramble
+#                   the low-discrepancy sequences)
+# @param strategy   One of SAMPLING_STRATEGIES
+#
+# @return A (size, dim) array of points
+def unit_samples(dim: int, size: int, rng=None,
+                 strategy='uniform') -> np.ndarray:
+    rng = get_rng(rng)
+    if strategy not in SAMPLING_STRATEGIES:
+        raise ValueError("Unknown sampling strategy: {}".format(strategy))
+
+    if strategy == 'uniform' or dim == 0 or size == 0:
+        return rng.random((size, dim))
+
+    if strategy == 'antithetic':
+        half = rng.random(((size + 1) // 2, dim))
+        return np.concatenate((half, 1.0 - half))[:size]
+
+    from scipy.stats import qmc
+    if strategy == 'sobol':
+        engine = qmc.Sobol(dim, scramble=True, seed=rng)
+    elif strategy == 'halton':
+        engine = qmc.Halton(dim, scramble=True, seed=rng)
+    else:
+        engine = qmc.LatinHypercube(dim, seed=rng)
+
+    # Sobol points are only balanced for powers of two, but any prefix of a
+    # scrambled sequence is still an unbiased sample.
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+        return engine.random(size)
+
+
+##
+# \fn contingent_bounds(network)
+# \brief Collect the contingent intervals of an STNU as arrays
+#
+# @param network  An input STNU
+#
+# @return A list of uncontrollable events, and arrays holding the lower and
+#         upper bounds of their incoming contingent edges (in the same order
+#         as network.contingentEdges)
+def contingent_bounds(network) -> tuple:
+    sinks = []
+    lows = []
+    highs = []
+    for (i, j), edge in network.contingentEdges.items():
+        sinks.append(j)
+        lows.append(-edge.Cji)
+        highs.append(edge.Cij)
+    return sinks, np.array(lows, dtype=float), np.array(highs, dtype=float)
+
+
+##
+# \fn sample_intervals(lows, highs, size, rng, strategy)
+# \brief Draw realizations uniformly at random from a box of intervals
+#
+# @param lows       Array of lower bounds, one per contingent edge
+# @param highs      Array of upper bounds, one per contingent edge
+# @param size       The number of realizations to draw
+# @param rng        A seed or Generator to draw from
+# @param strategy   One of SAMPLING_STRATEGIES
+#
+# @return A (size, len(lows)) array whose rows are realizations
+def sample_intervals(lows, highs, size: int, rng=None,
+                     strategy='uniform') -> np.ndarray:
+    lows = np.asarray(lows, dtype=float)
+    highs = np.asarray(highs, dtype=float)
+    unit = unit_samples(len(lows), size, rng, strategy)
+    return lows + (highs - lows) * unit
+
+
+##
+# \fn sample_realizations(network, size, rng, strategy)
+# \brief Draw realizations for all contingent edges of an STNU in bulk
+#
+# @param network    An input STNU
+# @param size       The number of realizations to draw
+# @param rng        A seed or Generator to draw from
+# @param strategy   One of SAMPLING_STRATEGIES
+#
+# @return A list of size dictionaries from uncontrollable events to the
+#         duration of their incoming contingent edge
+def sample_realizations(network, size: int, rng=None,
+                        strategy='uniform') -> list:
+    sinks, lows, highs = contingent_bounds(network)
+    values = sample_intervals(lows, highs, size, rng, strategy)
+    return [dict(zip(sinks, row)) for row in values.tolist()]
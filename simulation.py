@@ -1,8 +1,8 @@
 from util import PriorityQueue
 from stn import STN, loadSTNfromJSONfile
 
-import empirical as emp
-import random
+import sampling
+from tracing import traced
 
 ##
 # \file simulation.py
@@ -28,10 +28,6 @@ def early_execution(network: STN, realization: dict) -> bool:
     not_scheduled = PriorityQueue()
     final_schedule = {}
 
-    # Mapping from contingent sources to uncontrollables
-    contingent_pairs = network.contingentEdges.keys()
-    disabled_uncontrollables = {src: sink for (src, sink) in contingent_pairs}
-
     # Initialize bounds for simulation - starts off with just controllables
     # and zero time point
     controllable_bounds = find_bounds(network)
@@ -58,10 +54,9 @@ def early_execution(network: STN, realization: dict) -> bool:
 
         assert old_time < current_time, "Chronology violated!"
 
-        if activated_event in disabled_uncontrollables:
-            # If this is a contingent source, we add the associated uncontrollable sink
-            # to the queue
-            uncontrollable = disabled_uncontrollables[activated_event]
+        # If this is a contingent source, we add the associated uncontrollable
+        # sinks to the queue
+        for uncontrollable in network.children.get(activated_event, ()):
             delay = realization[uncontrollable]
             not_scheduled.push(uncontrollable, current_time + delay)
 
@@ -79,20 +74,25 @@ def early_execution(network: STN, realization: dict) -> bool:
         # Keep track of this for next iteration of loop
         old_time = current_time
     # Check if we dispatched succesfully
-    return emp.scheduleIsValid(network, final_schedule)
+    return scheduleIsValid(network, final_schedule)
 
 
 ##
-# \fn dispatch(network, sample_size)
+# \fn dispatch(network, sample_size, seed, strategy)
 # \brief Simulates dispatch on the network a sample_size number of times,
 #        and then reports the success rate of dispatch
 #
 # @param network      STNU we schedule with
 # @param sample_size  Number of times we schedule on the network
-def dispatch(network: STN, sample_size: int) -> float:
+# @param seed         A seed or numpy Generator for drawing realizations
+# @param strategy     How realizations are drawn (see sampling.py)
+def dispatch(network: STN, sample_size: int, seed=None,
+             strategy='uniform') -> float:
     successes = 0
-    for sample in range(sample_size):
-        if simulate_once(network):
+    realizations = sampling.sample_realizations(network, sample_size, seed,
+                                                strategy)
+    for realization in realizations:
+        if early_execution(network, realization):
             successes += 1
     success_rate = float(successes / sample_size)
     print(f"Dispatch was succesful {100*success_rate}% of the time.")
@@ -100,18 +100,17 @@ def dispatch(network: STN, sample_size: int) -> float:
 
 
 ##
-# \fn simulate_once(network)
+# \fn simulate_once(network, rng)
 # \brief Generate a realization randomly, and simulate execution of the network for
 #        that realization
 #
 # @param network      STNU we run the simulation on
+# @param rng          A seed or numpy Generator for drawing the realization
 #
 # @return A bool which is True if and only if execution is successful
-def simulate_once(network: STN) -> bool:
+def simulate_once(network: STN, rng=None) -> bool:
     # Generate the realization
-    realization = {}
-    for nodes, edge in network.contingentEdges.items():
-        realization[nodes[1]] = random.uniform(-edge.Cji, edge.Cij)
+    realization = sampling.sample_realizations(network, 1, rng)[0]
     # Run the simulation
     return early_execution(network, realization)
 
@@ -163,6 +162,45 @@ def safely_scheduled(network: STN, partial: dict, event) -> bool:
     return True
 
 
+##
+# \fn scheduleIsValid(network: STN, schedule: dict) -> bool
+# \brief Given an STNU and schedule, checks if the schedule is valid or not.
+#
+# @param network       An input STNU
+#
+# @param schedule      A dictionary whose keys are vertex IDs and whose values
+#                      are the times selected for those events.
+#
+# @return              True/False if the schedule is valid/invalid.
+@traced()
+def scheduleIsValid(network: STN, schedule: dict) -> bool:
+    ## Check that the schedule is actually defined on all relevant vertices
+    # This number is arbitrary - any sufficiently small, positive constant works
+    epsilon = 0.001
+    vertices = network.getAllVerts()
+    for vertex in vertices:
+        vertexID = vertex.nodeID
+        assert vertexID in schedule
+
+    # Check that the schedule is valid
+    edges = network.getAllEdges()
+    for edge in edges:
+        # Loop through the constraints
+        start = edge.i
+        fin   = edge.j
+        uBound = edge.Cij
+        lBound = -edge.Cji
+
+        boundedAbove = (schedule[fin] - schedule[start]) <= uBound + epsilon
+        boundedBelow = (schedule[fin] - schedule[start]) >= lBound - epsilon
+
+        # Check if constraint is not satisfied
+        if ((not boundedAbove) or (not boundedBelow)):
+            return False
+
+    return True
+
+
 # -------------------------------------------------------------------------
 #  Modify Networks
 # -------------------------------------------------------------------------
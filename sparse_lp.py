@@ -0,0 +1,734 @@
+from scipy import sparse
+from scipy.optimize import linprog
+import numpy as np
+import sys
+from memo import memoized
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+##
+# \file sparse_lp.py
+# \brief The LPs of LP.py, assembled directly as sparse matrices and solved
+#        in-process with HiGHS
+#
+# \details LP.py builds its models one PuLP constraint at a time and shells
+#          out to CBC. Here the same constraints are written straight into a
+#          CSR matrix from a single pass over the STN edges and solved with
+#          scipy.optimize.linprog(method='highs'). The functions return the
+#          same (status, ..., bounds, epsilons) tuples as LP.py, and the
+#          entries of bounds and epsilons expose varValue like PuLP
+#          variables, so newInterval and empirical.sample work unchanged.
+
+
+##
+# \brief A global variable that stores the max float that will be used to deal
+#        with infinite edges.
+MAX_FLOAT = sys.float_info.max
+
+## linprog status codes, named as in PuLP's LpStatus
+STATUS = {0: 'Optimal', 1: 'Not Solved', 2: 'Infeasible', 3: 'Unbounded',
+          4: 'Undefined'}
+
+## HiGHS model statuses, named as in PuLP's LpStatus
+HIGHS_STATUS = {'Optimal': 'Optimal', 'Infeasible': 'Infeasible',
+                'Unbounded': 'Unbounded',
+                'Primal infeasible or unbounded': 'Infeasible',
+                'Time limit reached': 'Not Solved',
+                'Iteration limit reached': 'Not Solved'}
+
+## The LP variants: originalLP with and without naiveObj, proportionLP,
+#  maxminLP and minmaxLP
+VARIANTS = ('original', 'naive', 'proportion', 'maxmin', 'minmax')
+
+
+##
+# \class Variable
+# \brief Stands in for a solved PuLP LpVariable
+class Variable(object):
+
+    ## \brief Variable Constructor
+    #  \param name     The name PuLP would give the variable
+    #  \param index    The column of the variable in the LP
+    def __init__(self, name, index):
+        self.name = name
+        self.index = index
+        self.varValue = None
+
+    ## \brief The value of the variable in the last solution
+    def value(self):
+        return self.varValue
+
+    def __repr__(self):
+        return "{} = {}".format(self.name, self.varValue)
+
+
+##
+# \class SparseLP
+# \brief Rows, columns and bounds of an LP under construction
+#
+# \details Constraints are collected as COO triplets and turned into CSR
+#          matrices once, right before solving.
+class SparseLP(object):
+
+    ## \brief SparseLP Constructor
+    def __init__(self):
+        ## All Variable objects, in column order
+        self.variables = []
+
+        ## Column bounds as lists of lower and upper values (None = unbounded)
+        self.lower = []
+        self.upper = []
+
+        ## COO triplets and right hand sides for <= and == rows
+        self.ub = ([], [], [])
+        self.b_ub = []
+        self.eq = ([], [], [])
+        self.b_eq = []
+
+        ## Named rows in the form {key: ('ub' or 'eq', row index)}
+        self.rows = {}
+
+    ## \brief Add a column and return its Variable
+    def addVariable(self, name, lowBound=None, upBound=None):
+        var = Variable(name, len(self.variables))
+        self.variables.append(var)
+        self.lower.append(lowBound)
+        self.upper.append(upBound)
+        return var
+
+    ## \brief Add the row sum(coef * var) <= rhs, optionally under a key
+    def addLessEqual(self, terms, rhs, key=None):
+        self._addRow('ub', self.ub, self.b_ub, terms, rhs, key)
+
+    ## \brief Add the row sum(coef * var) == rhs, optionally under a key
+    def addEqual(self, terms, rhs, key=None):
+        self._addRow('eq', self.eq, self.b_eq, terms, rhs, key)
+
+    def _addRow(self, kind, triplets, rhs_list, terms, rhs, key):
+        rows, cols, vals = triplets
+        row = len(rhs_list)
+        for coef, var in terms:
+            rows.append(row)
+            cols.append(var.index)
+            vals.append(coef)
+        rhs_list.append(rhs)
+        if key is not None:
+            self.rows[key] = (kind, row)
+
+    ##
+    # \brief Assemble the CSR constraint matrices
+    #
+    # @param dropInfinite   Leave out <= rows whose right hand side is
+    #                       infinite (or MAX_FLOAT), which never bind
+    #
+    # @return A dictionary of keyword arguments for linprog (without c)
+    def matrices(self, dropInfinite=True):
+        n = len(self.variables)
+        result = {'bounds': list(zip(self.lower, self.upper))}
+        for name, triplets, rhs in (('ub', self.ub, self.b_ub),
+                                    ('eq', self.eq, self.b_eq)):
+            if rhs:
+                rows, cols, vals = triplets
+                A = sparse.csr_matrix((vals, (rows, cols)),
+                                      shape=(len(rhs), n))
+                b = np.array(rhs, dtype=float)
+                if dropInfinite and name == 'ub':
+                    keep = b < MAX_FLOAT
+                    A, b = A[keep], b[keep]
+                result['A_' + name] = A
+                result['b_' + name] = b
+        return result
+
+    ##
+    # \brief Minimize c.x over the LP and store the solution in the Variables
+    #
+    # @param objective   A list of (coef, var) pairs to minimize
+    #
+    # @return The LP status, as a PuLP status string
+    def solve(self, objective):
+        c = np.zeros(len(self.variables))
+        for coef, var in objective:
+            c[var.index] += coef
+
+        res = linprog(c, method='highs', **self.matrices())
+        status = STATUS.get(res.status, 'Undefined')
+        if res.x is not None:
+            for var, value in zip(self.variables, res.x):
+                var.varValue = float(value)
+        return status
+
+
+##
+# \fn finite(weight)
+# \brief Map the weights standing for infinity (inf and MAX_FLOAT) to None
+def finite(weight):
+    return None if weight >= MAX_FLOAT else weight
+
+
+##
+# \fn boundMakespan(STN)
+# \brief Give every event a finite interval, as LP.setUp does
+#
+# \details See the NOTE in LP.setUp. Events without an edge to or from the
+#          zero timepoint get one through STN.setMakespan(MAX_FLOAT).
+def boundMakespan(STN):
+    for i in STN.verts:
+        if i != 0 and (0, i) not in STN.edges and (i, 0) not in STN.edges:
+            STN.setMakespan(MAX_FLOAT)
+            return
+
+
+##
+# \fn vertexBound(STN, i)
+# \brief Compute the column bounds of the t_i_lo and t_i_hi variables
+#
+# @return A tuple (lower bound of t_i_lo, upper bound of t_i_hi), using None
+#         for unbounded
+def vertexBound(STN, i):
+    if i == 0:
+        return 0, 0
+
+    # Distances from and to the zero timepoint, read from the edges directly
+    high = low = float('inf')
+    if (0, i) in STN.edges:
+        e = STN.edges[(0, i)]
+        high, low = min(high, e.Cij), min(low, e.Cji)
+    if (i, 0) in STN.edges:
+        e = STN.edges[(i, 0)]
+        high, low = min(high, e.Cji), min(low, e.Cij)
+
+    low = 0 if low == float('inf') else -low
+    return low, finite(high)
+
+
+##
+# \fn setUp(STN)
+# \brief Initializes the LP problem and the LP variables
+#
+# \details Mirrors LP.setUp: one pair of bound variables per event, and for
+#          every edge the contingent (==) or requirement (<=) rows.
+#
+# @param STN            An input STNU (modified by setMakespan as in LP.setUp)
+#
+# @return   A tuple (bounds, epsilons, lp) where bounds and epsilons are
+#           dictionaries of Variables, and lp is the SparseLP instance
+def setUp(STN):
+    bounds = {}
+    epsilons = {}
+    lp = SparseLP()
+
+    boundMakespan(STN)
+
+    for i in STN.verts:
+        low, high = vertexBound(STN, i)
+        bounds[(i, '+')] = lp.addVariable('t_%i_hi' % i, 0, high)
+        if i == 0:
+            bounds[(i, '-')] = lp.addVariable('t_%i_lo' % i, 0, 0)
+            continue
+        bounds[(i, '-')] = lp.addVariable('t_%i_lo' % i, low, None)
+
+        hi, lo = bounds[(i, '+')], bounds[(i, '-')]
+        lp.addLessEqual([(1, lo), (-1, hi)], 0)
+        if i not in STN.uncontrollables:
+            lp.addEqual([(1, lo), (-1, hi)], 0)
+
+    for (i, j), e in STN.edges.items():
+        if (i, j) in STN.contingentEdges:
+            epsilons[(j, '+')] = lp.addVariable('eps_%i_hi' % j, 0, None)
+            epsilons[(j, '-')] = lp.addVariable('eps_%i_lo' % j, 0, None)
+
+            lp.addEqual([(1, bounds[(j, '+')]), (-1, bounds[(i, '+')]),
+                         (1, epsilons[(j, '+')])], e.Cij, key=(i, j, '+'))
+            lp.addEqual([(1, bounds[(j, '-')]), (-1, bounds[(i, '-')]),
+                         (-1, epsilons[(j, '-')])], -e.Cji, key=(i, j, '-'))
+
+        else:
+            # Rows with an infinite right hand side never bind. They are kept
+            # here so that an LPSession can tighten them later, but left out
+            # when the matrices are handed to linprog.
+            lp.addLessEqual([(1, bounds[(j, '+')]),
+                             (-1, bounds[(i, '-')])], e.Cij, key=(i, j, '+'))
+            lp.addLessEqual([(1, bounds[(i, '+')]),
+                             (-1, bounds[(j, '-')])], e.Cji, key=(i, j, '-'))
+
+    return (bounds, epsilons, lp)
+
+
+##
+# \fn report(variables, status, debug)
+# \brief Print the status messages LP.py prints
+def report(variables, status, debug):
+    if debug:
+        print("Status: ", status)
+        for v in variables:
+            print(v.name, '=', v.varValue)
+
+    if status != 'Optimal':
+        print("The solution for LP is not optimal")
+
+
+##
+# \fn addObjective(STN, lp, epsilons, variant)
+# \brief Add the extra variable and rows of an LP variant and build its
+#        objective
+#
+# @param STN            The STNU lp was set up from
+# @param lp             A SparseLP returned by setUp
+# @param epsilons       The epsilon Variables returned by setUp
+# @param variant        One of VARIANTS
+#
+# @return   A tuple (aux, objective) where aux is the delta or z Variable
+#           (None for the original and naive objectives) and objective is a
+#           list of (coef, var) pairs to minimize
+def addObjective(STN, lp, epsilons, variant):
+    if variant not in VARIANTS:
+        raise ValueError("Unknown LP variant: {}".format(variant))
+
+    if variant == 'naive':
+        return None, [(1, epsilons[key]) for key in epsilons]
+
+    if variant == 'original':
+        Obj = []
+        for i, j in STN.contingentEdges:
+            c = STN.edges[(i, j)].Cij + STN.edges[(i, j)].Cji
+            Obj += [(1 / c, epsilons[(j, '+')]), (1 / c, epsilons[(j, '-')])]
+        return None, Obj
+
+    if variant == 'proportion':
+        aux = lp.addVariable('delta', 0, 1)
+    else:
+        aux = lp.addVariable('z', 0, None)
+
+    for (i, j), e in STN.contingentEdges.items():
+        eps = [(1, epsilons[(j, '-')]), (1, epsilons[(j, '+')])]
+        if variant == 'proportion':
+            # the proportion of uncertainty removed is delta
+            lp.addEqual(eps + [(-(e.Cij + e.Cji), aux)], 0, key=(i, j, 'aux'))
+        elif variant == 'maxmin':
+            lp.addLessEqual(eps + [(1, aux)], e.Cij + e.Cji,
+                            key=(i, j, 'aux'))
+        else:
+            lp.addLessEqual(eps + [(-1, aux)], 0, key=(i, j, 'aux'))
+
+    return aux, [(-1 if variant == 'maxmin' else 1, aux)]
+
+
+##
+# \fn originalLP(STN, naiveObj=False, debug=False):
+# \brief Runs the LP on the input STN
+#
+# @param STN            An input STNU (not modified)
+# @param naiveObj       Flag indicating if we are using the naive objective
+#                       function
+# @param debug          Print optional status messages
+#
+# @return   LP status, A dictionary of the Variables for the bounds on
+#           timepoints and a dictionary of Variables for epsilons
+@memoized('sparse_lp.originalLP')
+def originalLP(STN, naiveObj=False, debug=False):
+    # setUp bounds the events with setMakespan, so it works on a copy to
+    # leave the input alone whether or not the result comes from the memo
+    STN = STN.copy()
+    bounds, epsilons, lp = setUp(STN)
+    _, Obj = addObjective(STN, lp, epsilons,
+                          'naive' if naiveObj else 'original')
+
+    status = lp.solve(Obj)
+    report(lp.variables, status, debug)
+    if status != 'Optimal':
+        return status, None, None
+
+    return status, bounds, epsilons
+
+
+##
+# \fn proportionLP(STN, debug=False)
+# \brief Runs the Proportion LP on the input STN
+#
+# @param STN            An input STNU (should be weakly or dynamically
+#                       controllable)
+# @param debug          Print optional status messages
+#
+# @return   LP solving status, Variable delta and dictionaries of the
+#           Variables for bounds and epsilons
+def proportionLP(STN, debug=False):
+    return auxiliaryLP(STN, 'proportion', debug)
+
+
+##
+# \fn maxminLP(STN, debug=False)
+# \brief Runs the maximin LP on the input STN, try to maximize the min length
+#        of the shrinked contingent interval
+#
+# @param STN            An input STNU (should be weakly or dynamically
+#                       controllable)
+# @param debug          Print optional status messages
+#
+# @return   LP solving status, min contingent int length and dictionaries of
+#           the Variables for bounds and epsilons
+def maxminLP(STN, debug=False):
+    return auxiliaryLP(STN, 'maxmin', debug)
+
+
+##
+# \fn minmaxLP(STN, debug=False)
+# \brief Runs the minmax LP on the input STN, try to minimize the max
+#        amount of uncertainty removed from contingent intervals
+#
+# @param STN            An input STNU (should be weakly or dynamically
+#                       controllable)
+# @param debug          Print optional status messages
+#
+# @return   LP solving status, max amount of uncertainty removed from contingent
+#           intervals and dictionaries of the Variables for bounds and epsilons
+def minmaxLP(STN, debug=False):
+    return auxiliaryLP(STN, 'minmax', debug)
+
+
+##
+# \fn auxiliaryLP(STN, variant, debug=False)
+# \brief Runs one of the LPs with a delta or z variable on the input STN
+#
+# @return   LP solving status, the delta or z Variable and dictionaries of
+#           the Variables for bounds and epsilons
+def auxiliaryLP(STN, variant, debug=False):
+    bounds, epsilons, lp = setUp(STN)
+    aux, Obj = addObjective(STN, lp, epsilons, variant)
+
+    status = lp.solve(Obj)
+    report(lp.variables, status, debug)
+    if status != 'Optimal':
+        return status, None, None, None
+
+    return status, aux, bounds, epsilons
+
+
+##
+# \class LPSession
+# \brief Keeps the LP of one network alive between solves
+#
+# \details Sweeps over makespans or shrunk contingent intervals solve almost
+#          the same LP many times. A session holds its own copy of the STNU
+#          and a HiGHS model built from it once. The mutators only change edge
+#          weights and remember which edges they touched; solve() rewrites
+#          the right hand sides, column bounds, costs and coefficients that
+#          depend on those edges in place and re-runs the simplex from the
+#          previous basis, which usually takes a handful of iterations.
+#
+#          The model carries the rows of every variant, sharing one auxiliary
+#          column for delta and z, and the rows of the variants not being
+#          solved are left free. Switching variants therefore only changes
+#          bounds and costs, and also starts from the previous basis.
+#
+#          Changing the edges of the STNU themselves (through update) makes
+#          the next solve rebuild the model. Without highspy every solve is a
+#          cold linprog solve, with the same results.
+#
+#          solve() returns the same tuples as originalLP (for the 'original'
+#          and 'naive' variants) or proportionLP, maxminLP and minmaxLP, with
+#          fresh Variables each time.
+class LPSession(object):
+
+    ## \brief LPSession Constructor
+    #  \param STN       An input STNU (copied, the original is not touched)
+    #  \param variant   The variant solve() uses by default, one of VARIANTS
+    def __init__(self, STN, variant='original'):
+        if variant not in VARIANTS:
+            raise ValueError("Unknown LP variant: {}".format(variant))
+
+        ## The session's own copy of the STNU
+        self.STN = STN.copy()
+        boundMakespan(self.STN)
+
+        ## The LP variant being solved
+        self.variant = variant
+
+        ## Simplex iterations used by the last solve (None without highspy)
+        self.iterations = None
+
+        self.highs = None
+
+        # Edges changed since the last solve, None when the model has to be
+        # built from scratch
+        self.dirty = None
+
+    ## \brief Set the makespan of the session's STNU (see STN.setMakespan)
+    def setMakespan(self, makespan):
+        self.STN.setMakespan(makespan)
+        self._touch(key for key in self.STN.edges if 0 in key)
+
+    ##
+    # \brief Change both weights of an existing edge
+    #
+    # @param i      The starting node of the edge
+    # @param j      The ending node of the edge
+    # @param Cij    The new weight of i -> j (upper bound of j - i)
+    # @param Cji    The new weight of j -> i (negated lower bound of j - i)
+    def setEdge(self, i, j, Cij, Cji):
+        if not self.STN.edgeExists(i, j):
+            raise ValueError("No edge between {} and {}".format(i, j))
+        self.STN.modifyEdge(i, j, Cij)
+        self.STN.modifyEdge(j, i, Cji)
+        self._touch([(i, j) if (i, j) in self.STN.edges else (j, i)])
+
+    ## \brief Set the interval [low, high] of the contingent edge (i, j)
+    def setContingent(self, i, j, low, high):
+        if (i, j) not in self.STN.contingentEdges:
+            raise ValueError("({}, {}) is not a contingent edge".format(i, j))
+        self.setEdge(i, j, high, -low)
+
+    ##
+    # \brief Replace the session's STNU, e.g. with one shrunk by relaxSearch
+    #
+    # \details The model is kept when STN has the same events and edges as
+    #          the current one, otherwise it is rebuilt on the next solve.
+    def update(self, STN):
+        STN = STN.copy()
+        boundMakespan(STN)
+        same = list(STN.edges) == list(self.STN.edges) and \
+            list(STN.contingentEdges) == list(self.STN.contingentEdges) and \
+            STN.uncontrollables == self.STN.uncontrollables
+        self.STN = STN
+        if same:
+            self._touch(STN.edges)
+        else:
+            self.dirty = None
+
+    def _touch(self, keys):
+        if self.dirty is not None:
+            self.dirty.update(keys)
+
+    ## \brief Build the model of the current STNU and load it into HiGHS
+    def _build(self):
+        self.bounds, self.epsilons, lp = setUp(self.STN)
+        self.aux = lp.addVariable('aux', 0, None)
+        for (i, j), e in self.STN.contingentEdges.items():
+            c = e.Cij + e.Cji
+            eps = [(1, self.epsilons[(j, '-')]), (1, self.epsilons[(j, '+')])]
+            lp.addEqual(eps + [(-c, self.aux)], 0, key=(i, j, 'proportion'))
+            lp.addLessEqual(eps + [(1, self.aux)], c, key=(i, j, 'maxmin'))
+            lp.addLessEqual(eps + [(-1, self.aux)], 0, key=(i, j, 'minmax'))
+        self.names = [var.name for var in lp.variables]
+
+        n = len(lp.variables)
+        A = sparse.vstack([sparse.csr_matrix(
+            (triplets[2], (triplets[0], triplets[1])), shape=(len(rhs), n))
+            for triplets, rhs in ((lp.ub, lp.b_ub), (lp.eq, lp.b_eq))],
+            format='csr')
+        b_ub = np.array(lp.b_ub, dtype=float)
+        b_ub[b_ub >= MAX_FLOAT] = np.inf
+        b_eq = np.array(lp.b_eq, dtype=float)
+
+        # Row ranges in HiGHS form: <= rows first, then == rows
+        self.rowLower = np.concatenate((np.full(len(b_ub), -np.inf), b_eq))
+        self.rowUpper = np.concatenate((b_ub, b_eq))
+        self.rowOf = {key: row if kind == 'ub' else row + len(b_ub)
+                      for key, (kind, row) in lp.rows.items()}
+
+        self.colLower = np.array([-np.inf if v is None else v
+                                  for v in lp.lower], dtype=float)
+        self.colUpper = np.array([np.inf if v is None else v
+                                  for v in lp.upper], dtype=float)
+        self.cost = np.zeros(n)
+
+        # Matrix entries that depend on edge weights (the coefficients of
+        # delta), in the form {(row, column): value}
+        self.coef = {}
+
+        # Apply the current variant to the freshly built rows
+        self.dirty = set(self.STN.edges)
+        self._update()
+
+        model = highspy.HighsLp()
+        model.num_col_ = n
+        model.num_row_ = A.shape[0]
+        model.col_cost_ = self.cost
+        model.col_lower_ = self.colLower
+        model.col_upper_ = self.colUpper
+        model.row_lower_ = self.rowLower
+        model.row_upper_ = self.rowUpper
+        model.a_matrix_.format_ = highspy.MatrixFormat.kRowwise
+        model.a_matrix_.start_ = A.indptr
+        model.a_matrix_.index_ = A.indices
+        model.a_matrix_.value_ = A.data
+
+        self.highs = highspy.Highs()
+        self.highs.setOptionValue('output_flag', False)
+        self.highs.passModel(model)
+
+    ##
+    # \brief The row ranges of a contingent edge under the current variant
+    #
+    # @return A dictionary {row: (lower, upper)}
+    def _contingentRows(self, i, j, e):
+        c = e.Cij + e.Cji
+        active = {'proportion': (0, 0), 'maxmin': (-np.inf, c),
+                  'minmax': (-np.inf, 0)}
+        rows = {self.rowOf[(i, j, '+')]: (e.Cij, e.Cij),
+                self.rowOf[(i, j, '-')]: (-e.Cji, -e.Cji)}
+        for name, bound in active.items():
+            free = name != self.variant
+            rows[self.rowOf[(i, j, name)]] = (-np.inf, np.inf) if free \
+                else bound
+        return rows
+
+    ## \brief The objective of the current variant as a dense cost vector
+    def _costs(self):
+        cost = np.zeros(len(self.names))
+        if self.variant in ('original', 'naive'):
+            for i, j in self.STN.contingentEdges:
+                e = self.STN.edges[(i, j)]
+                w = 1 if self.variant == 'naive' else 1 / (e.Cij + e.Cji)
+                for key in ((j, '+'), (j, '-')):
+                    cost[self.epsilons[key].index] = w
+        else:
+            cost[self.aux.index] = -1 if self.variant == 'maxmin' else 1
+        return cost
+
+    ##
+    # \brief Recompute the entries that depend on the changed edges and on
+    #        the variant
+    #
+    # @return Arrays of the rows and columns whose bounds changed, of the
+    #         columns whose cost changed, and a list of changed (row,
+    #         column, value) coefficients
+    def _update(self):
+        STN = self.STN
+        rows, cols, coefs = {}, {}, {}
+        verts = set()
+        for i, j in self.dirty:
+            e = STN.edges[(i, j)]
+            if (i, j) in STN.contingentEdges:
+                rows.update(self._contingentRows(i, j, e))
+                key = (self.rowOf[(i, j, 'proportion')], self.aux.index)
+                coefs[key] = -(e.Cij + e.Cji)
+            else:
+                for key, w in (((i, j, '+'), e.Cij), ((i, j, '-'), e.Cji)):
+                    rows[self.rowOf[key]] = \
+                        (-np.inf, np.inf if w >= MAX_FLOAT else w)
+            verts.update((i, j))
+        self.dirty = set()
+
+        for i in verts:
+            low, high = vertexBound(STN, i)
+            high = np.inf if high is None else high
+            hi, lo = self.bounds[(i, '+')].index, self.bounds[(i, '-')].index
+            cols[hi] = (0, high)
+            cols[lo] = (0, 0) if i == 0 else (low, np.inf)
+        cols[self.aux.index] = {'proportion': (0, 1), 'maxmin': (0, np.inf),
+                                'minmax': (0, np.inf)}.get(self.variant,
+                                                           (0, 0))
+
+        changedRows = [r for r, bound in rows.items()
+                       if (self.rowLower[r], self.rowUpper[r]) != bound]
+        for r in changedRows:
+            self.rowLower[r], self.rowUpper[r] = rows[r]
+
+        changedCols = [k for k, bound in cols.items()
+                       if (self.colLower[k], self.colUpper[k]) != bound]
+        for k in changedCols:
+            self.colLower[k], self.colUpper[k] = cols[k]
+
+        cost = self._costs()
+        changedCost = np.flatnonzero(cost != self.cost)
+        self.cost = cost
+
+        changedCoefs = []
+        for key, value in coefs.items():
+            if self.coef.get(key) != value:
+                self.coef[key] = value
+                changedCoefs.append(key + (value,))
+
+        return (np.array(changedRows, dtype=int),
+                np.array(changedCols, dtype=int), changedCost, changedCoefs)
+
+    ## \brief Push the entries that depend on the changed edges to HiGHS
+    def _refresh(self):
+        rows, cols, cost, coefs = self._update()
+        if len(rows):
+            self.highs.changeRowsBounds(len(rows), rows, self.rowLower[rows],
+                                        self.rowUpper[rows])
+        if len(cols):
+            self.highs.changeColsBounds(len(cols), cols, self.colLower[cols],
+                                        self.colUpper[cols])
+        if len(cost):
+            self.highs.changeColsCost(len(cost), cost, self.cost[cost])
+        for row, col, value in coefs:
+            self.highs.changeCoeff(row, col, value)
+
+    ##
+    # \brief Solve the LP of the current STNU
+    #
+    # @param variant        One of VARIANTS, or None for the session's
+    #                       current variant. The choice sticks for later
+    #                       solves.
+    # @param debug          Print optional status messages
+    #
+    # @return   The same tuple as originalLP, or as proportionLP, maxminLP and
+    #           minmaxLP for the variants with a delta or z variable
+    def solve(self, variant=None, debug=False):
+        if variant is not None and variant != self.variant:
+            if variant not in VARIANTS:
+                raise ValueError("Unknown LP variant: {}".format(variant))
+            self.variant = variant
+            self._touch(self.STN.contingentEdges)
+
+        if highspy is None:
+            bounds, epsilons, lp = setUp(self.STN)
+            aux, objective = addObjective(self.STN, lp, epsilons,
+                                          self.variant)
+            status = lp.solve(objective)
+            variables = lp.variables
+        else:
+            if self.dirty is None:
+                self._build()
+            else:
+                self._refresh()
+
+            self.highs.run()
+            status = HIGHS_STATUS.get(self.highs.modelStatusToString(
+                self.highs.getModelStatus()), 'Undefined')
+            self.iterations = self.highs.getInfo().simplex_iteration_count
+
+            variables = [Variable(name, k) for k, name in enumerate(self.names)]
+            aux = variables[self.aux.index]
+            aux.name = 'delta' if self.variant == 'proportion' else 'z'
+            if status == 'Optimal':
+                values = self.highs.getSolution().col_value
+                for var, value in zip(variables, values):
+                    var.varValue = float(value)
+            bounds = {key: variables[var.index]
+                      for key, var in self.bounds.items()}
+            epsilons = {key: variables[var.index]
+                        for key, var in self.epsilons.items()}
+
+        report(variables, status, debug)
+        if self.variant in ('original', 'naive'):
+            if status != 'Optimal':
+                return status, None, None
+            return status, bounds, epsilons
+
+        if status != 'Optimal':
+            return status, None, None, None
+        return status, aux, bounds, epsilons
+
+
+##
+# \fn solveVariants(STN, variants=VARIANTS, debug=False)
+# \brief Solve several LP variants on one shared model
+#
+# \details The bound variables and edge rows are built once in an LPSession,
+#          and each variant after the first starts from the basis the
+#          previous one ended with.
+#
+# @param STN            An input STNU (not modified)
+# @param variants       The variants to solve, a sequence drawn from VARIANTS
+# @param debug          Print optional status messages
+#
+# @return   A dictionary {variant: the tuple its LP function returns}
+def solveVariants(STN, variants=VARIANTS, debug=False):
+    session = LPSession(STN, variants[0]) if variants else None
+    return {variant: session.solve(variant, debug) for variant in variants}
@@ -2,7 +2,24 @@
 
 # This is a package for all stn classes
 
-from .stn import Vertex, Edge, STN
+from .stn import Vertex, Edge, STN, OrderedSet
 from .stnjsontools import (loadSTNfromJSON,
                           loadSTNfromJSONfile,
                           loadSTNfromJSONobj)
+from .dataset import Dataset
+
+# stnpack needs numpy, so it is only imported when one of its names is used
+_STNPACK = ('PackedSTNs',
+            'packNetworks',
+            'packJSONobjs',
+            'packJSONfiles',
+            'packSTNs',
+            'loadSTNsfromPacked')
+
+
+def __getattr__(name):
+    if name in _STNPACK:
+        from . import stnpack
+        return getattr(stnpack, name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__,
+                                                                   name))
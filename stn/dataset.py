@@ -0,0 +1,257 @@
+##
+# \file dataset.py
+#
+# \brief A lazily loaded collection of STN json files with a persistent cache
+#        of parsed networks.
+#
+# \details Parsed networks are pickled into a cache folder under the sha1 of
+#          their json content. An index maps every json file to its mtime,
+#          size and content hash, so an unchanged file is loaded straight from
+#          its pickle without being read again, and a modified file is parsed
+#          again (or found under its new content hash).
+
+import glob
+import hashlib
+import json
+import os
+import pickle
+
+from .stnjsontools import loadSTNfromJSON
+
+
+## The name of the cache folder created next to the json files
+CACHE_NAME = '.stncache'
+
+## The version of the pickled STN layout, bumped whenever the attributes of
+#  STN objects change so that stale pickles are not loaded
+CACHE_VERSION = 5
+
+
+##
+# \fn loadCached(path, cacheDir, entry=None, using_PSTN=False)
+# \brief Load one json file, going through the cache
+#
+# @param path           The path of the json file
+# @param cacheDir       The cache folder, or None to always parse
+# @param entry          The index entry of the file {'mtime', 'size', 'hash'}
+# @param using_PSTN     Flag indicating whether the input STN is a PSTN
+#
+# @return The STN object and the up to date index entry of the file
+def loadCached(path, cacheDir, entry=None, using_PSTN=False):
+    stat = os.stat(path)
+    suffix = '%s.v%d.pickle' % ('-pstn' if using_PSTN else '', CACHE_VERSION)
+
+    if cacheDir is not None and entry is not None and \
+            entry['mtime'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+        try:
+            with open(os.path.join(cacheDir, entry['hash'] + suffix), 'rb') as f:
+                return pickle.load(f), entry
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+
+    with open(path, 'rb') as f:
+        content = f.read()
+    digest = hashlib.sha1(content).hexdigest()
+    entry = {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'hash': digest}
+
+    if cacheDir is None:
+        return loadSTNfromJSON(content.decode(), using_PSTN=using_PSTN), entry
+
+    fname = os.path.join(cacheDir, digest + suffix)
+    if os.path.exists(fname):
+        try:
+            with open(fname, 'rb') as f:
+                return pickle.load(f), entry
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+
+    STN = loadSTNfromJSON(content.decode(), using_PSTN=using_PSTN)
+    tmp = '%s.%d.tmp' % (fname, os.getpid())
+    with open(tmp, 'wb') as f:
+        pickle.dump(STN, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, fname)
+    return STN, entry
+
+
+##
+# \class Dataset
+# \brief The STN json files of one or more folders (or an explicit list of
+#        files), loaded when they are iterated over
+#
+# \details Iterating yields (filename, STN) pairs in path order. With
+#          `workers`, files are loaded ahead in a thread or process pool, at
+#          most `prefetch` files ahead of the consumer. Each network is a
+#          fresh object, so callers are free to modify it.
+class Dataset(object):
+
+    ##
+    # \brief Dataset Constructor
+    #
+    # @param sources        A folder, a json file, or a list of them
+    # @param pattern        The glob pattern of json files within folders
+    # @param cache          Flag indicating whether to use the cache
+    # @param cacheDir       The cache folder, defaults to CACHE_NAME in the
+    #                       folder of the first source
+    # @param workers        Number of workers to load files with (None loads
+    #                       them in the calling thread)
+    # @param processes      Flag indicating whether workers are processes
+    #                       rather than threads
+    # @param prefetch       Number of files loaded ahead when using workers
+    # @param using_PSTN     Flag indicating whether the input STNs are PSTNs
+    def __init__(self, sources, pattern='*.json', cache=True, cacheDir=None,
+                 workers=None, processes=True, prefetch=None,
+                 using_PSTN=False):
+        if isinstance(sources, str):
+            sources = [sources]
+
+        ## The paths of the json files of the dataset
+        self.paths = []
+        for source in sources:
+            if os.path.isdir(source):
+                self.paths += sorted(glob.glob(os.path.join(source, pattern)))
+            else:
+                self.paths.append(source)
+
+        self.workers = workers
+        self.processes = processes
+        self.prefetch = prefetch if prefetch is not None else \
+                        2 * (workers or 1)
+        self.using_PSTN = using_PSTN
+
+        self.cacheDir = None
+        self.index = {}
+        self._dirty = False
+        if cache and sources:
+            if cacheDir is None:
+                first = sources[0]
+                folder = first if os.path.isdir(first) else \
+                                    os.path.dirname(first)
+                cacheDir = os.path.join(folder, CACHE_NAME)
+            os.makedirs(cacheDir, exist_ok=True)
+            self.cacheDir = cacheDir
+            self.index = self._readIndex()
+
+    ## \brief The number of json files
+    def __len__(self):
+        return len(self.paths)
+
+    ## \brief Iterate over (filename, STN) pairs
+    def __iter__(self):
+        return self.items()
+
+    ## \brief The filenames (without folders) of the json files
+    def names(self):
+        return [os.path.basename(p) for p in self.paths]
+
+    ##
+    # \brief Load one network
+    #
+    # @param key        The position, path or filename of the json file
+    #
+    # @return The STN object
+    def load(self, key):
+        if isinstance(key, int):
+            path = self.paths[key]
+        elif key in self.paths:
+            path = key
+        else:
+            path = self.paths[self.names().index(key)]
+
+        STN, entry = loadCached(path, self.cacheDir,
+                                self.index.get(self._key(path)),
+                                self.using_PSTN)
+        self._remember(path, entry)
+        self._flush()
+        return STN
+
+    ## \brief Same as load
+    def __getitem__(self, key):
+        return self.load(key)
+
+    ##
+    # \brief Iterate over the networks
+    #
+    # @return A generator of (filename, STN) pairs
+    def items(self):
+        try:
+            yield from self._items()
+        finally:
+            self._flush()
+
+    ## \brief Iterate over the networks without saving the index
+    def _items(self):
+        if not self.workers:
+            for path in self.paths:
+                STN, entry = loadCached(path, self.cacheDir,
+                                        self.index.get(self._key(path)),
+                                        self.using_PSTN)
+                self._remember(path, entry)
+                yield os.path.basename(path), STN
+            return
+
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+        pool = ProcessPoolExecutor if self.processes else ThreadPoolExecutor
+        with pool(self.workers) as executor:
+            pending = []
+            paths = iter(self.paths)
+            for path in paths:
+                pending.append((path, self._submit(executor, path)))
+                if len(pending) >= self.prefetch:
+                    break
+
+            while pending:
+                path, future = pending.pop(0)
+                for following in paths:
+                    pending.append((following,
+                                    self._submit(executor, following)))
+                    break
+
+                STN, entry = future.result()
+                self._remember(path, entry)
+                yield os.path.basename(path), STN
+
+    ##
+    # \brief Load every network
+    #
+    # @return A dictionary of STN objects keyed by filename
+    def loadAll(self):
+        return dict(self.items())
+
+    ## \brief Submit the loading of a file to an executor
+    def _submit(self, executor, path):
+        return executor.submit(loadCached, path, self.cacheDir,
+                               self.index.get(self._key(path)),
+                               self.using_PSTN)
+
+    ## \brief The index key of a file
+    def _key(self, path):
+        return os.path.abspath(path)
+
+    ## \brief Record a (possibly new) index entry
+    def _remember(self, path, entry):
+        if self.cacheDir is None or self.index.get(self._key(path)) == entry:
+            return
+        self.index[self._key(path)] = entry
+        self._dirty = True
+
+    ## \brief Save the index if it changed
+    def _flush(self):
+        if self._dirty:
+            self._writeIndex()
+            self._dirty = False
+
+    ## \brief Read the index of the cache folder
+    def _readIndex(self):
+        try:
+            with open(os.path.join(self.cacheDir, 'index.json'), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    ## \brief Write the index of the cache folder atomically
+    def _writeIndex(self):
+        fname = os.path.join(self.cacheDir, 'index.json')
+        tmp = '%s.%d.tmp' % (fname, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp, fname)
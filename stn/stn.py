@@ -1,3 +1,4 @@
+import hashlib
 import math
 import json
 
@@ -117,6 +118,54 @@ class Edge(object):
             self.i, self.j, -self.Cji, self.Cij) + "type: " + self.type
 
 
+## \class OrderedSet
+#  \brief An insertion-ordered set of node IDs
+#
+#  \details Membership tests, insertions and removals are O(1), and iterating
+#           gives the nodes in the order they were added, like the list this
+#           replaces.
+class OrderedSet(object):
+
+    ## \brief OrderedSet Constructor
+    #  \param items        The initial node IDs
+    def __init__(self, items=()):
+        self.items = dict.fromkeys(items)
+
+    ## \brief Add a node ID (no effect if it is already there)
+    def add(self, item):
+        self.items[item] = None
+
+    ## \brief Remove a node ID, raises KeyError if it is not there
+    def remove(self, item):
+        del self.items[item]
+
+    ## \brief Remove a node ID if it is there
+    def discard(self, item):
+        self.items.pop(item, None)
+
+    ## \brief Return a copy of the set
+    def copy(self):
+        return OrderedSet(self.items)
+
+    def __contains__(self, item):
+        return item in self.items
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    ## \brief Sets with the same nodes in the same order are equal
+    def __eq__(self, other):
+        if not isinstance(other, OrderedSet):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self.items))
+
+
 ##
 # \class STN
 # \brief A representation of an entire STN.
@@ -134,14 +183,18 @@ class STN(object):
         # {(Node1, Node2): Edge_Object}
         self.edges = {}
 
-        ## a list of uncontrollable events (NodeIDs of vertices with incoming
-        # contingencies)
-        self.uncontrollables = []
+        ## An ordered set of uncontrollable events (NodeIDs of vertices with
+        # incoming contingencies)
+        self.uncontrollables = OrderedSet()
 
         ## A reverse lookup dictionary of Nodes in contingent edges in the form
         # {NodeID_End: NodeID_Start}
         self.parent = {}
 
+        ## A lookup dictionary of Nodes in contingent edges in the form
+        # {NodeID_Start: OrderedSet of NodeID_End}
+        self.children = {}
+
         ## A dictionary of contingent edges in the form
         # {(Node1, Node2): Edge_Object}
         self.contingentEdges = {}
@@ -154,6 +207,9 @@ class STN(object):
         #  milliseconds)
         self.makespan = None
 
+        ## The cached fingerprint of the STN, None when it must be recomputed
+        self._fingerprint = None
+
     # -------------------------------------------------------------------------
     # Basic functions #
     # -------------------------------------------------------------------------
@@ -220,6 +276,7 @@ class STN(object):
     def addVertex(self, nodeID):
         assert nodeID not in self.verts
         self.verts[nodeID] = Vertex(nodeID)
+        self._fingerprint = None
 
     ##
     # \brief Takes in a vertex object and adds it to the STN
@@ -231,6 +288,7 @@ class STN(object):
         nodeID = vertex.nodeID
         assert nodeID not in self.verts
         self.verts[nodeID] = vertex
+        self._fingerprint = None
 
     ##
     # \brief Takes in the parameters of an edge and adds the edge to the STN
@@ -255,10 +313,10 @@ class STN(object):
         else:
             assert j not in self.uncontrollables
             self.contingentEdges[(i, j)] = newEdge
-            self.uncontrollables += [j]
-            self.parent[j] = i
+            self._addContingent(i, j)
 
         self.edges[(i, j)] = newEdge
+        self._fingerprint = None
 
     ##
     # \brief Takes in a Edge object and adds it to the STN.
@@ -279,10 +337,107 @@ class STN(object):
         else:
             assert j not in self.uncontrollables
             self.contingentEdges[(i, j)] = edge
-            self.uncontrollables += [j]
-            self.parent[j] = i
+            self._addContingent(i, j)
 
         self.edges[(i, j)] = edge
+        self._fingerprint = None
+
+    ##
+    # \brief Adds many vertices and edges at once
+    #
+    # \details Equivalent to calling addVertex for every node and then addEdge
+    #          for every edge, but the checks those functions make one at a
+    #          time (no duplicate vertices, known end points, no duplicate
+    #          edges in either direction, at most one incoming contingent edge
+    #          per event) are made once with set operations over the whole
+    #          input, and the edges are then put in the dictionaries directly.
+    #
+    # @param nodeIDs    The IDs of the new vertices
+    # @param edges      A list of (i, j, Tmin, Tmax, type, distribution) tuples
+    #                   as taken by addEdge
+    #
+    # @post The vertices and edges are added to the STN. If the input is
+    #       invalid, a ValueError is raised and the STN is left unchanged.
+    def addBulk(self, nodeIDs, edges):
+        nodes = set(self.verts)
+        nodes.update(nodeIDs)
+        if len(nodes) != len(self.verts) + len(nodeIDs):
+            raise ValueError("Duplicate vertices")
+
+        if edges:
+            first, second, _, _, types, _ = zip(*edges)
+
+            ends = set(first)
+            ends.update(second)
+            if not ends <= nodes:
+                raise ValueError("Edges between unknown vertices")
+
+            # Edges are unordered pairs, whatever their direction
+            pairs = set(zip(map(min, first, second), map(max, first, second)))
+            pairs.update(zip(map(min, self.edges), map(max, self.edges)))
+            if len(pairs) != len(edges) + len(self.edges):
+                raise ValueError("Duplicate edges")
+
+            targets = set(self.uncontrollables)
+            targets.update(j for j, t in zip(second, types) if t != 'stc')
+            if len(targets) != len(self.uncontrollables) + \
+                    len(types) - types.count('stc'):
+                raise ValueError("Events with several incoming contingent "
+                                 "edges")
+
+        self.verts.update((nodeID, Vertex(nodeID)) for nodeID in nodeIDs)
+
+        newEdges = {(e[0], e[1]): Edge(*e) for e in edges}
+        self.edges.update(newEdges)
+        for key, edge in newEdges.items():
+            if edge.type == 'stc':
+                self.requirementEdges[key] = edge
+            else:
+                self.contingentEdges[key] = edge
+                self._addContingent(edge.i, edge.j)
+        self._fingerprint = None
+
+    ## \brief Record that j is an uncontrollable event with parent i
+    def _addContingent(self, i, j):
+        self.uncontrollables.add(j)
+        self.parent[j] = i
+        self.children.setdefault(i, OrderedSet()).add(j)
+
+    ## \brief Forget the contingent edge (i, j) in the lookup structures
+    def _removeContingent(self, i, j):
+        self.uncontrollables.discard(j)
+        del self.parent[j]
+        self.children[i].remove(j)
+        if not self.children[i]:
+            del self.children[i]
+
+    ##
+    # \brief A hash of the content of the STN
+    #
+    # \details The sha1 of the sorted vertices, the sorted edges with their
+    #          bounds, types and distributions, and the makespan. Two STNs
+    #          with the same fingerprint are the same network, whatever the
+    #          order their vertices and edges were added in, so the
+    #          fingerprint can key results computed on a network (see
+    #          memo.py). It is computed once and kept until a method of the
+    #          STN changes the network; an Edge object modified directly
+    #          must be followed by a call to touch().
+    #
+    # @return A hexadecimal string
+    def fingerprint(self):
+        if self._fingerprint is None:
+            content = (sorted(self.verts),
+                       sorted((i, j, float(e.Cij), float(e.Cji), e.type,
+                               str(e.distribution))
+                              for (i, j), e in self.edges.items()),
+                       self.makespan)
+            self._fingerprint = hashlib.sha1(
+                repr(content).encode()).hexdigest()
+        return self._fingerprint
+
+    ## \brief Forget the fingerprint after the network was changed directly
+    def touch(self):
+        self._fingerprint = None
 
     # -------------------------------------------------------------------------
     # Vertex functions #
@@ -340,9 +495,7 @@ class STN(object):
     def removeVertex(self, nodeID):
         if nodeID in self.verts:
             del self.verts[nodeID]
-
-            if nodeID in self.uncontrollables:
-                self.uncontrollables.remove(nodeID)
+            self._fingerprint = None
 
             toRemove = []
             for i, j in self.edges:
@@ -353,7 +506,7 @@ class STN(object):
                 del self.edges[(i, j)]
 
                 if (i, j) in self.contingentEdges:
-                    self.uncontrollables.remove(j)
+                    self._removeContingent(i, j)
                     del self.contingentEdges[(i, j)]
 
                 if (i, j) in self.requirementEdges:
@@ -461,6 +614,7 @@ class STN(object):
         if e.i == i and e.j == j:
             if w < e.Cij:
                 e.Cij = w
+                self._fingerprint = None
                 return True
             else:
                 if equality:
@@ -470,6 +624,7 @@ class STN(object):
         else:
             if w < e.Cji:
                 e.Cji = w
+                self._fingerprint = None
                 return True
             else:
                 if equality:
@@ -498,6 +653,7 @@ class STN(object):
             else:
                 e.Cji = w
 
+            self._fingerprint = None
             return True
 
     ##
@@ -533,14 +689,7 @@ class STN(object):
     #         uncontrollable vertex
     def getIncomingContingent(self, nodeID):
         assert nodeID in self.uncontrollables
-        ctg = [self.contingentEdges[(i,j)] for (i,j) in self.contingentEdges \
-                                                            if j == nodeID]
-
-        if len(ctg) != 1:
-            print('E: {} incoming contingent edges!\n{}'.format(len(ctg), ctg))
-            raise AssertionError
-
-        return ctg[0]
+        return self.contingentEdges[(self.parent[nodeID], nodeID)]
 
     ##
     # \brief Remove an input egde from the STN
@@ -557,10 +706,11 @@ class STN(object):
 
         to_remove = (i, j) if (i, j) in self.edges else (j, i)
         del self.edges[to_remove]
+        self._fingerprint = None
 
         if to_remove in self.contingentEdges:
             del self.contingentEdges[to_remove]
-            self.uncontrollables.remove(to_remove[1])
+            self._removeContingent(*to_remove)
 
         else:
             del self.requirementEdges[to_remove]
@@ -599,6 +749,7 @@ class STN(object):
     # @post STN with makespan set to the input value
     def setMakespan(self, makespan):
         self.makespan = makespan
+        self._fingerprint = None
 
         if 0 not in self.verts:
             self.addVertex(self.Z_TIMEPOINT)
@@ -6,6 +6,7 @@
 
 import json
 from stn import STN
+from tracing import traced, fileArgs
 
 
 ##
@@ -16,6 +17,7 @@ from stn import STN
 # @param using_PSTN     Flag indicating whether the input STN is a PSTN
 #
 # @return Returns a STN object loaded from the json object
+@traced(args=fileArgs)
 def loadSTNfromJSONfile(filepath, using_PSTN=False):
     with open(filepath, 'r') as f:
         stn = loadSTNfromJSON(f.read(), using_PSTN=using_PSTN)
@@ -48,22 +50,19 @@ def loadSTNfromJSON(json_str, using_PSTN=False):
 def loadSTNfromJSONobj(jsonSTN, using_PSTN=False):
     stn = STN()
 
-    # Add the root vertex and put it in the T_x set
-    stn.addVertex(0)
+    # The root vertex, then the vertices of the file
+    nodeIDs = [0] + [v['node_id'] for v in jsonSTN['nodes']]
 
-    # Add the vertices
-    for v in jsonSTN['nodes']:
-        stn.addVertex(v['node_id'])
-
-    # Add the edges
+    edges = []
     for e in jsonSTN['constraints']:
         if using_PSTN and 'distribution' in e:
-            stn.addEdge(e['first_node'], e['second_node'],
-                        float(e['min_duration']), float(e['max_duration']),
-                        e['type'], e['distribution']['name'])
+            distribution = e['distribution']['name']
         else:
-            stn.addEdge(e['first_node'], e['second_node'],
-                        float(e['min_duration']), float(e['max_duration']),
-                        e['type'])
+            distribution = None
+        edges.append((e['first_node'], e['second_node'],
+                      float(e['min_duration']), float(e['max_duration']),
+                      e['type'], distribution))
 
+    # Checked once for the whole network rather than once per edge
+    stn.addBulk(nodeIDs, edges)
     return stn
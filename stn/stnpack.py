@@ -0,0 +1,344 @@
+##
+# \file stnpack.py
+#
+# \brief Packs a collection of STNs into one binary file that can be memory
+#        mapped with NumPy, and converts it back to STNs and JSON.
+#
+# \details The file starts with the magic string, the length of a JSON header
+#          (little endian uint64) and the header itself. The header lists the
+#          network names, the distribution names and, for every array, its
+#          dtype, length and byte offset. The arrays follow, each aligned to
+#          ALIGN bytes:
+#
+#          - node_ptr, edge_ptr: per-network offsets (length N+1) into the
+#            node and edge arrays, CSR style
+#          - nodes:              the node ids of every network, in JSON order
+#                                (the zero timepoint is implicit, as in JSON)
+#          - first, second:      the end points of every edge
+#          - low, high:          min_duration and max_duration of every edge
+#          - type:               TYPES.index(edge type)
+#          - distribution:       index into the distribution names, or -1
+
+import json
+import os
+import numpy as np
+
+from .stn import STN
+
+
+## Identifies packed STN files
+MAGIC = b'STNPACK1'
+
+## Byte alignment of every array in the file
+ALIGN = 64
+
+## The edge types, in the order of their codes
+TYPES = ('stc', 'stcu', 'pstc')
+
+## The arrays of a packed file and their dtypes
+FIELDS = (('node_ptr', '<i8'), ('edge_ptr', '<i8'), ('nodes', '<i8'),
+          ('first', '<i8'), ('second', '<i8'), ('low', '<f8'),
+          ('high', '<f8'), ('type', '<u1'), ('distribution', '<i4'))
+
+
+##
+# \fn packNetworks(networks, path, names=None, distributions=())
+# \brief Write networks given as arrays to a packed file
+#
+# @param networks       A list of dictionaries of arrays in the layout
+#                       returned by PackedSTNs.network: 'nodes', 'first',
+#                       'second', 'low', 'high', 'type' and, optionally,
+#                       'distribution'
+# @param path           The filename of the packed file
+# @param names          The names of the networks, defaults to their indices
+# @param distributions  The distribution names the 'distribution' arrays
+#                       index into
+#
+# @post A packed file holding all of the networks
+def packNetworks(networks, path, names=None, distributions=()):
+    if names is None:
+        names = [str(k) for k in range(len(networks))]
+    assert len(names) == len(networks)
+
+    def concat(name, dtype, default=None):
+        parts = []
+        for net in networks:
+            if name in net:
+                parts.append(np.asarray(net[name], dtype=dtype))
+            else:
+                parts.append(np.full(len(net['first']), default, dtype=dtype))
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)
+
+    values = {name: concat(name, dtype, -1) for name, dtype in FIELDS[2:]}
+    values['node_ptr'] = np.cumsum([0] + [len(net['nodes'])
+                                          for net in networks])
+    values['edge_ptr'] = np.cumsum([0] + [len(net['first'])
+                                          for net in networks])
+    arrays = [(name, np.asarray(values[name], dtype=dtype))
+              for name, dtype in FIELDS]
+
+    # The header holds the offsets of the arrays, which depend on the length
+    # of the header, so grow the reserved space until it fits
+    reserved = ALIGN
+    while True:
+        start = _align(len(MAGIC) + 8 + reserved)
+        layout = {}
+        offset = start
+        for name, a in arrays:
+            layout[name] = [a.dtype.str, len(a), offset]
+            offset = _align(offset + a.nbytes)
+        header = json.dumps({'version': 1, 'names': list(names),
+                             'distributions': list(distributions),
+                             'arrays': layout}).encode()
+        if len(header) <= reserved:
+            break
+        reserved = _align(len(header))
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.uint64(reserved).astype('<u8').tobytes())
+        f.write(header.ljust(reserved))
+        for name, a in arrays:
+            f.write(b'\0' * (layout[name][2] - f.tell()))
+            f.write(a.tobytes())
+
+
+##
+# \fn packJSONobjs(jsonSTNs, path, names=None)
+# \brief Write JSON representations of STNs to a packed file
+#
+# @param jsonSTNs       A list of json objects in the layout read by
+#                       loadSTNfromJSONobj (and written by STN.forJSON)
+# @param path           The filename of the packed file
+# @param names          The names of the networks, defaults to their indices
+#
+# @post A packed file holding all of the networks
+def packJSONobjs(jsonSTNs, path, names=None):
+    distributions = []
+    distIndex = {}
+    networks = []
+
+    for jsonSTN in jsonSTNs:
+        net = {'nodes': [v['node_id'] for v in jsonSTN['nodes']],
+               'first': [], 'second': [], 'low': [], 'high': [], 'type': [],
+               'distribution': []}
+
+        for e in jsonSTN['constraints']:
+            net['first'].append(e['first_node'])
+            net['second'].append(e['second_node'])
+            net['low'].append(float(e['min_duration']))
+            net['high'].append(float(e['max_duration']))
+            net['type'].append(TYPES.index(e['type']))
+
+            if 'distribution' in e:
+                name = e['distribution']['name']
+                if name not in distIndex:
+                    distIndex[name] = len(distributions)
+                    distributions.append(name)
+                net['distribution'].append(distIndex[name])
+            else:
+                net['distribution'].append(-1)
+        networks.append(net)
+
+    packNetworks(networks, path, names, distributions)
+
+
+##
+# \fn packSTNs(STNs, path, names=None)
+# \brief Write STN objects to a packed file
+#
+# @param STNs           A list of STN objects
+# @param path           The filename of the packed file
+# @param names          The names of the networks, defaults to their indices
+#
+# @post A packed file holding all of the networks
+def packSTNs(STNs, path, names=None):
+    packJSONobjs([STN.forJSON() for STN in STNs], path, names)
+
+
+##
+# \fn packJSONfiles(paths, path)
+# \brief Pack a list of STN json files, e.g. a dataset directory
+#
+# @param paths          Paths of the json files to pack
+# @param path           The filename of the packed file
+#
+# @post A packed file holding all of the networks, named after the json
+#       files (without the .json extension)
+def packJSONfiles(paths, path):
+    jsonSTNs = []
+    names = []
+    for p in paths:
+        with open(p, 'r') as f:
+            jsonSTNs.append(json.load(f))
+        names.append(os.path.splitext(os.path.basename(p))[0])
+    packJSONobjs(jsonSTNs, path, names)
+
+
+## \brief Round an offset up to the next multiple of ALIGN
+def _align(offset):
+    return -(-offset // ALIGN) * ALIGN
+
+
+##
+# \class PackedSTNs
+# \brief A read-only, memory-mapped view of a packed file
+#
+# \details Opening the file only maps it; networks are turned into STN
+#          objects when they are indexed. Networks can be indexed by position
+#          or by name.
+class PackedSTNs(object):
+
+    ## \brief PackedSTNs Constructor
+    #  \param path          The filename of the packed file
+    #  \param using_PSTN    Flag indicating whether distributions should be put
+    #                       on the edges (see loadSTNfromJSONobj)
+    def __init__(self, path, using_PSTN=False):
+        self.path = path
+        self.using_PSTN = using_PSTN
+
+        with open(path, 'rb') as f:
+            magic = f.read(len(MAGIC))
+            if magic != MAGIC:
+                raise ValueError("%s is not a packed STN file" % path)
+            length = int(np.frombuffer(f.read(8), dtype='<u8')[0])
+            header = json.loads(f.read(length).decode())
+
+        ## The names of the networks, in order
+        self.names = header['names']
+
+        ## The names of the edge distributions
+        self.distributions = header['distributions']
+
+        self._index = {name: k for k, name in enumerate(self.names)}
+        self._data = np.memmap(path, dtype=np.uint8, mode='r')
+
+        ## The arrays of the file (see the file documentation), as read-only
+        #  views of the mapping
+        self.arrays = {}
+        for name, (dtype, size, offset) in header['arrays'].items():
+            dtype = np.dtype(dtype)
+            self.arrays[name] = self._data[offset:offset + size *
+                                           dtype.itemsize].view(dtype)
+
+    ## \brief The number of networks in the file
+    def __len__(self):
+        return len(self.names)
+
+    ## \brief Get the STN at a position or with a name
+    def __getitem__(self, key):
+        return self.getSTN(key)
+
+    ## \brief Iterate over the STNs of the file
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self.getSTN(k)
+
+    ## \brief The position of a network, given its position or name
+    def position(self, key):
+        if isinstance(key, str):
+            return self._index[key]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("network index out of range")
+        return key
+
+    ##
+    # \brief Get the arrays of one network
+    #
+    # @param key        The position or name of the network
+    #
+    # @return A dictionary with the node ids under 'nodes' and the slices of
+    #         the edge arrays under their names
+    def network(self, key):
+        k = self.position(key)
+        a = self.arrays
+        nodes = a['nodes'][a['node_ptr'][k]:a['node_ptr'][k + 1]]
+        start, end = a['edge_ptr'][k], a['edge_ptr'][k + 1]
+        result = {'nodes': nodes}
+        for name in ('first', 'second', 'low', 'high', 'type', 'distribution'):
+            result[name] = a[name][start:end]
+        return result
+
+    ##
+    # \brief Get the JSON representation of one network
+    #
+    # @param key        The position or name of the network
+    #
+    # @return A json object in the layout of the dataset files
+    def getJSONobj(self, key):
+        net = self.network(key)
+        jsonSTN = {'nodes': [{'node_id': v} for v in net['nodes'].tolist()]}
+        constraints = []
+        for i, j, low, high, t, d in zip(net['first'].tolist(),
+                                         net['second'].tolist(),
+                                         net['low'].tolist(),
+                                         net['high'].tolist(),
+                                         net['type'].tolist(),
+                                         net['distribution'].tolist()):
+            # Infinite bounds are written as strings, like Edge.forJSON
+            c = {'first_node': i, 'second_node': j, 'type': TYPES[t],
+                 'min_duration': '-inf' if low == -float('inf') else low,
+                 'max_duration': 'inf' if high == float('inf') else high}
+            if d >= 0:
+                c['distribution'] = {'name': self.distributions[d],
+                                     'type': 'Empirical'}
+            constraints.append(c)
+        jsonSTN['constraints'] = constraints
+        return jsonSTN
+
+    ##
+    # \brief Get one network as an STN object
+    #
+    # @param key        The position or name of the network
+    #
+    # @return The STN object, the same as loadSTNfromJSONfile would give for
+    #         the json file it was packed from
+    def getSTN(self, key):
+        net = self.network(key)
+        distributions = [self.distributions[d] if self.using_PSTN and d >= 0
+                         else None for d in net['distribution'].tolist()]
+        types = [TYPES[t] for t in net['type'].tolist()]
+
+        stn = STN()
+        stn.addBulk([0] + net['nodes'].tolist(),
+                    list(zip(net['first'].tolist(), net['second'].tolist(),
+                             net['low'].tolist(), net['high'].tolist(),
+                             types, distributions)))
+        return stn
+
+    ##
+    # \brief Write the networks back to json files
+    #
+    # @param folder     The directory to write the files to
+    #
+    # @post One json file per network, named after the network
+    def toJSONfiles(self, folder):
+        for k, name in enumerate(self.names):
+            with open(os.path.join(folder, name + '.json'), 'w') as f:
+                json.dump(self.getJSONobj(k), f)
+
+    ## \brief Release the mapping
+    def close(self):
+        self.arrays = {}
+        self._data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+##
+# \fn loadSTNsfromPacked(path, using_PSTN=False)
+# \brief Load every network of a packed file
+#
+# @param path           The filename of the packed file
+# @param using_PSTN     Flag indicating whether the input STNs are PSTNs
+#
+# @return A dictionary of STN objects keyed by network name
+def loadSTNsfromPacked(path, using_PSTN=False):
+    packed = PackedSTNs(path, using_PSTN)
+    return {name: packed.getSTN(k) for k, name in enumerate(packed.names)}
@@ -0,0 +1,243 @@
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+##
+# \file tracing.py
+# \brief Nested timing spans over the experiment pipeline, saved as Chrome
+#        trace timelines
+#
+# \details Tracing is off unless some code runs inside record():
+#
+#              with tracing.record('result/trace.json') as trace:
+#                  empirical.computeDynamic(...)
+#              trace.report()
+#
+#          The pipeline functions are wrapped with the traced decorator and
+#          listed in REGISTRY: stn.loadSTNfromJSONfile, DC_Checker,
+#          relaxSearch, LP.originalLP, dispatch.simulation and
+#          scheduleIsValid. Other code can be timed with `with span(name):`.
+#          Spans nest by time, so a DC_Checker span inside a relaxSearch span
+#          shows up below it in the timeline.
+#
+#          The saved file is in the Chrome trace event format and opens in
+#          chrome://tracing or https://ui.perfetto.dev. Only spans of the
+#          recording process are kept, not those of worker processes (e.g.
+#          dispatch.simulation_parallel or a Dataset with processes=True).
+#
+#          When nothing is recorded, a traced function costs one extra call
+#          and a None check.
+
+
+## The events being recorded, None when tracing is off
+_events = None
+
+## perf_counter_ns() when the recording started
+_origin = 0
+
+## The traced functions, keyed by span name
+REGISTRY = {}
+
+
+##
+# \class Trace
+# \brief The spans recorded between start() and stop()
+class Trace(object):
+
+    ## \brief Trace Constructor
+    #  \param events    Chrome trace events, with times in microseconds
+    def __init__(self, events):
+        self.events = events
+
+    ## \brief The number of recorded spans
+    def __len__(self):
+        return len(self.events)
+
+    ## \brief Write the trace as a Chrome trace JSON file
+    def save(self, path):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': self.events,
+                       'displayTimeUnit': 'ms'}, f)
+
+    ##
+    # \brief Total and self time of every span name
+    #
+    # \details The self time of a span is its time minus the time of the
+    #          spans directly nested in it.
+    #
+    # @return A dictionary {name: {'calls': n, 'total': s, 'self': s}} with
+    #         times in seconds
+    def summary(self):
+        result = {}
+        spans = [e for e in self.events if e['ph'] == 'X']
+        spans.sort(key=lambda e: (e['pid'], e['tid'], e['ts'], -e['dur']))
+
+        stack = []
+        for e in spans + [None]:
+            # Close the spans that end before this one starts
+            while stack and (e is None or
+                             (stack[-1][0]['pid'], stack[-1][0]['tid']) !=
+                             (e['pid'], e['tid']) or
+                             stack[-1][0]['ts'] + stack[-1][0]['dur'] <=
+                             e['ts']):
+                span, nested = stack.pop()
+                entry = result.setdefault(span['name'], {'calls': 0,
+                                                         'total': 0.0,
+                                                         'self': 0.0})
+                entry['calls'] += 1
+                entry['total'] += span['dur'] / 1e6
+                entry['self'] += (span['dur'] - nested) / 1e6
+                if stack:
+                    stack[-1][1] += span['dur']
+            if e is not None:
+                stack.append([e, 0])
+        return result
+
+    ## \brief Print the summary, from the largest self time down
+    def report(self):
+        summary = self.summary()
+        print("{:30s} {:>8s} {:>12s} {:>12s}".format('span', 'calls',
+                                                     'total (s)', 'self (s)'))
+        for name, entry in sorted(summary.items(),
+                                  key=lambda item: -item[1]['self']):
+            print("{:30s} {:8d} {:12.4f} {:12.4f}".format(
+                name, entry['calls'], entry['total'], entry['self']))
+
+
+##
+# \fn enabled()
+# \brief Whether spans are being recorded
+def enabled():
+    return _events is not None
+
+
+##
+# \fn start()
+# \brief Start recording spans, dropping those of an unfinished recording
+def start():
+    global _events, _origin
+    _events = []
+    _origin = time.perf_counter_ns()
+
+
+##
+# \fn stop()
+# \brief Stop recording spans
+#
+# @return The Trace of the recording
+def stop():
+    global _events
+    events, _events = _events or [], None
+    return Trace(events)
+
+
+##
+# \fn record(path=None)
+# \brief Record the spans of the code run inside the context
+#
+# @param path       If given, the trace is saved there when the context ends
+#
+# @return A context yielding the Trace, which is filled when the context ends
+@contextlib.contextmanager
+def record(path=None):
+    start()
+    trace = Trace([])
+    try:
+        yield trace
+    finally:
+        trace.events = stop().events
+        if path is not None:
+            trace.save(path)
+
+
+## \brief Append a complete event that started at perf_counter_ns() `begin`
+def _add(name, category, begin, args):
+    end = time.perf_counter_ns()
+    event = {'name': name, 'cat': category, 'ph': 'X',
+             'ts': (begin - _origin) / 1e3, 'dur': (end - begin) / 1e3,
+             'pid': os.getpid(), 'tid': threading.get_ident()}
+    if args:
+        event['args'] = args
+    # The recording may have been stopped by the traced code itself
+    if _events is not None:
+        _events.append(event)
+
+
+##
+# \fn span(name, category='span', **args)
+# \brief Record the enclosed code as a span
+#
+# @param name       The name of the span
+# @param category   The category of the span in the trace
+# @param args       Values shown with the span in the trace viewer
+@contextlib.contextmanager
+def span(name, category='span', **args):
+    if _events is None:
+        yield
+        return
+    begin = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        _add(name, category, begin, args)
+
+
+##
+# \fn instant(name, **args)
+# \brief Record a point in time, e.g. a dispatch failure
+def instant(name, **args):
+    if _events is None:
+        return
+    _events.append({'name': name, 'ph': 'i', 's': 't',
+                    'ts': (time.perf_counter_ns() - _origin) / 1e3,
+                    'pid': os.getpid(), 'tid': threading.get_ident(),
+                    'args': args})
+
+
+##
+# \fn networkArgs(network, *args, **kwargs)
+# \brief Span arguments of a function whose first argument is an STN
+def networkArgs(network, *args, **kwargs):
+    return {'events': len(network.verts), 'edges': len(network.edges)}
+
+
+##
+# \fn fileArgs(filepath, *args, **kwargs)
+# \brief Span arguments of a function whose first argument is a file path
+def fileArgs(filepath, *args, **kwargs):
+    return {'file': str(filepath)}
+
+
+##
+# \fn traced(name=None, args=None)
+# \brief Decorator recording every call of a function as a span
+#
+# @param name       The name of the span, the function name by default
+# @param args       A function of the call arguments returning the span
+#                   arguments, e.g. networkArgs
+#
+# @return The decorator. The traced function is added to REGISTRY.
+def traced(name=None, args=None):
+    def decorate(function):
+        key = name or function.__name__
+        category = function.__module__
+
+        @functools.wraps(function)
+        def wrapper(*a, **kw):
+            if _events is None:
+                return function(*a, **kw)
+            begin = time.perf_counter_ns()
+            try:
+                return function(*a, **kw)
+            finally:
+                _add(key, category, begin, args(*a, **kw) if args else None)
+
+        REGISTRY[key] = wrapper
+        return wrapper
+    return decorate
@@ -128,8 +128,12 @@ class PriorityQueue:
 
     ##
     # \brief PriorityQueue Constructor
-    def __init__(self):
+    #
+    # @param stats        An optional instrument.Stats counting the heap
+    #                     operations
+    def __init__(self, stats=None):
         self.queue = []
+        self.stats = stats
 
     ##
     # \brief Push an element with given priority into the Priority queue
@@ -139,6 +143,8 @@ class PriorityQueue:
     #
     # @post A Priority Queue object with input data added
     def push(self, data, priority):
+        if self.stats is not None:
+            self.stats.add('heap.push')
         heapq.heappush(self.queue, (priority, data))
 
     ##
@@ -146,6 +152,8 @@ class PriorityQueue:
     #
     # @return A tuple in the form of (priority, data)
     def pop(self):
+        if self.stats is not None:
+            self.stats.add('heap.pop')
         return heapq.heappop(self.queue)
 
     ##
@@ -171,6 +179,8 @@ class PriorityQueue:
 
         for i, (p, d) in enumerate(self.queue):
             if d == data:
+                if self.stats is not None:
+                    self.stats.add('heap.decKeyScans', i + 1)
                 if priority >= p:
                     break
 
@@ -178,4 +188,6 @@ class PriorityQueue:
                 self.push(data, priority)
                 break
         else:
+            if self.stats is not None:
+                self.stats.add('heap.decKeyScans', len(self.queue))
             self.push(data, priority)